@@ -0,0 +1,110 @@
+import itertools
+import os
+import shutil
+import statistics
+import time
+from collections.abc import Callable, Iterable
+from pathlib import Path
+
+import pytest
+
+from warabi.fts.sqlite3_fts import SqlLite3FullTextSearchEngine
+from warabi.tokenizer.janome_tokenizer import JanomeTokenizer
+
+from .corpus import documents
+
+CORPUS_SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+"""The corpus sizes selectable with the WARABI_BENCH_SIZES variable."""
+
+_WORKERS = os.cpu_count() or 1
+"""The number of tokenizer processes used to build large indexes."""
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    """Parametrize `corpus_size` with the sizes in WARABI_BENCH_SIZES.
+
+    The variable is a comma separated list of 1k, 10k, 100k and 1m, and
+    defaults to 1k so that a plain run finishes in a few minutes.
+    """
+    if "corpus_size" not in metafunc.fixturenames:
+        return
+    labels = os.environ.get("WARABI_BENCH_SIZES", "1k").lower().split(",")
+    unknown = set(labels) - CORPUS_SIZES.keys()
+    if unknown:
+        raise pytest.UsageError(
+            f"unknown WARABI_BENCH_SIZES {sorted(unknown)}, "
+            f"expected some of {list(CORPUS_SIZES)}"
+        )
+    metafunc.parametrize(
+        "corpus_size",
+        [CORPUS_SIZES[label] for label in labels],
+        ids=labels,
+        scope="session",
+    )
+
+
+@pytest.fixture(scope="session")
+def index_template(
+    corpus_size: int,
+    tmp_path_factory: pytest.TempPathFactory,
+) -> Path:
+    """Build a Janome index of the corpus once per session."""
+    path = tmp_path_factory.mktemp("index") / f"{corpus_size}.db"
+    engine = SqlLite3FullTextSearchEngine(JanomeTokenizer(), path)
+    engine.insert_many(
+        documents(corpus_size),
+        relax_durability=True,
+        workers=_WORKERS,
+    )
+    engine.close()
+    return path
+
+
+@pytest.fixture
+def index_copy(index_template: Path, tmp_path: Path) -> Callable[[], Path]:
+    """Get a function copying the index template for a destructive run."""
+    counter = itertools.count()
+
+    def copy() -> Path:
+        path = tmp_path / f"copy{next(counter)}.db"
+        shutil.copyfile(index_template, path)
+        return path
+
+    return copy
+
+
+@pytest.fixture
+def benchmark_latency(
+    benchmark,
+) -> Callable[[Callable, Iterable[tuple], int], None]:
+    """Get a function benchmarking single calls with latency percentiles.
+
+    The returned function takes `func`, `args` and `rounds`, and calls
+    `func` once per round with the next argument tuple from `args`, which
+    is cycled. The 50th, 95th and 99th percentiles of the call latencies
+    are stored in milliseconds in the `extra_info` of the benchmark, and
+    so in its JSON output.
+    """
+
+    def run(func: Callable, args: Iterable[tuple], rounds: int) -> None:
+        arguments = itertools.cycle(args)
+        latencies: list[float] = []
+
+        def call() -> None:
+            a = next(arguments)
+            start = time.perf_counter()
+            func(*a)
+            latencies.append(time.perf_counter() - start)
+
+        benchmark.pedantic(call, rounds=rounds, iterations=1, warmup_rounds=1)
+        # The warm-up call is not part of the distribution.
+        measured = latencies[1:] or latencies
+        if len(measured) > 1:
+            q = statistics.quantiles(measured, n=100, method="inclusive")
+            benchmark.extra_info.update(
+                p50_ms=q[49] * 1e3,
+                p95_ms=q[94] * 1e3,
+                p99_ms=q[98] * 1e3,
+            )
+
+    return run
@@ -0,0 +1,103 @@
+"""A deterministic synthetic Japanese corpus for benchmarks.
+
+Documents are built from a small vendored vocabulary of common words,
+drawn with a Zipf distribution so that term frequencies resemble natural
+text: a few words appear in most documents and many appear in few. The
+same seed always produces the same corpus, so results are comparable
+between runs and machines without any network access.
+"""
+
+import itertools
+import random
+from collections.abc import Iterator
+
+from warabi.common import Document, DocumentId
+
+# Ordered from the most to the least frequent.
+NOUNS = (
+    "時間 日本 今日 仕事 会社 学校 電車 天気 先生 友達 "
+    "映画 音楽 料理 旅行 家族 写真 問題 情報 経済 政治 "
+    "社会 文化 歴史 自然 科学 技術 研究 大学 病院 図書館 "
+    "公園 駅前 空港 銀行 郵便局 新聞 雑誌 番組 試合 選手 "
+    "野球 相撲 将棋 囲碁 桜 紅葉 富士山 温泉 神社 お寺 "
+    "城下町 港町 商店街 市場 野菜 果物 魚 肉 米 味噌 "
+    "醤油 豆腐 納豆 寿司 天ぷら 蕎麦 饂飩 団子 煎餅 抹茶 "
+    "着物 浴衣 扇子 風鈴 提灯 花火 祭り 盆踊り 雪 台風 "
+    "地震 火山 海岸 砂浜 灯台 漁師 農家 職人 画家 作家 "
+    "詩人 俳句 和歌 小説 漫画 辞書 鉛筆 時計 眼鏡 自転車"
+).split()
+VERBS = (
+    "見る 行く 来る 食べる 飲む 話す 聞く 読む 書く 作る "
+    "買う 売る 使う 持つ 待つ 思う 考える 調べる 教える 学ぶ"
+).split()
+ADJECTIVES = (
+    "大きい 小さい 新しい 古い 高い 安い 美しい 静か 賑やか 有名"
+).split()
+PARTICLES = ("が", "を", "に", "で", "と", "の", "へ", "から", "まで")
+
+_NOUN_WEIGHTS = [1 / (rank + 1) ** 1.1 for rank in range(len(NOUNS))]
+
+BROAD_QUERIES = tuple(NOUNS[:3])
+"""Queries each matching most of the documents."""
+SELECTIVE_QUERIES = tuple(
+    f"{a} {b}" for a, b in itertools.combinations(NOUNS[-4:], 2)
+)
+"""Queries of two rare terms, each matching about 0.1% of the documents."""
+
+
+def sentence(rng: random.Random) -> str:
+    """Generate one sentence."""
+    subject, obj = rng.choices(NOUNS, weights=_NOUN_WEIGHTS, k=2)
+    return (
+        f"{rng.choice(ADJECTIVES)}{subject}{rng.choice(PARTICLES)}"
+        f"{obj}{rng.choice(PARTICLES)}{rng.choice(VERBS)}。"
+    )
+
+
+def text(length: int, seed: int = 0) -> str:
+    """Generate a text of exactly `length` characters.
+
+    Args:
+        length: The number of characters.
+        seed: The seed of the generator.
+    Returns:
+        The generated text.
+    """
+    rng = random.Random(seed)
+    parts: list[str] = []
+    size = 0
+    while size < length:
+        parts.append(sentence(rng))
+        size += len(parts[-1])
+    return "".join(parts)[:length]
+
+
+def document(rng: random.Random) -> Document:
+    """Generate one nested document with a title, body and tags."""
+    return Document(
+        {
+            "title": sentence(rng),
+            "body": "".join(sentence(rng) for _ in range(rng.randint(3, 8))),
+            "meta": {
+                "tags": rng.choices(NOUNS, weights=_NOUN_WEIGHTS, k=3),
+                "year": rng.randint(1900, 2025),
+            },
+        }
+    )
+
+
+def documents(
+    count: int,
+    seed: int = 0,
+) -> Iterator[tuple[DocumentId, Document]]:
+    """Generate (doc_id, doc) pairs lazily.
+
+    Args:
+        count: The number of documents.
+        seed: The seed of the generator.
+    Returns:
+        An iterator of `count` documents with IDs "doc0000000" onwards.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        yield DocumentId(f"doc{i:07d}"), document(rng)
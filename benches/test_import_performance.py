@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import warabi",
+        "from warabi import WarabiDB; WarabiDB().search('猫')",
+        "from warabi.tokenizer import get_tokenizer; "
+        "get_tokenizer('janome').warm_up()",
+        "from warabi.tokenizer import get_tokenizer; "
+        "get_tokenizer('janome', mmap=False).warm_up()",
+        "from warabi.tokenizer import get_tokenizer; "
+        "get_tokenizer('sudachi').warm_up()",
+    ],
+    ids=[
+        "import",
+        "first-search",
+        "janome-warm-up",
+        "janome-warm-up-no-mmap",
+        "sudachi-warm-up",
+    ],
+)
+def test_performance_cold_start(code: str, benchmark):
+    """Measure a fresh interpreter importing warabi, as a CLI would."""
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", code],),
+        kwargs={"check": True},
+        rounds=5,
+        warmup_rounds=1,
+    )
@@ -0,0 +1,213 @@
+import itertools
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from warabi.common import Document, DocumentId
+from warabi.fts import IndexMode
+from warabi.fts.index_policy import NON_TEXT_TYPES, IndexPolicy
+from warabi.fts.sqlite3_fts import SqlLite3FullTextSearchEngine
+from warabi.tokenizer.janome_tokenizer import JanomeTokenizer
+
+from .corpus import documents
+
+_WORKERS = os.cpu_count() or 1
+
+
+def _open(path: Path, index_mode: IndexMode) -> SqlLite3FullTextSearchEngine:
+    tokenizer = JanomeTokenizer() if index_mode == "morphological" else None
+    return SqlLite3FullTextSearchEngine(tokenizer, path, index_mode=index_mode)
+
+
+def _sample_ids(corpus_size: int) -> list[DocumentId]:
+    """Pick 1% of the documents, spread over the whole corpus."""
+    return [DocumentId(f"doc{i:07d}") for i in range(0, corpus_size, 100)]
+
+
+@pytest.mark.parametrize(
+    ("index_mode", "workers"),
+    [("morphological", 1), ("morphological", _WORKERS), ("trigram", 1)],
+    ids=["janome", "janome-parallel", "trigram"],
+)
+def test_performance_insert_many(
+    index_mode: IndexMode,
+    workers: int,
+    corpus_size: int,
+    tmp_path: Path,
+    benchmark,
+):
+    corpus = list(documents(corpus_size))
+    paths = (tmp_path / f"{i}.db" for i in itertools.count())
+
+    def setup():
+        return (_open(next(paths), index_mode),), {}
+
+    def insert_many(engine: SqlLite3FullTextSearchEngine):
+        engine.insert_many(corpus, workers=workers)
+        engine.close()
+
+    benchmark.extra_info["documents"] = corpus_size
+    benchmark.pedantic(insert_many, setup=setup, rounds=1)
+
+
+@pytest.mark.parametrize(
+    "index_policy",
+    [None, IndexPolicy(include=["@root.body"], skip_types=NON_TEXT_TYPES)],
+    ids=["all-fields", "body-only"],
+)
+def test_performance_insert_many_index_policy(
+    index_policy: IndexPolicy | None,
+    corpus_size: int,
+    tmp_path: Path,
+    benchmark,
+):
+    corpus = list(documents(corpus_size))
+    path = tmp_path / "index.db"
+
+    def setup():
+        path.unlink(missing_ok=True)
+        engine = SqlLite3FullTextSearchEngine(
+            JanomeTokenizer(), path, index_policy=index_policy
+        )
+        return (engine,), {}
+
+    def insert_many(engine: SqlLite3FullTextSearchEngine):
+        engine.insert_many(corpus, workers=_WORKERS)
+        engine.close()
+
+    benchmark.pedantic(insert_many, setup=setup, rounds=1)
+    benchmark.extra_info.update(
+        documents=corpus_size,
+        file_bytes=path.stat().st_size,
+    )
+
+
+def test_performance_delete_many(
+    corpus_size: int,
+    index_copy: Callable[[], Path],
+    benchmark,
+):
+    doc_ids = _sample_ids(corpus_size)
+
+    def setup():
+        return (_open(index_copy(), "morphological"),), {}
+
+    def delete_many(engine: SqlLite3FullTextSearchEngine):
+        engine.delete_many(doc_ids)
+        engine.close()
+
+    benchmark.extra_info["documents"] = len(doc_ids)
+    benchmark.pedantic(delete_many, setup=setup, rounds=3)
+
+
+def test_performance_update(
+    corpus_size: int,
+    index_copy: Callable[[], Path],
+    benchmark,
+):
+    # Only the title changes, so the other fields are not re-tokenized.
+    updates = [
+        (doc_id, Document({**doc, "title": "新しい題名を付ける。"}))
+        for i, (doc_id, doc) in enumerate(documents(corpus_size))
+        if i % 100 == 0
+    ]
+
+    def setup():
+        return (_open(index_copy(), "morphological"),), {}
+
+    def update(engine: SqlLite3FullTextSearchEngine):
+        with engine.transaction():
+            for doc_id, doc in updates:
+                engine.update(doc, doc_id)
+        engine.close()
+
+    benchmark.extra_info["documents"] = len(updates)
+    benchmark.pedantic(update, setup=setup, rounds=3)
+
+
+def test_performance_snapshot(
+    corpus_size: int,
+    index_template: Path,
+    tmp_path: Path,
+    benchmark,
+):
+    engine = _open(index_template, "morphological")
+    dest = tmp_path / "snapshot.db"
+
+    benchmark.extra_info["bytes"] = index_template.stat().st_size
+    benchmark.pedantic(engine.snapshot, args=(dest,), rounds=3)
+    engine.close()
+
+
+def test_performance_rebuild(
+    corpus_size: int,
+    index_copy: Callable[[], Path],
+    benchmark,
+):
+    corpus = list(documents(corpus_size))
+
+    def setup():
+        return (_open(index_copy(), "morphological"),), {}
+
+    def rebuild(engine: SqlLite3FullTextSearchEngine):
+        engine.rebuild(corpus, workers=_WORKERS)
+        engine.close()
+
+    benchmark.extra_info["documents"] = corpus_size
+    benchmark.pedantic(rebuild, setup=setup, rounds=1)
+
+
+@pytest.fixture
+def token_export(index_template: Path, tmp_path: Path) -> Path:
+    """Export the tokenized fields of the index template."""
+    path = tmp_path / "tokens.jsonl.gz"
+    engine = _open(index_template, "morphological")
+    engine.export_tokens(path)
+    engine.close()
+    return path
+
+
+def test_performance_import_tokens(
+    corpus_size: int,
+    token_export: Path,
+    tmp_path: Path,
+    benchmark,
+):
+    # Compare with test_performance_insert_many, which tokenizes.
+    paths = (tmp_path / f"{i}.db" for i in itertools.count())
+
+    def setup():
+        return (_open(next(paths), "morphological"),), {}
+
+    def import_tokens(engine: SqlLite3FullTextSearchEngine):
+        engine.import_tokens(token_export, relax_durability=True)
+        engine.close()
+
+    benchmark.extra_info.update(
+        documents=corpus_size,
+        export_bytes=token_export.stat().st_size,
+    )
+    benchmark.pedantic(import_tokens, setup=setup, rounds=1)
+
+
+def test_performance_rebuild_from_stored_source(
+    corpus_size: int,
+    tmp_path: Path,
+    benchmark,
+):
+    # Compare with test_performance_rebuild, which starts from documents.
+    engine = SqlLite3FullTextSearchEngine(
+        JanomeTokenizer(), tmp_path / "index.db", store_source=True
+    )
+    engine.insert_many(
+        documents(corpus_size), relax_durability=True, workers=_WORKERS
+    )
+
+    benchmark.extra_info.update(
+        documents=corpus_size,
+        file_bytes=(tmp_path / "index.db").stat().st_size,
+    )
+    benchmark.pedantic(engine.rebuild, rounds=1)
+    engine.close()
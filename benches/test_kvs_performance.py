@@ -0,0 +1,118 @@
+import itertools
+import random
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from warabi.common import Document, DocumentId
+from warabi.kvs import KVStore
+from warabi.kvs.log_kvs import LogKVStore
+from warabi.kvs.sqlite3_kvs import Sqlite3KVStore
+from warabi.kvs.tinydb_kvs import TinyDbKVStore
+
+from .corpus import documents
+
+_STORES: dict[str, Callable[[Path], KVStore]] = {
+    "sqlite3": lambda path: Sqlite3KVStore(path / "kvs.db"),
+    "log": lambda path: LogKVStore(path / "kvs.log"),
+    "tinydb": lambda path: TinyDbKVStore(path / "kvs.json"),
+    "tinydb-memory": lambda path: TinyDbKVStore(),
+}
+
+# TinyDB reads and rewrites its whole table on every write, so loading n
+# documents takes O(n^2) time. Larger corpora are skipped.
+_MAX_CORPUS_SIZE = {"tinydb": 1_000, "tinydb-memory": 10_000}
+
+
+@pytest.fixture(params=list(_STORES))
+def store_factory(
+    request,
+    corpus_size: int,
+    tmp_path: Path,
+) -> Callable[[], KVStore]:
+    max_size = _MAX_CORPUS_SIZE.get(request.param)
+    if max_size is not None and corpus_size > max_size:
+        pytest.skip(f"{request.param} is too slow beyond {max_size} documents")
+    paths = (tmp_path / str(i) for i in itertools.count())
+
+    def create() -> KVStore:
+        path = next(paths)
+        path.mkdir()
+        return _STORES[request.param](path)
+
+    return create
+
+
+@pytest.fixture
+def loaded_store(
+    store_factory: Callable[[], KVStore],
+    corpus_size: int,
+) -> KVStore:
+    store = store_factory()
+    store.insert_many(documents(corpus_size))
+    return store
+
+
+def _sample_ids(corpus_size: int, k: int) -> list[DocumentId]:
+    rng = random.Random(0)
+    return [
+        DocumentId(f"doc{i:07d}")
+        for i in rng.sample(range(corpus_size), min(k, corpus_size))
+    ]
+
+
+def test_performance_kvs_insert_many(
+    store_factory: Callable[[], KVStore],
+    corpus_size: int,
+    benchmark,
+):
+    corpus = list(documents(corpus_size))
+
+    benchmark.extra_info["documents"] = corpus_size
+    benchmark.pedantic(
+        lambda store: store.insert_many(corpus),
+        setup=lambda: ((store_factory(),), {}),
+        rounds=1,
+    )
+
+
+def test_performance_kvs_get(
+    loaded_store: KVStore,
+    corpus_size: int,
+    benchmark_latency,
+):
+    doc_ids = _sample_ids(corpus_size, 100)
+    benchmark_latency(
+        loaded_store.get,
+        [(doc_id,) for doc_id in doc_ids],
+        rounds=len(doc_ids),
+    )
+
+
+def test_performance_kvs_update(
+    loaded_store: KVStore,
+    corpus_size: int,
+    benchmark_latency,
+):
+    doc = Document({"title": "新しい題名を付ける。"})
+    doc_ids = _sample_ids(corpus_size, 100)
+    benchmark_latency(
+        loaded_store.update,
+        [(doc, doc_id) for doc_id in doc_ids],
+        rounds=len(doc_ids),
+    )
+
+
+def test_performance_kvs_delete(
+    loaded_store: KVStore,
+    corpus_size: int,
+    benchmark_latency,
+):
+    doc_ids = _sample_ids(corpus_size, 100)
+    benchmark_latency(
+        loaded_store.delete,
+        [(doc_id,) for doc_id in doc_ids],
+        # The warm-up call deletes one of the documents.
+        rounds=len(doc_ids) - 1,
+    )
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+
+from warabi.fts.sqlite3_fts import SqlLite3FullTextSearchEngine
+from warabi.tokenizer.janome_tokenizer import JanomeTokenizer
+
+from .corpus import BROAD_QUERIES, SELECTIVE_QUERIES, documents
+
+
+@pytest.fixture(scope="session")
+def fragmented_template(
+    corpus_size: int,
+    tmp_path_factory: pytest.TempPathFactory,
+) -> Path:
+    """Build an index in small transactions without automatic merges."""
+    path = tmp_path_factory.mktemp("fragmented") / f"{corpus_size}.db"
+    engine = SqlLite3FullTextSearchEngine(JanomeTokenizer(), path)
+    engine.configure_merges(automerge=0)
+    engine.insert_many(
+        documents(corpus_size),
+        batch_size=max(corpus_size // 200, 1),
+        relax_durability=True,
+    )
+    engine.close()
+    return path
+
+
+@pytest.mark.parametrize(
+    "optimized", [False, True], ids=["fragmented", "optimized"]
+)
+@pytest.mark.parametrize(
+    "queries",
+    [SELECTIVE_QUERIES, BROAD_QUERIES],
+    ids=["selective", "broad"],
+)
+def test_performance_search_after_optimize(
+    optimized: bool,
+    queries: tuple[str, ...],
+    fragmented_template: Path,
+    tmp_path: Path,
+    benchmark,
+    benchmark_latency,
+):
+    path = tmp_path / "index.db"
+    path.write_bytes(fragmented_template.read_bytes())
+    engine = SqlLite3FullTextSearchEngine(JanomeTokenizer(), path)
+    if optimized:
+        engine.optimize()
+    stats = engine.index_stats(count_terms=False)
+    benchmark.extra_info.update(
+        segments=stats.segments,
+        data_bytes=stats.data_bytes,
+    )
+    try:
+        benchmark_latency(
+            engine.search,
+            [(query, 10) for query in queries],
+            rounds=100,
+        )
+    finally:
+        engine.close()
@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import pytest
+
+from warabi.common import AccessMode
+from warabi.fts.sqlite3_fts import SqlLite3FullTextSearchEngine
+from warabi.tokenizer.janome_tokenizer import JanomeTokenizer
+
+from .corpus import BROAD_QUERIES, SELECTIVE_QUERIES
+
+
+@pytest.fixture
+def engine(index_template: Path):
+    engine = SqlLite3FullTextSearchEngine(JanomeTokenizer(), index_template)
+    yield engine
+    engine.close()
+
+
+@pytest.mark.parametrize(
+    "queries",
+    [SELECTIVE_QUERIES, BROAD_QUERIES],
+    ids=["selective", "broad"],
+)
+@pytest.mark.parametrize("limit", [10, 1000])
+def test_performance_search(
+    queries: tuple[str, ...],
+    limit: int,
+    corpus_size: int,
+    engine: SqlLite3FullTextSearchEngine,
+    benchmark_latency,
+):
+    benchmark_latency(
+        engine.search,
+        [(query, limit) for query in queries],
+        rounds=100,
+    )
+
+
+@pytest.mark.parametrize(
+    "queries",
+    [SELECTIVE_QUERIES, BROAD_QUERIES],
+    ids=["selective", "broad"],
+)
+def test_performance_iter_search_all(
+    queries: tuple[str, ...],
+    corpus_size: int,
+    engine: SqlLite3FullTextSearchEngine,
+    benchmark_latency,
+):
+    def iterate(query: str):
+        for _ in engine.iter_search(query, order=None):
+            pass
+
+    benchmark_latency(iterate, [(query,) for query in queries], rounds=10)
+
+
+_ACCESS_MODES = ["readwrite", "readonly", "immutable"]
+
+
+@pytest.mark.parametrize("access_mode", _ACCESS_MODES)
+def test_performance_open(
+    access_mode: AccessMode,
+    corpus_size: int,
+    index_template: Path,
+    benchmark,
+):
+    # A search worker opens the index once at startup.
+    tokenizer = JanomeTokenizer()
+    tokenizer.warm_up()
+
+    def open_and_close():
+        SqlLite3FullTextSearchEngine(
+            tokenizer, index_template, access_mode=access_mode
+        ).close()
+
+    benchmark.pedantic(open_and_close, rounds=20, iterations=1)
+
+
+@pytest.mark.parametrize(
+    "queries",
+    [SELECTIVE_QUERIES, BROAD_QUERIES],
+    ids=["selective", "broad"],
+)
+@pytest.mark.parametrize("access_mode", _ACCESS_MODES)
+def test_performance_search_access_mode(
+    access_mode: AccessMode,
+    queries: tuple[str, ...],
+    corpus_size: int,
+    index_template: Path,
+    benchmark_latency,
+):
+    # Read-only modes memory-map the file instead of copying its pages
+    # into the private page cache.
+    engine = SqlLite3FullTextSearchEngine(
+        JanomeTokenizer(), index_template, access_mode=access_mode
+    )
+    try:
+        benchmark_latency(
+            engine.search,
+            [(query, 10) for query in queries],
+            rounds=100,
+        )
+    finally:
+        engine.close()
@@ -1,61 +1,66 @@
-import io
-import re
-import zipfile
-
 import pytest
-import requests
 
 from warabi.tokenizer.janome_tokenizer import JanomeTokenizer
 from warabi.tokenizer.sudachi_tokenizer import SudachiTokenizer
 
+from .corpus import NOUNS, documents, text
+
 
-def get_aozora_text(zip_url: str) -> str:
+@pytest.fixture(scope="module")
+def japanese_1k_text():
     """
-    extracts the text content from a zip file URL of Aozora Bunko.
+    Fixture to provide a short Japanese text for testing tokenization.
     """
-    response = requests.get(zip_url)
-    response.raise_for_status()
-
-    zip_file = zipfile.ZipFile(io.BytesIO(response.content))
+    return text(1000)
 
-    text_filename = [
-        name for name in zip_file.namelist() if name.endswith(".txt")
-    ][0]
 
-    with zip_file.open(text_filename, "r") as f:
-        binary_content = f.read()
-        text = binary_content.decode("shift_jis", errors="ignore")
-
-    text = re.split(
-        r"-------------------------------------------------------", text
-    )[-1]
-    text = re.split(r"底本：", text)[0]
+@pytest.mark.parametrize("tokenizer", [JanomeTokenizer, SudachiTokenizer])
+def test_performance_tokenize_japanese_1k_text(
+    tokenizer,
+    japanese_1k_text,
+    benchmark,
+):
+    t = tokenizer()
 
-    text = re.sub(r"《.+?》", "", text)
-    text = re.sub(r"［＃.+?］", "", text)
+    def performance_tokenize():
+        return [t for t in t.tokenize(japanese_1k_text)]
 
-    return text.replace(" ", "").replace("　", "").replace("｜", "").strip()
+    benchmark(performance_tokenize)
 
 
 @pytest.fixture(scope="module")
-def japanese_1k_text():
+def short_fields():
     """
-    Fixture to provide a short Japanese text for testing tokenization.
+    Fixture to provide the many short fields of 1,000 documents.
     """
-    return get_aozora_text(
-        "https://www.aozora.gr.jp/cards/000035/files/1567_ruby_4948.zip"
-    )[:1000]
+    fields = []
+    for _, doc in documents(1000):
+        fields += [doc["title"], *doc["meta"]["tags"], str(doc["meta"]["year"])]
+    return fields + list(NOUNS)
 
 
 @pytest.mark.parametrize("tokenizer", [JanomeTokenizer, SudachiTokenizer])
-def test_performance_tokenize_japanese_1k_text(
+def test_performance_tokenize_short_fields_per_call(
     tokenizer,
-    japanese_1k_text,
+    short_fields,
     benchmark,
 ):
     t = tokenizer()
+    t.warm_up()
 
     def performance_tokenize():
-        return [t for t in t.tokenize(japanese_1k_text)]
+        return [" ".join(t.tokenize(field)) for field in short_fields]
 
     benchmark(performance_tokenize)
+
+
+@pytest.mark.parametrize("tokenizer", [JanomeTokenizer, SudachiTokenizer])
+def test_performance_tokenize_short_fields_batch(
+    tokenizer,
+    short_fields,
+    benchmark,
+):
+    t = tokenizer()
+    t.warm_up()
+
+    benchmark(t.tokenize_batch, short_fields)
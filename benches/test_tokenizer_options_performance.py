@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import pytest
+
+from warabi.fts.sqlite3_fts import SqlLite3FullTextSearchEngine
+from warabi.tokenizer.sudachi_tokenizer import (
+    FUNCTION_WORD_POS,
+    SudachiTokenizer,
+)
+
+from .corpus import BROAD_QUERIES, SELECTIVE_QUERIES, documents
+
+_WORKERS = os.cpu_count() or 1
+
+_OPTIONS: dict[str, dict[str, Any]] = {
+    "C": {},
+    "A": {"split_mode": "A"},
+    "multi": {"split_mode": "multi"},
+    "C-content-words": {"exclude_pos": FUNCTION_WORD_POS},
+    "C-content-words-normalized": {
+        "exclude_pos": FUNCTION_WORD_POS,
+        "form": "normalized",
+    },
+}
+
+
+class _Index(NamedTuple):
+    path: Path
+    options: dict[str, Any]
+    build_seconds: float
+
+
+@pytest.fixture(scope="session", params=list(_OPTIONS), ids=list(_OPTIONS))
+def options_index(
+    request: pytest.FixtureRequest,
+    corpus_size: int,
+    tmp_path_factory: pytest.TempPathFactory,
+) -> _Index:
+    """Build a Sudachi index of the corpus once per tokenizer option set."""
+    options = _OPTIONS[request.param]
+    path = tmp_path_factory.mktemp("options") / f"{corpus_size}.db"
+    engine = SqlLite3FullTextSearchEngine(SudachiTokenizer(**options), path)
+    start = time.perf_counter()
+    engine.insert_many(
+        documents(corpus_size),
+        relax_durability=True,
+        workers=_WORKERS,
+    )
+    build_seconds = time.perf_counter() - start
+    engine.close()
+    return _Index(path, options, build_seconds)
+
+
+def _index_sizes(path: Path) -> dict[str, int]:
+    """Measure the database file and the FTS5 inverted index in bytes."""
+    conn = sqlite3.connect(path)
+    try:
+        (fts_bytes,) = conn.execute(
+            "SELECT SUM(LENGTH(block)) FROM texts_data"
+        ).fetchone()
+    finally:
+        conn.close()
+    return {"file_bytes": path.stat().st_size, "fts_bytes": fts_bytes}
+
+
+@pytest.mark.parametrize(
+    "queries",
+    [SELECTIVE_QUERIES, BROAD_QUERIES],
+    ids=["selective", "broad"],
+)
+def test_performance_search_tokenizer_options(
+    queries: tuple[str, ...],
+    options_index: _Index,
+    benchmark,
+    benchmark_latency,
+):
+    # Queries are tokenized with the same options as the index.
+    engine = SqlLite3FullTextSearchEngine(
+        SudachiTokenizer(**options_index.options), options_index.path
+    )
+    benchmark.extra_info.update(
+        _index_sizes(options_index.path),
+        build_seconds=options_index.build_seconds,
+    )
+    try:
+        benchmark_latency(
+            engine.search,
+            [(query, 10) for query in queries],
+            rounds=100,
+        )
+    finally:
+        engine.close()
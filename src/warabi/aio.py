@@ -0,0 +1,329 @@
+import asyncio
+import functools
+import itertools
+import os
+import threading
+from collections.abc import AsyncGenerator, Callable, Iterable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any
+
+from .common import AccessMode, Document, DocumentId
+from .db import WarabiDB
+from .fts.index_policy import IndexPolicy
+from .fts.sqlite3_fts import (
+    _tokenize_document,
+    _tokenize_text,
+    _TokenizedField,
+)
+from .tokenizer import Tokenizer
+from .tokenizer.janome_tokenizer import JanomeTokenizer
+
+_local = threading.local()
+
+
+class AsyncWarabiDB:
+    """An asyncio interface to `WarabiDB`.
+
+    All SQLite work runs on one dedicated thread that owns the connection.
+    Tokenization can be offloaded to a separate thread or process executor,
+    so neither morphological analysis nor I/O blocks the event loop.
+    Concurrent identical searches are coalesced into one query.
+
+    Use `AsyncWarabiDB.open()` to create an instance.
+    """
+
+    def __init__(
+        self,
+        db: WarabiDB,
+        db_executor: ThreadPoolExecutor,
+        tokenizer_factory: Callable[[], Tokenizer],
+        executor: Executor | None,
+    ) -> None:
+        """Initialize AsyncWarabiDB. Prefer `AsyncWarabiDB.open()`.
+
+        Args:
+            db: The database, created on the thread of `db_executor`.
+            db_executor: The single-thread executor owning the database.
+            tokenizer_factory: The factory of the database tokenizer.
+            executor: The executor used for tokenization, or None to
+                tokenize on the database thread.
+        """
+        self._db = db
+        self._db_executor = db_executor
+        self._tokenizer_factory = tokenizer_factory
+        self._executor = executor
+        self._inflight: dict[tuple, asyncio.Future] = {}
+
+    @classmethod
+    async def open(
+        cls,
+        path: str | os.PathLike | None = None,
+        tokenizer_factory: Callable[[], Tokenizer] = JanomeTokenizer,
+        executor: Executor | None = None,
+        index_policy: IndexPolicy | None = None,
+        access_mode: AccessMode = "readwrite",
+    ) -> "AsyncWarabiDB":
+        """Open a database.
+
+        Args:
+            path: Path to the database file. If None, uses in-memory storage.
+            tokenizer_factory: A callable creating the tokenizer. With a
+                process executor it must be picklable, e.g. a class.
+            executor: A thread or process executor for tokenization. Each of
+                its workers creates its own tokenizer. If None, tokenization
+                runs on the database thread.
+            index_policy: Selects the fields of documents that are
+                indexed, or None to index every field.
+            access_mode: "readonly" or "immutable" to open an existing
+                database for searching only. See `AccessMode`.
+        Returns:
+            The opened database.
+        """
+        db_executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="warabi-db",
+        )
+        db = await asyncio.get_running_loop().run_in_executor(
+            db_executor,
+            lambda: WarabiDB(
+                path,
+                tokenizer=tokenizer_factory(),
+                index_policy=index_policy,
+                access_mode=access_mode,
+            ),
+        )
+        return cls(db, db_executor, tokenizer_factory, executor)
+
+    async def close(self) -> None:
+        """Close the database and its dedicated thread.
+
+        The tokenization executor belongs to the caller and is left running.
+        """
+        await self._run_db(self._db.close)
+        self._db_executor.shutdown()
+
+    async def insert(self, doc: Document, doc_id: DocumentId) -> None:
+        """Insert a document.
+
+        Args:
+            doc: A dictionary representing the document to insert.
+            doc_id: The ID of the document.
+        """
+        await self.insert_many([(doc_id, doc)])
+
+    async def insert_many(
+        self,
+        docs: Iterable[tuple[DocumentId, Document]],
+        batch_size: int = 1000,
+    ) -> None:
+        """Insert many documents, committing once per batch.
+
+        Tokenization of a batch runs on the tokenization executor while
+        the previous batch is written on the database thread.
+
+        Args:
+            docs: An iterable of (doc_id, doc) pairs.
+            batch_size: The number of documents per transaction.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        pending: asyncio.Future | None = None
+        try:
+            for batch in itertools.batched(docs, batch_size, strict=False):
+                fields = await self._tokenize_documents(batch)
+                if pending is not None:
+                    await pending
+                pending = asyncio.ensure_future(
+                    self._run_db(
+                        self._db._insert_many_tokenized,
+                        [
+                            (doc_id, doc, f)
+                            for (doc_id, doc), f in zip(
+                                batch, fields, strict=True
+                            )
+                        ],
+                    )
+                )
+            if pending is not None:
+                await pending
+        except BaseException:
+            if pending is not None:
+                # Wait for the batch being written, retrieving its error if
+                # any, before raising the first error.
+                await asyncio.gather(pending, return_exceptions=True)
+            raise
+
+    async def get(self, doc_id: DocumentId) -> Document | None:
+        """Get a document by its ID.
+
+        Args:
+            doc_id: The ID of the document to retrieve.
+        Returns:
+            A dictionary representing the document, or None if not found.
+        """
+        return await self._run_db(self._db.get, doc_id)
+
+    async def update(self, doc: Document, doc_id: DocumentId) -> None:
+        """Update an existing document.
+
+        Args:
+            doc: A dictionary representing the updated document.
+            doc_id: The ID of the document to update.
+        """
+        await self._run_db(self._db.update, doc, doc_id)
+
+    async def delete(self, doc_id: DocumentId) -> None:
+        """Delete a document.
+
+        Args:
+            doc_id: The ID of the document to delete.
+        """
+        await self._run_db(self._db.delete, doc_id)
+
+    async def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        offset: int = 0,
+        fields: Iterable[str] | None = None,
+    ) -> list[tuple[DocumentId, Document]]:
+        """Search for documents matching the query, ranked by relevance.
+
+        Identical searches issued while one is in flight share its result.
+
+        Args:
+            query: The search query string.
+            limit: The maximum number of documents to return.
+                If None, all matches are returned.
+            offset: The number of documents to skip.
+            fields: The flattened keys of the fields to search, or None to
+                search every field.
+        Returns:
+            A list of (doc_id, doc) pairs, best match first.
+        """
+        keys = None if fields is None else tuple(fields)
+        key = (query, limit, offset, keys)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._search(query, limit, offset, keys)
+            )
+            self._inflight[key] = future
+
+            def forget(done: asyncio.Future) -> None:
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+            future.add_done_callback(forget)
+        return list(await asyncio.shield(future))
+
+    async def iter_search(
+        self,
+        query: str,
+        batch_size: int = 100,
+    ) -> AsyncGenerator[tuple[DocumentId, Document]]:
+        """Iterate over the documents matching the query.
+
+        Matches are fetched from the database thread `batch_size` at a time.
+
+        Args:
+            query: The search query string.
+            batch_size: The number of documents fetched per round trip.
+        Returns:
+            An async generator of (doc_id, doc) pairs, best match first.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        tokenized = await self._tokenize_query(query)
+        batches = await self._run_db(
+            self._db._iter_search_tokenized, tokenized, batch_size
+        )
+        try:
+            while batch := await self._run_db(next, batches, None):
+                for result in batch:
+                    yield result
+        finally:
+            await self._run_db(batches.close)
+
+    async def _search(
+        self,
+        query: str,
+        limit: int | None,
+        offset: int,
+        fields: tuple[str, ...] | None,
+    ) -> list[tuple[DocumentId, Document]]:
+        """Tokenize a query off the event loop and run the search."""
+        tokenized = await self._tokenize_query(query)
+        return await self._run_db(
+            self._db._search_tokenized, tokenized, limit, offset, fields
+        )
+
+    async def _tokenize_query(self, query: str) -> str:
+        """Tokenize a search query on the tokenization executor."""
+        if self._executor is None:
+            return await self._run_db(self._db._fts._tokenize_query, query)
+        return await self._run_tokenizer(
+            _tokenize_query_in_worker, self._tokenizer_factory, query
+        )
+
+    async def _tokenize_documents(
+        self,
+        docs: tuple[tuple[DocumentId, Document], ...],
+    ) -> list[dict[str, _TokenizedField]]:
+        """Tokenize documents on the tokenization executor."""
+        if self._executor is None:
+            tokenize = self._db._fts._tokenize_document
+            return await self._run_db(
+                lambda: [tokenize(doc) for _, doc in docs]
+            )
+        return await self._run_tokenizer(
+            _tokenize_documents_in_worker,
+            self._tokenizer_factory,
+            self._db._fts._index_policy,
+            docs,
+        )
+
+    async def _run_tokenizer(self, func: Callable, *args: Any) -> Any:
+        """Run a tokenization function on the tokenization executor."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(func, *args)
+        )
+
+    async def _run_db(self, func: Callable, *args: Any) -> Any:
+        """Run a function on the database thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._db_executor, functools.partial(func, *args)
+        )
+
+
+def _worker_tokenizer(factory: Callable[[], Tokenizer]) -> Tokenizer:
+    """Get the tokenizer of the current worker thread or process."""
+    tokenizers = getattr(_local, "tokenizers", None)
+    if tokenizers is None:
+        tokenizers = _local.tokenizers = {}
+    if (tokenizer := tokenizers.get(factory)) is None:
+        tokenizer = tokenizers[factory] = factory()
+    return tokenizer
+
+
+def _tokenize_query_in_worker(
+    factory: Callable[[], Tokenizer],
+    query: str,
+) -> str:
+    """Tokenize a search query in a tokenization worker."""
+    return _tokenize_text(_worker_tokenizer(factory), query)
+
+
+def _tokenize_documents_in_worker(
+    factory: Callable[[], Tokenizer],
+    index_policy: IndexPolicy | None,
+    docs: tuple[tuple[DocumentId, Document], ...],
+) -> list[dict[str, _TokenizedField]]:
+    """Tokenize documents in a tokenization worker."""
+    tokenizer = _worker_tokenizer(factory)
+    return [
+        _tokenize_document(tokenizer, doc, index_policy=index_policy)
+        for _, doc in docs
+    ]
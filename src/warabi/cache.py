@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import NamedTuple
+
+
+class CacheInfo(NamedTuple):
+    """Statistics of a cache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    currsize: int
+    weight: int
+
+
+class LRUCache[K, V]:
+    """A thread-safe least recently used cache.
+
+    The cache is bounded by the number of entries, by the total weight of
+    its entries, or both. Weights are computed by `weigh` when an entry is
+    stored, e.g. an approximate size in bytes.
+    """
+
+    def __init__(
+        self,
+        maxsize: int | None = 1024,
+        max_weight: int | None = None,
+        weigh: Callable[[K, V], int] | None = None,
+    ) -> None:
+        """Initialize LRUCache.
+
+        Args:
+            maxsize: The maximum number of entries, or None for no limit.
+            max_weight: The maximum total weight, or None for no limit.
+            weigh: A function returning the weight of an entry.
+                Required when `max_weight` is set.
+        """
+        if maxsize is not None and maxsize < 0:
+            raise ValueError("maxsize must not be negative")
+        if max_weight is not None and weigh is None:
+            raise ValueError("weigh is required when max_weight is set")
+
+        self._maxsize = maxsize
+        self._max_weight = max_weight
+        self._weigh = weigh
+        self._data: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._weight = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: K) -> V | None:
+        """Get a cached value and mark it as recently used.
+
+        Args:
+            key: The key to look up.
+        Returns:
+            The cached value, or None if the key is not cached.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        """Store a value, evicting least recently used entries if needed.
+
+        An entry heavier than `max_weight` on its own is not stored.
+
+        Args:
+            key: The key to store the value under.
+            value: The value to store.
+        """
+        weight = self._weigh(key, value) if self._weigh else 0
+        with self._lock:
+            if (old := self._data.pop(key, None)) is not None:
+                self._weight -= old[1]
+            if self._maxsize == 0 or (
+                self._max_weight is not None and weight > self._max_weight
+            ):
+                return
+            self._data[key] = (value, weight)
+            self._weight += weight
+            while (
+                self._maxsize is not None and len(self._data) > self._maxsize
+            ) or (
+                self._max_weight is not None and self._weight > self._max_weight
+            ):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._weight -= evicted
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries, keeping the statistics."""
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def cache_info(self) -> CacheInfo:
+        """Get the statistics of the cache.
+
+        Returns:
+            The hit, miss and eviction counters with the current size.
+        """
+        with self._lock:
+            return CacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                currsize=len(self._data),
+                weight=self._weight,
+            )
@@ -1,4 +1,16 @@
-from typing import NewType
+from typing import Literal, NewType
 
 DocumentId = NewType("DocumentId", str)
 Document = NewType("Document", dict)
+
+AccessMode = Literal["readwrite", "readonly", "immutable"]
+"""How a database file is opened.
+
+"readwrite" creates and migrates the schema as needed. "readonly" opens an
+existing database with a `mode=ro` URI and refuses writes, while other
+connections may still write to it. "immutable" also sets `immutable=1`,
+which skips locking and change detection, so the file must never change
+while it is open, e.g. a deployed snapshot. An immutable connection also
+ignores the WAL file, so commits not yet checkpointed into the database
+file are not visible to it.
+"""
@@ -1,16 +1,294 @@
+import itertools
 import os
+import time
+from collections.abc import Generator, Iterable
+
+from .common import AccessMode, Document, DocumentId
+from .fts import IndexMode
+from .fts.index_policy import IndexPolicy
+from .fts.sqlite3_fts import (
+    SqlLite3FullTextSearchEngine,
+    _TokenizedField,
+)
+from .instrumentation import Instrumentation, timer
+from .kvs.sqlite3_kvs import Sqlite3KVStore, _loads
+from .tokenizer import Tokenizer, get_tokenizer
 
 
 class WarabiDB:
-    """"""
+    """A Japanese full-text search database in a single SQLite file.
+
+    Documents and their full-text index live in the same file and share one
+    connection, so every write updates both in one transaction.
+    """
 
     def __init__(
         self,
         path: str | os.PathLike | None = None,
+        tokenizer: Tokenizer | str | None = None,
+        index_mode: IndexMode = "morphological",
+        instrumentation: Instrumentation | None = None,
+        index_policy: IndexPolicy | None = None,
+        access_mode: AccessMode = "readwrite",
     ):
         """Initialize WarabiDB.
 
         Args:
             path: Path to the database file. If None, uses in-memory storage.
+            tokenizer: The tokenizer used for indexing and queries, or the
+                name of a registered tokenizer such as "sudachi". Defaults
+                to "janome", whose dictionary is loaded on first use.
+                Unused in trigram mode.
+            index_mode: "morphological" or "trigram". See
+                `SqlLite3FullTextSearchEngine` for the tradeoffs.
+            instrumentation: Collects the latency of each stage of the
+                full-text index and the document store, or None.
+            index_policy: Selects the fields of documents that are
+                indexed, or None to index every field. Every document is
+                stored in full either way.
+            access_mode: "readwrite", or "readonly" or "immutable" to open
+                an existing database for reading only, e.g. in search
+                worker processes. Writes then raise `ReadOnlyError`. See
+                `AccessMode`.
+        """
+        if index_mode == "trigram":
+            tokenizer = None
+        elif tokenizer is None:
+            tokenizer = get_tokenizer("janome")
+        elif isinstance(tokenizer, str):
+            tokenizer = get_tokenizer(tokenizer)
+        self._fts = SqlLite3FullTextSearchEngine(
+            tokenizer,
+            path,
+            index_mode=index_mode,
+            instrumentation=instrumentation,
+            index_policy=index_policy,
+            access_mode=access_mode,
+        )
+        self._kvs = Sqlite3KVStore(
+            connection=self._fts._conn,
+            instrumentation=instrumentation,
+            access_mode=access_mode,
+        )
+        self._instrumentation = instrumentation
+
+    def close(self) -> None:
+        """Close the database."""
+        self._fts.close()
+
+    def insert(self, doc: Document, doc_id: DocumentId) -> None:
+        """Insert a document.
+
+        Args:
+            doc: A dictionary representing the document to insert.
+            doc_id: The ID of the document.
+        Raises:
+            sqlite3.IntegrityError: If the document ID already exists.
         """
-        pass
+        with self._fts.transaction():
+            self._kvs.insert(doc, doc_id)
+            self._fts.insert(doc, doc_id)
+
+    def insert_many(
+        self,
+        docs: Iterable[tuple[DocumentId, Document]],
+        batch_size: int = 1000,
+    ) -> None:
+        """Insert many documents, committing once per batch.
+
+        Args:
+            docs: An iterable of (doc_id, doc) pairs.
+            batch_size: The number of documents per transaction.
+        Raises:
+            sqlite3.IntegrityError: If a document ID already exists.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        for batch in itertools.batched(docs, batch_size, strict=False):
+            with self._fts.transaction():
+                self._kvs.insert_many(batch, batch_size=batch_size)
+                self._fts.insert_many(batch, batch_size=batch_size)
+
+    def get(self, doc_id: DocumentId) -> Document | None:
+        """Get a document by its ID.
+
+        Args:
+            doc_id: The ID of the document to retrieve.
+        Returns:
+            A dictionary representing the document, or None if not found.
+        """
+        return self._kvs.get(doc_id)
+
+    def update(self, doc: Document, doc_id: DocumentId) -> None:
+        """Update an existing document.
+
+        Only the fields whose values changed are re-indexed. Updating a
+        document that does not exist does nothing.
+
+        Args:
+            doc: A dictionary representing the updated document.
+            doc_id: The ID of the document to update.
+        """
+        with self._fts.transaction():
+            if self._kvs.get(doc_id) is None:
+                return
+            self._kvs.update(doc, doc_id)
+            self._fts.update(doc, doc_id)
+
+    def delete(self, doc_id: DocumentId) -> None:
+        """Delete a document.
+
+        Args:
+            doc_id: The ID of the document to delete.
+        """
+        with self._fts.transaction():
+            self._kvs.delete(doc_id)
+            self._fts.delete(doc_id)
+
+    def snapshot(
+        self,
+        dest: str | os.PathLike,
+        pages: int = 1024,
+        sleep: float = 0.0,
+    ) -> None:
+        """Back up the documents and the index to a file.
+
+        See `SqlLite3FullTextSearchEngine.snapshot` for the arguments.
+        """
+        self._fts.snapshot(dest, pages=pages, sleep=sleep)
+
+    def rebuild(
+        self,
+        tokenizer: Tokenizer | str | None = None,
+        batch_size: int = 1000,
+        workers: int = 1,
+    ) -> None:
+        """Rebuild the full-text index from the stored documents.
+
+        The documents and a new index are written to a side file, which
+        then replaces the database contents in one transaction.
+
+        Args:
+            tokenizer: The tokenizer of the new index, or the name of a
+                registered tokenizer. Defaults to the current one.
+            batch_size: The number of documents per transaction.
+            workers: The number of tokenizer processes. 1 tokenizes inline.
+        """
+        if isinstance(tokenizer, str):
+            tokenizer = get_tokenizer(tokenizer)
+        with (
+            self._fts._rebuilding(tokenizer) as builder,
+            self._fts._reader() as conn,
+        ):
+            Sqlite3KVStore(connection=builder._conn)
+            with builder.transaction():
+                builder._conn.executemany(
+                    "INSERT INTO documents (doc_id, document) VALUES (?, ?)",
+                    conn.execute("SELECT doc_id, document FROM documents"),
+                )
+            builder.insert_many(
+                (
+                    (DocumentId(doc_id), _loads(document))
+                    for doc_id, document in conn.execute(
+                        "SELECT doc_id, document FROM documents"
+                    )
+                ),
+                batch_size=batch_size,
+                relax_durability=True,
+                workers=workers,
+            )
+
+    def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        offset: int = 0,
+        fields: Iterable[str] | None = None,
+    ) -> list[tuple[DocumentId, Document]]:
+        """Search for documents matching the query, ranked by relevance.
+
+        The documents are fetched in the same statement as the matches.
+
+        Args:
+            query: The search query string.
+            limit: The maximum number of documents to return.
+                If None, all matches are returned.
+            offset: The number of documents to skip.
+            fields: The flattened keys of the fields to search, such as
+                "@root.title", or None to search every field.
+        Returns:
+            A list of (doc_id, doc) pairs, best match first.
+        """
+        keys = None if fields is None else tuple(fields)
+        if self._instrumentation is None:
+            tokenized = self._fts._tokenize_query(query)
+            return self._search_tokenized(tokenized, limit, offset, keys)
+
+        start = time.perf_counter()
+        tokenized = self._fts._tokenize_query(query)
+        results = self._search_tokenized(tokenized, limit, offset, keys)
+        self._instrumentation.record_search(
+            query, tokenized, time.perf_counter() - start
+        )
+        return results
+
+    def _search_tokenized(
+        self,
+        tokenized: str,
+        limit: int | None,
+        offset: int,
+        fields: tuple[str, ...] | None = None,
+    ) -> list[tuple[DocumentId, Document]]:
+        """Search for documents matching an already tokenized query."""
+        search_sql, params = self._fts._search_statement(
+            tokenized, "bm25", fields
+        )
+        sql = (
+            "SELECT d.doc_id, d.document "
+            f"FROM ({search_sql} LIMIT ? OFFSET ?) AS r "
+            "JOIN documents AS d ON d.doc_id = r.doc_id "
+            "ORDER BY r.rank"
+        )
+        with (
+            self._fts._reader() as conn,
+            timer(self._instrumentation, "fts.query"),
+        ):
+            rows = conn.execute(
+                sql,
+                (*params, -1 if limit is None else limit, offset),
+            ).fetchall()
+        return [
+            (DocumentId(doc_id), _loads(document)) for doc_id, document in rows
+        ]
+
+    def _iter_search_tokenized(
+        self,
+        tokenized: str,
+        batch_size: int,
+    ) -> Generator[list[tuple[DocumentId, Document]]]:
+        """Yield ranked matches of a tokenized query batch by batch."""
+        sql, params = self._fts._search_statement(tokenized, "bm25")
+        doc_ids = self._fts._iter_rows(sql, params, batch_size, with_hits=False)
+        while batch := list(itertools.islice(doc_ids, batch_size)):
+            yield [
+                (DocumentId(doc_id), doc)
+                for doc_id, doc in zip(
+                    batch, self._kvs.get_many(batch), strict=True
+                )
+                if doc is not None
+            ]
+
+    def _insert_many_tokenized(
+        self,
+        docs: Iterable[tuple[DocumentId, Document, dict[str, _TokenizedField]]],
+    ) -> None:
+        """Insert documents whose fields are already tokenized."""
+        docs = list(docs)
+        with self._fts.transaction():
+            self._kvs.insert_many(
+                ((doc_id, doc) for doc_id, doc, _ in docs),
+                batch_size=max(len(docs), 1),
+            )
+            for doc_id, _, fields in docs:
+                self._fts._insert_tokenized(doc_id, fields)
@@ -0,0 +1,18 @@
+class WarabiError(Exception):
+    """Base class of the errors raised by warabi."""
+
+
+class IndexModeMismatchError(WarabiError):
+    """Raised when an index is opened with a different index mode."""
+
+
+class ReadOnlyError(WarabiError):
+    """Raised when writing to a database opened in a read-only access mode."""
+
+
+class CorruptLogError(WarabiError):
+    """Raised when a record of a document log is damaged or malformed."""
+
+
+class LogLockedError(WarabiError):
+    """Raised when a document log is already open elsewhere."""
@@ -1,17 +1,38 @@
 from abc import abstractmethod
-from typing import Protocol
+from typing import Literal, NamedTuple, Protocol
 
 from ..common import Document, DocumentId
 
+SearchOrder = Literal["bm25"]
+IndexMode = Literal["morphological", "trigram"]
+
+
+class SearchHit(NamedTuple):
+    """A matching document with its best matching field."""
+
+    doc_id: str
+    key: str
+    rank: float
+
 
 class FullTextSearchEngine(Protocol):
     @abstractmethod
-    def search(self, query: str) -> list[str]:
+    def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        offset: int = 0,
+        order: SearchOrder | None = "bm25",
+    ) -> list[str]:
         """Search for documents matching the query.
         Args:
             query: The search query string.
+            limit: The maximum number of doc_ids to return.
+                If None, all matches are returned.
+            offset: The number of doc_ids to skip.
+            order: "bm25" to rank by relevance, or None for no ordering.
         Returns:
-            A list of tuples containing doc_id for each matching document.
+            A list of doc_id for each matching document, without duplicates.
         """
         raise NotImplementedError
 
@@ -24,6 +45,16 @@ class FullTextSearchEngine(Protocol):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def update(self, doc: Document, doc_id: DocumentId) -> None:
+        """Update a document in the full-text search index.
+
+        Args:
+            doc: A dictionary representing the updated document.
+            doc_id: The ID of the document to update.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def delete(self, doc_id: DocumentId) -> None:
         """Delete a document from the full-text search index.
@@ -0,0 +1,77 @@
+import re
+from collections.abc import Iterable
+
+NON_TEXT_TYPES: tuple[type, ...] = (bool, int, float, type(None))
+"""The JSON value types that are not text, for `IndexPolicy(skip_types=...)`."""
+
+
+class IndexPolicy:
+    """Select the fields of documents that are indexed.
+
+    Fields are identified by their flattened keys, such as "@root.title"
+    or "@root.meta.tags[0]". In a key pattern, `*` matches one key segment
+    and `[*]` matches any list index. A pattern also matches every key
+    nested under it, so "@root.meta" covers "@root.meta.tags[0]".
+
+    Fields that are not indexed are neither tokenized nor stored by the
+    full-text index. A policy only applies to documents written after it
+    is set, so changing the policy of an existing index takes a reindex.
+    """
+
+    def __init__(
+        self,
+        include: Iterable[str] | None = None,
+        exclude: Iterable[str] = (),
+        skip_types: Iterable[type] = (),
+    ) -> None:
+        """Initialize IndexPolicy.
+
+        Args:
+            include: Patterns of the keys to index, or None to index every
+                key that is not excluded.
+            exclude: Patterns of the keys not to index, even if included.
+            skip_types: The types of values not to index, e.g.
+                `NON_TEXT_TYPES` to skip numbers, booleans and nulls.
+        """
+        self._include = None if include is None else _compile(include)
+        self._exclude = _compile(exclude)
+        self._skip_types = tuple(skip_types)
+
+    def indexes(self, key: str, value: object) -> bool:
+        """Check whether a field is indexed.
+
+        Args:
+            key: The flattened key of the field.
+            value: The value of the field.
+        Returns:
+            True if the field is indexed.
+        """
+        if self._skip_types and isinstance(value, self._skip_types):
+            return False
+        if self._include is not None and not self._include.fullmatch(key):
+            return False
+        return not self._exclude.fullmatch(key)
+
+    def excludes(self, key: str) -> bool:
+        """Check whether a key and every key nested under it are excluded.
+
+        Args:
+            key: The flattened key of a field or of a nested object.
+        Returns:
+            True if nothing under the key is indexed.
+        """
+        return bool(self._exclude.fullmatch(key))
+
+
+def _compile(patterns: Iterable[str]) -> re.Pattern[str]:
+    """Compile key patterns into a regex matching keys and their children."""
+    alternatives = []
+    for pattern in patterns:
+        escaped = re.escape(pattern)
+        escaped = escaped.replace(r"\[\*\]", r"\[\d+\]")
+        escaped = escaped.replace(r"\*", r"[^.\[]+")
+        alternatives.append(escaped)
+    if not alternatives:
+        # Matches nothing.
+        return re.compile(r"(?!)")
+    return re.compile(rf"(?:{'|'.join(alternatives)})(?:[.\[].*)?", re.DOTALL)
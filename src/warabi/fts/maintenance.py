@@ -0,0 +1,105 @@
+"""Background merging of full-text indexes during idle time."""
+
+import logging
+import threading
+import time
+from typing import Protocol
+
+_logger = logging.getLogger(__name__)
+
+
+class Mergeable(Protocol):
+    """An index that can be merged in bounded steps."""
+
+    def merge(self, pages: int = 256) -> bool:
+        """Run one incremental merge step, returning whether it did work."""
+        ...
+
+
+class IndexMaintainer:
+    """A daemon thread merging an index in bounded-time slices.
+
+    Every `interval` seconds, the maintainer runs `merge` steps until the
+    index is fully merged or `time_budget` is spent. Each step is a short
+    write transaction, so writers wait for at most one step at a time.
+
+    Combine it with `configure_merges(automerge=0)` to move merging out of
+    the write path entirely, or keep automatic merges and use it to catch
+    up on idle periods. The engine must be shareable between threads,
+    e.g. a `SqlLite3FullTextSearchEngine` in thread-safe mode or a
+    `ShardedFullTextSearchEngine`.
+    """
+
+    def __init__(
+        self,
+        engine: Mergeable,
+        interval: float = 60.0,
+        time_budget: float = 0.1,
+        pages: int = 256,
+    ) -> None:
+        """Initialize IndexMaintainer. Call `start` to run it.
+
+        Args:
+            engine: The index to merge.
+            interval: The number of seconds between merge slices.
+            time_budget: The number of seconds after which a slice stops
+                starting new steps. A step already running completes.
+            pages: The number of pages written per step. See `merge`.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self._engine = engine
+        self._interval = interval
+        self._time_budget = time_budget
+        self._pages = pages
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> "IndexMaintainer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Start the maintenance thread."""
+        if self._thread is not None:
+            raise RuntimeError("the maintainer is already started")
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="warabi-maintainer",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the maintenance thread after its current step."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> int:
+        """Run one merge slice in the calling thread.
+
+        Returns:
+            The number of merge steps that did work.
+        """
+        deadline = time.monotonic() + self._time_budget
+        steps = 0
+        while not self._stop.is_set() and self._engine.merge(self._pages):
+            steps += 1
+            if time.monotonic() >= deadline:
+                break
+        return steps
+
+    def _run(self) -> None:
+        """Run merge slices until stopped."""
+        while not self._stop.wait(self._interval):
+            try:
+                self.run_once()
+            except Exception:
+                # The next slice retries, e.g. after a lock timeout.
+                _logger.exception("index maintenance failed")
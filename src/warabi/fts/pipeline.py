@@ -0,0 +1,103 @@
+import itertools
+from collections import deque
+from collections.abc import Callable, Generator, Iterable
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from ..common import Document, DocumentId
+from ..tokenizer import Tokenizer
+from .index_policy import IndexPolicy
+from .sqlite3_fts import _tokenize_document, _TokenizedField
+
+_worker_tokenizer: Tokenizer | None = None
+_worker_index_policy: IndexPolicy | None = None
+_worker_store_source = False
+
+
+def tokenize_documents(
+    docs: Iterable[tuple[DocumentId, Document]],
+    tokenizer_factory: Callable[[], Tokenizer],
+    workers: int,
+    chunk_size: int = 64,
+    queue_size: int | None = None,
+    index_policy: IndexPolicy | None = None,
+    store_source: bool = False,
+) -> Generator[tuple[DocumentId, Document, dict[str, _TokenizedField]]]:
+    """Tokenize documents in a pool of worker processes.
+
+    Documents are sent to the workers in chunks. At most `queue_size`
+    chunks are in flight at once, so a slow consumer throttles reading
+    from `docs`. Results are yielded in input order.
+
+    Args:
+        docs: An iterable of (doc_id, doc) pairs.
+        tokenizer_factory: A picklable callable creating the tokenizer
+            used by each worker process.
+        workers: The number of worker processes.
+        chunk_size: The number of documents sent to a worker at once.
+        queue_size: The maximum number of chunks in flight.
+            Defaults to twice `workers`.
+        index_policy: Selects the fields to tokenize, or None for all.
+        store_source: If True, keep the normalized text of each field.
+    Returns:
+        A generator of (doc_id, doc, {flattened key: tokenized field})
+        triples. The document is kept so that it can be tokenized again,
+        e.g. if the tokenizer of the index changed meanwhile.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    queue_size = queue_size or workers * 2
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(tokenizer_factory, index_policy, store_source),
+    )
+    pending: deque[tuple[tuple, Future]] = deque()
+    try:
+        for chunk in itertools.batched(docs, chunk_size, strict=False):
+            if len(pending) >= queue_size:
+                yield from _chunk_results(*pending.popleft())
+            pending.append((chunk, executor.submit(_tokenize_chunk, chunk)))
+        while pending:
+            yield from _chunk_results(*pending.popleft())
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _chunk_results(
+    chunk: tuple[tuple[DocumentId, Document], ...],
+    future: Future[list[dict[str, _TokenizedField]]],
+) -> Generator[tuple[DocumentId, Document, dict[str, _TokenizedField]]]:
+    """Pair the documents of a chunk with their tokenized fields."""
+    for (doc_id, doc), fields in zip(chunk, future.result(), strict=True):
+        yield doc_id, doc, fields
+
+
+def _init_worker(
+    tokenizer_factory: Callable[[], Tokenizer],
+    index_policy: IndexPolicy | None,
+    store_source: bool,
+) -> None:
+    """Create the tokenizer of a worker process."""
+    global _worker_tokenizer, _worker_index_policy, _worker_store_source
+    _worker_tokenizer = tokenizer_factory()
+    _worker_index_policy = index_policy
+    _worker_store_source = store_source
+
+
+def _tokenize_chunk(
+    chunk: tuple[tuple[DocumentId, Document], ...],
+) -> list[dict[str, _TokenizedField]]:
+    """Tokenize a chunk of documents in a worker process."""
+    assert _worker_tokenizer is not None
+    return [
+        _tokenize_document(
+            _worker_tokenizer,
+            doc,
+            index_policy=_worker_index_policy,
+            store_source=_worker_store_source,
+        )
+        for _, doc in chunk
+    ]
@@ -0,0 +1,607 @@
+import copy
+import functools
+import hashlib
+import heapq
+import itertools
+import os
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from operator import attrgetter
+from pathlib import Path
+
+from ..common import AccessMode, Document, DocumentId
+from ..errors import ReadOnlyError
+from ..tokenizer import Tokenizer
+from . import FullTextSearchEngine, IndexMode, SearchHit, SearchOrder
+from .index_policy import IndexPolicy
+from .sqlite3_fts import (
+    IndexStats,
+    SqlLite3FullTextSearchEngine,
+    _read_tokens,
+    _stored_fields,
+    _TokenizedField,
+    _write_tokens,
+)
+
+
+class ShardedFullTextSearchEngine(FullTextSearchEngine):
+    """A full-text search index split across several SQLite files.
+
+    Each shard is a thread-safe `SqlLite3FullTextSearchEngine` in its own
+    file, so every shard has its own writer. A document lives in exactly
+    one shard, chosen by a jump consistent hash of its doc_id.
+
+    Writes to different shards and searches over all shards run in
+    parallel on a thread pool. SQLite releases the GIL while it executes
+    a statement, so threads are enough to keep several shards busy.
+    Queries and documents are tokenized once in the calling thread.
+
+    The bm25 rank of a match depends on term statistics of its own shard.
+    With a uniform hash those statistics converge across shards, so the
+    merged ranking closely follows that of a single index.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        tokenizer: Tokenizer | None,
+        shards: int | None = None,
+        workers: int | None = None,
+        index_mode: IndexMode = "morphological",
+        read_pool_size: int = 4,
+        mmap_size: int | None = None,
+        cache_size: int | None = None,
+        index_policy: IndexPolicy | None = None,
+        access_mode: AccessMode = "readwrite",
+        store_source: bool = False,
+    ) -> None:
+        """Initialize ShardedFullTextSearchEngine.
+
+        Args:
+            directory: The directory holding the shard files. It is created
+                if missing.
+            tokenizer: The tokenizer shared by every shard. Must be None in
+                trigram mode.
+            shards: The number of shards of a new index. Defaults to 4.
+                An existing index keeps its shards; use `add_shard` to
+                grow it.
+            workers: The number of threads used to access shards in
+                parallel. Defaults to the `ThreadPoolExecutor` default.
+            index_mode: The index mode of every shard.
+            read_pool_size: The number of read-only connections kept per
+                shard.
+            mmap_size: The `mmap_size` pragma for every connection.
+            cache_size: The `cache_size` pragma for every connection.
+            index_policy: Selects the fields of documents that are
+                indexed, or None to index every field.
+            access_mode: The access mode of every shard. "readonly" and
+                "immutable" open the existing shards for searching only.
+            store_source: If True, every shard keeps the normalized text
+                of each field. See `SqlLite3FullTextSearchEngine`.
+        """
+        self._directory = Path(directory)
+        self._access_mode = access_mode
+        if access_mode == "readwrite":
+            self._directory.mkdir(parents=True, exist_ok=True)
+        self._open_shard = lambda path: SqlLite3FullTextSearchEngine(
+            tokenizer,
+            path,
+            threadsafe=True,
+            read_pool_size=read_pool_size,
+            mmap_size=mmap_size,
+            cache_size=cache_size,
+            index_mode=index_mode,
+            index_policy=index_policy,
+            access_mode=access_mode,
+            store_source=store_source,
+        )
+
+        count = 0
+        while self._shard_path(count).exists():
+            count += 1
+        if count == 0 and access_mode != "readwrite":
+            raise ValueError(f"no shards to open in {self._directory}")
+        if count == 0:
+            count = 4 if shards is None else shards
+            if count < 1:
+                raise ValueError("shards must be at least 1")
+        elif shards is not None and shards != count:
+            raise ValueError(
+                f"the index has {count} shards, not {shards}; "
+                "use add_shard to add shards"
+            )
+
+        self._shards: list[SqlLite3FullTextSearchEngine] = []
+        try:
+            for i in range(count):
+                self._shards.append(self._open_shard(self._shard_path(i)))
+        except BaseException:
+            self._close_shards()
+            raise
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="warabi-shard",
+        )
+
+    @property
+    def shard_count(self) -> int:
+        """The number of shards."""
+        return len(self._shards)
+
+    def close(self) -> None:
+        """Close every shard and the thread pool."""
+        self._executor.shutdown()
+        self._close_shards()
+
+    def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        offset: int = 0,
+        order: SearchOrder | None = "bm25",
+        fields: Iterable[str] | None = None,
+    ) -> list[str]:
+        """Search every shard concurrently and merge the matches.
+
+        Each shard returns at most `offset + limit` matches, ranked by
+        bm25, and the global top matches are merged from them.
+
+        Args:
+            query: The search query string.
+            limit: The maximum number of doc_ids to return.
+                If None, all matches are returned.
+            offset: The number of doc_ids to skip.
+            order: "bm25" to rank by relevance, or None for no ordering.
+            fields: The flattened keys of the fields to search, or None to
+                search every field.
+        Returns:
+            A list of doc_id for each matching document.
+        """
+        return [
+            hit.doc_id
+            for hit in self.search_hits(query, limit, offset, order, fields)
+        ]
+
+    def search_hits(
+        self,
+        query: str,
+        limit: int | None = None,
+        offset: int = 0,
+        order: SearchOrder | None = "bm25",
+        fields: Iterable[str] | None = None,
+    ) -> list[SearchHit]:
+        """Search every shard like `search`, returning the matches' ranks.
+
+        Args:
+            query: The search query string.
+            limit: The maximum number of matches to return.
+                If None, all matches are returned.
+            offset: The number of matches to skip.
+            order: "bm25" to rank by relevance, or None for no ordering.
+            fields: The flattened keys of the fields to search, or None to
+                search every field.
+        Returns:
+            A list of `SearchHit`, best match first with `order="bm25"`.
+        """
+        tokenized = self._shards[0]._tokenize_query(query)
+        keys = None if fields is None else tuple(fields)
+        shard_limit = -1 if limit is None else offset + limit
+        results = self._executor.map(
+            lambda shard: _search_shard(
+                shard, tokenized, shard_limit, order, keys
+            ),
+            self._shards,
+        )
+        if order == "bm25":
+            merged = heapq.merge(*results, key=attrgetter("rank"))
+        else:
+            merged = itertools.chain.from_iterable(results)
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(merged, offset, stop))
+
+    def insert(self, doc: Document, doc_id: DocumentId) -> None:
+        """Insert a document into its shard.
+
+        Args:
+            doc: A dictionary representing the document to insert.
+            doc_id: The ID of the document.
+        """
+        self._shard_of(doc_id).insert(doc, doc_id)
+
+    def insert_many(
+        self,
+        docs: Iterable[tuple[DocumentId, Document]],
+        batch_size: int = 1000,
+        workers: int = 1,
+        tokenizer_factory: Callable[[], Tokenizer] | None = None,
+    ) -> None:
+        """Insert many documents, writing to the shards in parallel.
+
+        Each batch is split by shard, and every shard commits its part in
+        its own transaction concurrently with the others.
+
+        Args:
+            docs: An iterable of (doc_id, doc) pairs.
+            batch_size: The number of documents per batch.
+            workers: The number of tokenizer processes. 1 tokenizes inline.
+            tokenizer_factory: A picklable callable creating a tokenizer in
+                each worker. Defaults to a copy of the shard tokenizer,
+                which keeps its options and must be picklable.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        tokenizer = self._shards[0]._tokenizer
+        if workers == 1 or tokenizer is None:
+            tokenize = self._shards[0]._tokenize_document
+            tokenized = ((doc_id, tokenize(doc)) for doc_id, doc in docs)
+        else:
+            from .pipeline import tokenize_documents
+
+            tokenized = (
+                (doc_id, fields)
+                for doc_id, _, fields in tokenize_documents(
+                    docs,
+                    tokenizer_factory
+                    or functools.partial(copy.copy, tokenizer),
+                    workers=workers,
+                    index_policy=self._shards[0]._index_policy,
+                    store_source=self._shards[0]._store_source,
+                )
+            )
+
+        self._insert_fields(tokenized, batch_size)
+
+    def update(self, doc: Document, doc_id: DocumentId) -> None:
+        """Update a document in its shard.
+
+        Args:
+            doc: A dictionary representing the updated document.
+            doc_id: The ID of the document to update.
+        """
+        self._shard_of(doc_id).update(doc, doc_id)
+
+    def delete(self, doc_id: DocumentId) -> None:
+        """Delete a document from its shard.
+
+        Args:
+            doc_id: The ID of the document to delete.
+        """
+        self._shard_of(doc_id).delete(doc_id)
+
+    def delete_many(
+        self,
+        doc_ids: Iterable[DocumentId],
+        batch_size: int = 1000,
+    ) -> None:
+        """Delete many documents, writing to the shards in parallel.
+
+        Args:
+            doc_ids: An iterable of document IDs to delete.
+            batch_size: The number of documents per batch.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        for batch in itertools.batched(doc_ids, batch_size, strict=False):
+            groups: defaultdict[int, list[DocumentId]] = defaultdict(list)
+            for doc_id in batch:
+                groups[self._shard_index(doc_id)].append(doc_id)
+            self._run_each(
+                lambda item: self._shards[item[0]].delete_many(item[1]),
+                groups.items(),
+            )
+
+    def add_shard(self, rebalance: bool = True) -> int:
+        """Add an empty shard to the index.
+
+        With jump consistent hashing, only about 1/N of the documents,
+        where N is the new number of shards, belong to the new shard, and
+        no document moves between the existing shards.
+
+        Until the index is rebalanced, the moved documents are still
+        found by searches but not by `update` and `delete`. Writes must
+        not run concurrently with adding a shard or rebalancing.
+
+        Args:
+            rebalance: If True, move the documents that now belong to the
+                new shard. Otherwise call `rebalance` later.
+        Returns:
+            The number of documents moved.
+        """
+        if self._access_mode != "readwrite":
+            raise ReadOnlyError(
+                f"the index was opened in {self._access_mode} mode"
+            )
+        shard = self._open_shard(self._shard_path(len(self._shards)))
+        shard.configure_merges(**self._shards[0]._merge_settings())
+        self._shards.append(shard)
+        return self.rebalance() if rebalance else 0
+
+    def rebalance(self, batch_size: int = 1000) -> int:
+        """Move every document to the shard its doc_id is assigned to.
+
+        Documents are copied to their new shard before being deleted from
+        the old one, and copying first removes any previous copy, so an
+        interrupted rebalance can simply be run again.
+
+        Args:
+            batch_size: The number of documents moved per transaction.
+        Returns:
+            The number of documents moved.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        moved = self._run_each(
+            lambda source: self._rebalance_shard(source, batch_size),
+            range(len(self._shards)),
+        )
+        return sum(moved)
+
+    def snapshot(
+        self,
+        directory: str | os.PathLike,
+        pages: int = 1024,
+        sleep: float = 0.0,
+    ) -> None:
+        """Back up every shard into a directory, in parallel.
+
+        Each shard is consistent on its own, but the shards are not
+        copied at one single point in time.
+
+        Args:
+            directory: The directory of the snapshot, which can be opened
+                as a sharded index. It is created if missing.
+            pages: The number of pages copied per step, or -1 for all.
+            sleep: The number of seconds to sleep between steps.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._run_each(
+            lambda i: self._shards[i].snapshot(
+                directory / self._shard_path(i).name, pages, sleep
+            ),
+            range(len(self._shards)),
+        )
+
+    def export_tokens(self, dest: str | os.PathLike) -> int:
+        """Write the tokenized fields of every shard to one file.
+
+        See `SqlLite3FullTextSearchEngine.export_tokens` for the format.
+
+        Args:
+            dest: The path of the file. It is replaced if it exists.
+        Returns:
+            The number of exported documents.
+        """
+        with ExitStack() as stack:
+            conns = [stack.enter_context(s._reader()) for s in self._shards]
+            return _write_tokens(
+                dest,
+                self._shards[0]._index_mode,
+                itertools.chain.from_iterable(map(_stored_fields, conns)),
+            )
+
+    def import_tokens(
+        self, src: str | os.PathLike, batch_size: int = 1000
+    ) -> int:
+        """Insert the documents of a token export into their shards.
+
+        The file may come from a single index or from a sharded index with
+        any number of shards, as each document goes to the shard of its
+        doc_id. Documents already in the index are replaced.
+
+        Args:
+            src: The path of a file written by `export_tokens`.
+            batch_size: The number of documents per batch.
+        Returns:
+            The number of imported documents.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        with _read_tokens(src, self._shards[0]._index_mode) as docs:
+            return self._insert_fields(docs, batch_size, replace=True)
+
+    def optimize(self) -> None:
+        """Merge the segments of every shard into one, in parallel."""
+        self._run_each(SqlLite3FullTextSearchEngine.optimize, self._shards)
+
+    def merge(self, pages: int = 256) -> bool:
+        """Run one incremental merge step on every shard, in parallel.
+
+        Args:
+            pages: The approximate number of pages written per shard.
+        Returns:
+            True if a step did some work on any shard.
+        """
+        return any(self._run_each(lambda s: s.merge(pages), self._shards))
+
+    def configure_merges(
+        self,
+        automerge: int | None = None,
+        crisismerge: int | None = None,
+        usermerge: int | None = None,
+    ) -> None:
+        """Tune the merging of every shard.
+
+        Shards added later inherit the settings of the first shard. See
+        `SqlLite3FullTextSearchEngine.configure_merges` for the arguments.
+        """
+        for shard in self._shards:
+            shard.configure_merges(automerge, crisismerge, usermerge)
+
+    def index_stats(self, count_terms: bool = True) -> IndexStats:
+        """Measure every shard and sum their statistics.
+
+        Args:
+            count_terms: If True, count the distinct terms of each shard.
+                Terms present in several shards are counted once per shard.
+        Returns:
+            The summed statistics. `levels` is the maximum over shards.
+        """
+        stats = self._run_each(
+            lambda s: s.index_stats(count_terms), self._shards
+        )
+        return IndexStats(
+            fields=sum(s.fields for s in stats),
+            segments=sum(s.segments for s in stats),
+            levels=max(s.levels for s in stats),
+            data_pages=sum(s.data_pages for s in stats),
+            data_bytes=sum(s.data_bytes for s in stats),
+            terms=sum(s.terms or 0 for s in stats) if count_terms else None,
+        )
+
+    def _rebalance_shard(self, source: int, batch_size: int) -> int:
+        """Move the misplaced documents of one shard."""
+        shard = self._shards[source]
+        with shard._reader() as conn:
+            misplaced = [
+                doc_id
+                for (doc_id,) in conn.execute(
+                    "SELECT DISTINCT doc_id FROM fields"
+                )
+                if self._shard_index(doc_id) != source
+            ]
+
+        for batch in itertools.batched(misplaced, batch_size, strict=False):
+            with shard._reader() as conn:
+                rows = [
+                    conn.execute(
+                        "SELECT key, text, digest, source FROM fields "
+                        "WHERE doc_id = ?",
+                        (doc_id,),
+                    ).fetchall()
+                    for doc_id in batch
+                ]
+            groups: defaultdict[int, list] = defaultdict(list)
+            for doc_id, fields in zip(batch, rows, strict=True):
+                groups[self._shard_index(doc_id)].append(
+                    (
+                        doc_id,
+                        {k: _TokenizedField(*v) for k, *v in fields},
+                    )
+                )
+            for target, docs in groups.items():
+                _insert_shard(self._shards[target], docs, replace=True)
+            with shard._write():
+                for doc_id in batch:
+                    shard._delete(doc_id)
+        return len(misplaced)
+
+    def _insert_fields(
+        self,
+        docs: Iterable[tuple[DocumentId, dict[str, _TokenizedField]]],
+        batch_size: int,
+        replace: bool = False,
+    ) -> int:
+        """Insert tokenized documents, writing to the shards in parallel.
+
+        Args:
+            docs: The documents and their tokenized fields.
+            batch_size: The number of documents per batch.
+            replace: If True, first delete the fields of each document.
+        Returns:
+            The number of inserted documents.
+        """
+        count = 0
+        for batch in itertools.batched(docs, batch_size, strict=False):
+            groups: defaultdict[int, list] = defaultdict(list)
+            for doc_id, fields in batch:
+                groups[self._shard_index(doc_id)].append((doc_id, fields))
+            self._run_each(
+                lambda item: _insert_shard(
+                    self._shards[item[0]], item[1], replace
+                ),
+                groups.items(),
+            )
+            count += len(batch)
+        return count
+
+    def _run_each[T, R](
+        self,
+        func: Callable[[T], R],
+        items: Iterable[T],
+    ) -> list[R]:
+        """Run a function on the thread pool for each item.
+
+        Every call runs to completion before the first error, if any, is
+        raised.
+        """
+        futures = [self._executor.submit(func, item) for item in items]
+        for future in futures:
+            future.exception()
+        return [future.result() for future in futures]
+
+    def _shard_of(self, doc_id: DocumentId) -> SqlLite3FullTextSearchEngine:
+        """Get the shard a document is assigned to."""
+        return self._shards[self._shard_index(doc_id)]
+
+    def _shard_index(self, doc_id: str) -> int:
+        """Get the index of the shard a document is assigned to."""
+        key = int.from_bytes(
+            hashlib.blake2b(doc_id.encode(), digest_size=8).digest()
+        )
+        return _jump_hash(key, len(self._shards))
+
+    def _shard_path(self, index: int) -> Path:
+        """Get the path of a shard file."""
+        return self._directory / f"shard-{index:04d}.db"
+
+    def _close_shards(self) -> None:
+        """Close every opened shard."""
+        for shard in self._shards:
+            shard.close()
+
+
+def _search_shard(
+    shard: SqlLite3FullTextSearchEngine,
+    tokenized: str,
+    limit: int,
+    order: SearchOrder | None,
+    fields: tuple[str, ...] | None = None,
+) -> list[SearchHit]:
+    """Run a tokenized query on one shard."""
+    sql, params = shard._search_statement(tokenized, order, fields)
+    with shard._reader() as conn:
+        return [
+            SearchHit._make(row)
+            for row in conn.execute(sql + " LIMIT ?", (*params, limit))
+        ]
+
+
+def _insert_shard(
+    shard: SqlLite3FullTextSearchEngine,
+    docs: list[tuple[DocumentId, dict[str, _TokenizedField]]],
+    replace: bool = False,
+) -> None:
+    """Insert tokenized documents into one shard in one transaction."""
+    with shard._write():
+        for doc_id, fields in docs:
+            if replace:
+                shard._delete(doc_id)
+            shard._insert_tokenized(doc_id, fields)
+
+
+def _jump_hash(key: int, buckets: int) -> int:
+    """Map a 64-bit key to a bucket with jump consistent hashing.
+
+    Growing from N to N + 1 buckets moves a key only if it lands in the
+    new bucket, which happens for about 1/(N + 1) of the keys.
+
+    Args:
+        key: A 64-bit unsigned integer, e.g. a hash of the doc_id.
+        buckets: The number of buckets.
+    Returns:
+        The bucket index in range(buckets).
+    """
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
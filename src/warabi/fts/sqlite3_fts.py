@@ -1,54 +1,603 @@
+import copy
+import functools
+import gzip
+import hashlib
+import itertools
+import json
 import os
 import sqlite3
+import threading
+import time
 import unicodedata
-import uuid
+from collections.abc import Callable, Generator, Iterable
+from contextlib import contextmanager, nullcontext, suppress
+from typing import IO, NamedTuple
 
-from ..common import Document, DocumentId
+from ..cache import CacheInfo, LRUCache
+from ..common import AccessMode, Document, DocumentId
+from ..errors import IndexModeMismatchError, ReadOnlyError
+from ..instrumentation import Instrumentation, commit_recorder, timer
+from ..sqlite_utils import (
+    READ_ONLY_MMAP_SIZE,
+    ConnectionPool,
+    apply_pragmas,
+    connect,
+    read_only_uri,
+    relaxed_durability,
+    remove_database,
+    transaction,
+)
 from ..tokenizer import Tokenizer
-from . import FullTextSearchEngine
+from . import FullTextSearchEngine, IndexMode, SearchHit, SearchOrder
+from .index_policy import IndexPolicy
+
+_FTS_TOKENIZE: dict[IndexMode, str] = {
+    "morphological": "unicode61 remove_diacritics 0",
+    "trigram": "trigram",
+}
+
+_STRUCTURE_ROWID = 10
+"""The rowid of the FTS5 structure record in the `texts_data` table."""
+
+_TOKENS_FORMAT = "warabi-tokens"
+"""The format name in the header line of `export_tokens` files."""
+_TOKENS_VERSION = 1
+"""The version of the file format of `export_tokens`."""
+
+
+class IndexStats(NamedTuple):
+    """The size and layout of a full-text index."""
+
+    fields: int
+    """The number of indexed fields."""
+    segments: int
+    """The number of FTS5 segments. Each query reads every segment."""
+    levels: int
+    """The number of FTS5 segment levels."""
+    data_pages: int
+    """The number of FTS5 data pages, including the structure record."""
+    data_bytes: int
+    """The total size of the FTS5 data pages in bytes."""
+    terms: int | None
+    """The number of distinct terms of the texts, or None if not counted."""
 
 
 class SqlLite3FullTextSearchEngine(FullTextSearchEngine):
     def __init__(
         self,
-        tokenizer: Tokenizer,
+        tokenizer: Tokenizer | None,
         path: str | os.PathLike | None = None,
+        query_tokenizer: Tokenizer | None = None,
+        result_cache_size: int = 0,
+        result_cache_max_ids: int | None = None,
+        threadsafe: bool = False,
+        read_pool_size: int = 4,
+        mmap_size: int | None = None,
+        cache_size: int | None = None,
+        index_mode: IndexMode = "morphological",
+        instrumentation: Instrumentation | None = None,
+        index_policy: IndexPolicy | None = None,
+        access_mode: AccessMode = "readwrite",
+        store_source: bool = False,
     ) -> None:
+        """Initialize SqlLite3FullTextSearchEngine.
+
+        Args:
+            tokenizer: The tokenizer used to index documents. Must be None
+                in trigram mode, which does no Python-side tokenization.
+            path: Path to the database file. If None, uses in-memory storage.
+            query_tokenizer: The tokenizer used for search queries.
+                Defaults to `tokenizer`. It must produce the same tokens,
+                e.g. a `CachedTokenizer` wrapping the same kind of tokenizer.
+            result_cache_size: The maximum number of cached `search`
+                results. 0 disables the result cache.
+            result_cache_max_ids: The maximum total number of doc_ids held
+                by the result cache, or None for no limit.
+            threadsafe: If True, the engine can be shared between threads.
+                The database is switched to WAL mode, writes go through a
+                single locked writer connection, and searches borrow
+                read-only connections from a pool so they run concurrently
+                with each other and with writes. Each thread tokenizes
+                with its own shallow copy of the tokenizers, as most
+                tokenizers can't be used by two threads at once. Requires
+                a file path.
+            read_pool_size: The maximum number of read-only connections
+                kept for reuse in thread-safe mode. Reads beyond it, such
+                as more live `iter_search` iterations, open a temporary
+                connection.
+            mmap_size: The `mmap_size` pragma for every connection, or None
+                to keep the SQLite default, or `READ_ONLY_MMAP_SIZE` in a
+                read-only access mode.
+            cache_size: The `cache_size` pragma for every connection, or
+                None to keep the SQLite default.
+            index_mode: "morphological" indexes the tokens produced by
+                `tokenizer`. "trigram" indexes NFKC-normalized text with
+                the FTS5 trigram tokenizer, so searches match substrings.
+                The mode is fixed when the index is created.
+            instrumentation: Collects the latency of each stage of
+                indexing and searching, or None to disable it.
+            index_policy: Selects the fields of documents that are
+                indexed, or None to index every field.
+            access_mode: "readwrite" creates and migrates the index as
+                needed. "readonly" and "immutable" open an existing index
+                for searching only, e.g. in search worker processes: no
+                schema is created or migrated and writes raise
+                `ReadOnlyError`. Memory-mapping the file lets every such
+                process share the OS page cache. See `AccessMode`.
+            store_source: If True, keep the NFKC-normalized text of each
+                field written by this engine next to its tokens, so that
+                `rebuild` can re-tokenize the index without the original
+                documents. This stores the text of each field a second
+                time. Trigram indexes need no source, as their text is the
+                normalized text.
+        Raises:
+            IndexModeMismatchError: If an existing index was created with
+                another index mode.
+            ReadOnlyError: If a read-only index has an older schema
+                version, which only a read-write open migrates.
+        """
+        if threadsafe and path is None:
+            raise ValueError("threadsafe mode requires a database file path")
+        if index_mode not in _FTS_TOKENIZE:
+            raise ValueError(f"unsupported index mode: {index_mode!r}")
+        if (tokenizer is None) != (index_mode == "trigram"):
+            raise ValueError(
+                "a tokenizer is required in morphological mode "
+                "and not allowed in trigram mode"
+            )
+
         self._tokenizer = tokenizer
+        self._index_policy = index_policy
+        self._store_source = store_source
+        self._instrumentation = instrumentation
+        self._on_commit = commit_recorder(instrumentation, "fts.commit")
+        self._query_tokenizer = query_tokenizer or tokenizer
         self._path = str(path) if path is not None else ":memory:"
-        self._conn = sqlite3.connect(self._path)
+        self._access_mode = access_mode
+        if access_mode != "readwrite" and mmap_size is None:
+            mmap_size = READ_ONLY_MMAP_SIZE
+        self._conn = connect(
+            self._path, access_mode, check_same_thread=not threadsafe
+        )
         self._cursor = self._conn.cursor()
+        self._read_pool: ConnectionPool | None = None
+        self._closed = False
+        self._write_lock = threading.RLock()
+        apply_pragmas(self._conn, mmap_size, cache_size)
+        self._prepare_schema(index_mode, wal=threadsafe)
+        self._index_mode = _index_mode(self._conn)
+        if self._index_mode != index_mode:
+            self.close()
+            raise IndexModeMismatchError(
+                f"the index was created in {self._index_mode} mode, "
+                f"not {index_mode} mode"
+            )
 
-        self._cursor.execute(
-            """
-            CREATE VIRTUAL TABLE IF NOT EXISTS texts USING fts5(
-                text_id,
-                doc_id,
-                key,
-                text,
-                tokenize = "unicode61 remove_diacritics 0"
-            );
-            """
-        )
-        self._conn.commit()
+        if threadsafe:
+
+            def connect_reader() -> sqlite3.Connection:
+                conn = connect(
+                    self._path,
+                    "readonly" if access_mode == "readwrite" else access_mode,
+                    check_same_thread=False,
+                )
+                apply_pragmas(conn, mmap_size, cache_size)
+                return conn
+
+            self._read_pool = ConnectionPool(connect_reader, read_pool_size)
+            # A dedicated connection for `PRAGMA data_version`, whose value
+            # is only comparable between calls on the same connection.
+            self._version_conn = connect_reader()
+            self._version_lock = threading.Lock()
+            self._thread_tokenizers = threading.local()
+
+        self._generation = 0
+        self._result_cache: LRUCache[tuple, tuple[str, ...]] | None = None
+        if result_cache_size > 0:
+            self._result_cache = LRUCache(
+                maxsize=result_cache_size,
+                max_weight=result_cache_max_ids,
+                weigh=lambda _, ids: len(ids),
+            )
 
     def __del__(self):
         """Ensure the database connection is closed"""
+        # The engine may be collected on another thread than the one owning
+        # its connection, which SQLite then closes on deallocation.
+        with suppress(sqlite3.ProgrammingError):
+            self.close()
+
+    def close(self) -> None:
+        """Close the database connections of the engine.
+
+        Closing an engine more than once has no effect.
+        """
+        if getattr(self, "_closed", True):
+            return
+        if self._read_pool is not None:
+            self._read_pool.close()
+            self._version_conn.close()
         self._conn.close()
+        self._closed = True
 
-    def search(self, query: str) -> list[str]:
+    def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        offset: int = 0,
+        order: SearchOrder | None = "bm25",
+        fields: Iterable[str] | None = None,
+    ) -> list[str]:
         """Search for documents matching the query.
+
+        Matches are collapsed to one row per document in SQL. With
+        `order="bm25"`, a document is ranked by its best matching field.
+
+        Args:
+            query: The search query string.
+            limit: The maximum number of doc_ids to return.
+                If None, all matches are returned.
+            offset: The number of doc_ids to skip.
+            order: "bm25" to rank by relevance, or None for no ordering.
+            fields: The flattened keys of the fields to search, such as
+                "@root.title", or None to search every field.
+        Returns:
+            A list of doc_id for each matching document.
+        """
+        keys = None if fields is None else tuple(fields)
+        if self._instrumentation is None:
+            tokenized = self._tokenize_query(query)
+            return self._cached_search(tokenized, limit, offset, order, keys)
+
+        start = time.perf_counter()
+        tokenized = self._tokenize_query(query)
+        results = self._cached_search(tokenized, limit, offset, order, keys)
+        self._instrumentation.record_search(
+            query, tokenized, time.perf_counter() - start
+        )
+        return results
+
+    @contextmanager
+    def transaction(self) -> Generator[None]:
+        """Group several writes into a single transaction.
+
+        Writes made inside the block by this engine, or by other components
+        sharing its connection, are committed together when the block exits
+        and rolled back together if it raises.
+
+        Returns:
+            A context manager wrapping the transaction.
+        """
+        with self._write():
+            yield
+
+    def optimize(self) -> None:
+        """Merge every segment of the index into one.
+
+        This removes deleted entries and makes queries read a single
+        segment, but it rewrites the whole index in one transaction and
+        blocks writers meanwhile. Prefer `merge` for large indexes that are
+        still being written to.
+        """
+        with self._maintenance():
+            self._conn.execute("INSERT INTO texts (texts) VALUES ('optimize')")
+
+    def merge(self, pages: int = 256) -> bool:
+        """Run one bounded incremental merge step.
+
+        Call this repeatedly during idle time, e.g. with `IndexMaintainer`,
+        until it returns False.
+
+        Args:
+            pages: The approximate number of pages to write. A positive
+                value merges levels with at least `usermerge` segments,
+                and a negative value merges the segments of every level,
+                like an `optimize` done in steps.
+        Returns:
+            True if the step did some work, so more may remain.
+        """
+        with self._maintenance():
+            before = self._conn.total_changes
+            self._conn.execute(
+                "INSERT INTO texts (texts, rank) VALUES ('merge', ?)",
+                (pages,),
+            )
+            # FTS5 reports work done through the change counter.
+            return self._conn.total_changes - before >= 2
+
+    def configure_merges(
+        self,
+        automerge: int | None = None,
+        crisismerge: int | None = None,
+        usermerge: int | None = None,
+    ) -> None:
+        """Tune the merging of the index. The settings are stored in it.
+
+        Args:
+            automerge: The number of segments on a level that triggers an
+                automatic merge on write, or 0 to disable automatic merges
+                and leave them to `merge`. The FTS5 default is 4.
+            crisismerge: The number of segments on a level that forces a
+                merge on write, which bounds the segment count. The FTS5
+                default is 16.
+            usermerge: The minimum number of segments merged by `merge`
+                with a positive page count. The FTS5 default is 4.
+        """
+        options = {
+            "automerge": automerge,
+            "crisismerge": crisismerge,
+            "usermerge": usermerge,
+        }
+        with self._maintenance():
+            for name, value in options.items():
+                if value is not None:
+                    self._conn.execute(
+                        "INSERT INTO texts (texts, rank) VALUES (?, ?)",
+                        (name, value),
+                    )
+
+    def snapshot(
+        self,
+        dest: str | os.PathLike,
+        pages: int = 1024,
+        sleep: float = 0.0,
+    ) -> None:
+        """Back up the database to a file while searches and writes go on.
+
+        Pages are copied in steps by the SQLite backup API from a separate
+        read-only connection. That connection holds one read transaction
+        for the whole copy, so the snapshot is consistent even if the
+        index is written meanwhile. In WAL mode, as with `threadsafe`, it
+        blocks no other connection. The copy is written next to `dest` and
+        renamed over it when complete.
+
+        An in-memory database is copied from the engine connection, which
+        is locked against writes meanwhile.
+
+        Args:
+            dest: The path of the snapshot file. It is replaced if it
+                exists.
+            pages: The number of pages copied per step, or -1 for all.
+            sleep: The number of seconds to sleep between steps, to leave
+                I/O bandwidth to queries.
+        """
+        dest = os.fspath(dest)
+        partial = f"{dest}.partial"
+        remove_database(partial)
+        try:
+            target = sqlite3.connect(partial)
+            try:
+                if self._path == ":memory:":
+                    with self._write_lock:
+                        self._conn.backup(target, pages=pages, sleep=sleep)
+                else:
+                    source = sqlite3.connect(
+                        read_only_uri(self._path), uri=True
+                    )
+                    try:
+                        source.execute("BEGIN")
+                        source.execute("SELECT count(*) FROM sqlite_master")
+                        source.backup(target, pages=pages, sleep=sleep)
+                    finally:
+                        source.close()
+            finally:
+                target.close()
+            os.replace(partial, dest)
+        except BaseException:
+            remove_database(partial)
+            raise
+
+    def rebuild(
+        self,
+        docs: Iterable[tuple[DocumentId, Document]] | None = None,
+        tokenizer: Tokenizer | None = None,
+        query_tokenizer: Tokenizer | None = None,
+        batch_size: int = 1000,
+        workers: int = 1,
+        tokenizer_factory: Callable[[], Tokenizer] | None = None,
+    ) -> None:
+        """Replace the whole index by one built from `docs`.
+
+        The new index is bulk loaded into a side file next to the database,
+        optimized, and copied over the database in a single transaction.
+        Searches keep using the current index until then. Writes wait
+        until the swap, because the new index only holds `docs`.
+
+        Args:
+            docs: An iterable of (doc_id, doc) pairs, e.g. from the source
+                of truth of the documents, or None to re-tokenize the
+                source texts stored with `store_source`. That skips
+                flattening and normalization, and runs in this process.
+            tokenizer: The tokenizer of the new index. Defaults to the
+                current one. Must be None in trigram mode.
+            query_tokenizer: The tokenizer used for search queries.
+                Defaults to `tokenizer`, or to the current query tokenizer
+                if `tokenizer` is None.
+            batch_size: The number of documents per transaction.
+            workers: The number of tokenizer processes. 1 tokenizes inline.
+            tokenizer_factory: A picklable callable creating a tokenizer in
+                each worker. Defaults to a copy of `tokenizer`.
+        Raises:
+            ValueError: If `docs` is None and a field of the index has no
+                stored source.
+        """
+        with self._rebuilding(tokenizer, query_tokenizer) as builder:
+            if docs is None:
+                with relaxed_durability(builder._conn):
+                    builder._insert_fields(
+                        self._retokenized_fields(
+                            builder._tokenizer, batch_size
+                        ),
+                        batch_size,
+                    )
+                return
+            builder.insert_many(
+                docs,
+                batch_size=batch_size,
+                relax_durability=True,
+                workers=workers,
+                tokenizer_factory=tokenizer_factory,
+            )
+
+    def export_tokens(self, dest: str | os.PathLike) -> int:
+        """Write the tokenized fields of every document to a file.
+
+        The file is JSON Lines: a header line with the format version and
+        index mode, then one line per document mapping each flattened key
+        to its tokens, the digest of its value and its source text, if
+        stored. A ".gz" suffix compresses it with gzip. The file is
+        written next to `dest` and renamed over it when complete.
+
+        Use `import_tokens` to load it into another index without running
+        the tokenizer, e.g. to move an index between machines or to load
+        shards prepared elsewhere.
+
+        Args:
+            dest: The path of the file. It is replaced if it exists.
+        Returns:
+            The number of exported documents.
+        """
+        with self._reader() as conn:
+            return _write_tokens(dest, self._index_mode, _stored_fields(conn))
+
+    def import_tokens(
+        self,
+        src: str | os.PathLike,
+        batch_size: int = 1000,
+        relax_durability: bool = False,
+    ) -> int:
+        """Insert the documents of a file written by `export_tokens`.
+
+        The fields are inserted as tokenized in the file, so they must
+        match the tokenizer of this engine for searches to find them.
+        Documents already in the index are replaced, so an interrupted
+        import can be run again.
+
+        Args:
+            src: The path of the file, compressed if it ends with ".gz".
+            batch_size: The number of documents per transaction.
+            relax_durability: If True, lower `synchronous` and
+                `journal_mode` for the duration of the load.
+        Returns:
+            The number of imported documents.
+        Raises:
+            ValueError: If the file is not a supported token export.
+            IndexModeMismatchError: If the file was exported from an index
+                in another index mode.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self._check_writable()
+
+        with (
+            _read_tokens(src, self._index_mode) as docs,
+            relaxed_durability(self._conn)
+            if relax_durability
+            else nullcontext(),
+        ):
+            return self._insert_fields(docs, batch_size, replace=True)
+
+    def index_stats(self, count_terms: bool = True) -> IndexStats:
+        """Measure the size and layout of the index.
+
+        A growing segment count means that writes outpace merging, and
+        queries slow down as they read every segment.
+
+        Args:
+            count_terms: If True, count the distinct terms with the
+                `fts5vocab` module. This scans the whole index.
+        Returns:
+            The statistics of the index.
+        """
+        with self._reader() as conn:
+            (fields,) = conn.execute("SELECT count(*) FROM fields").fetchone()
+            data_pages, data_bytes = conn.execute(
+                "SELECT count(*), coalesce(sum(length(block)), 0) "
+                "FROM texts_data"
+            ).fetchone()
+            row = conn.execute(
+                "SELECT block FROM texts_data WHERE id = ?",
+                (_STRUCTURE_ROWID,),
+            ).fetchone()
+            levels, segments = (0, 0) if row is None else _structure(row[0])
+            terms = None
+            if count_terms:
+                # The key column has terms too, so count per column.
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS temp.texts_vocab "
+                    "USING fts5vocab(main, texts, col)"
+                )
+                (terms,) = conn.execute(
+                    "SELECT count(*) FROM temp.texts_vocab WHERE col = 'text'"
+                ).fetchone()
+        return IndexStats(
+            fields, segments, levels, data_pages, data_bytes, terms
+        )
+
+    def result_cache_info(self) -> CacheInfo | None:
+        """Get the statistics of the search result cache.
+
+        Returns:
+            The cache statistics, or None if the cache is disabled.
+        """
+        if self._result_cache is None:
+            return None
+        return self._result_cache.cache_info()
+
+    def iter_search(
+        self,
+        query: str,
+        batch_size: int = 1000,
+        order: SearchOrder | None = "bm25",
+        with_hits: bool = False,
+        fields: Iterable[str] | None = None,
+    ) -> Generator[str] | Generator[SearchHit]:
+        """Lazily iterate over the documents matching the query.
+
+        Rows are fetched `batch_size` at a time on a dedicated cursor, so
+        several iterations can run at once and the memory held in Python
+        does not grow with the number of matches.
+
         Args:
             query: The search query string.
+            batch_size: The number of rows fetched per round trip.
+            order: "bm25" to rank by relevance, or None for no ordering.
+            with_hits: If True, yield `SearchHit` tuples with the key and
+                rank of the best matching field instead of doc_ids.
+            fields: The flattened keys of the fields to search, or None to
+                search every field.
         Returns:
-            A list of tuples containing text_id, doc_id, key,
-            and text for each matching document.
+            A generator of doc_ids, or of `SearchHit` if `with_hits`.
         """
-        self._cursor.execute(
-            "SELECT text_id, doc_id, key, text FROM texts WHERE text MATCH ?",
-            (self._tokenize(query),),
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        sql, params = self._search_statement(
+            self._tokenize_query(query),
+            order,
+            None if fields is None else tuple(fields),
         )
-        return [r[1] for r in self._cursor.fetchall()]
+        return self._iter_rows(sql, params, batch_size, with_hits)
+
+    def _iter_rows(
+        self,
+        sql: str,
+        params: tuple,
+        batch_size: int,
+        with_hits: bool,
+    ) -> Generator:
+        """Yield search rows batch by batch from a dedicated cursor."""
+        with self._reader() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                while rows := cursor.fetchmany(batch_size):
+                    if with_hits:
+                        yield from (SearchHit._make(r) for r in rows)
+                    else:
+                        yield from (r[0] for r in rows)
+            finally:
+                cursor.close()
 
     def insert(self, doc: Document, doc_id: DocumentId) -> None:
         """Insert a document into the full-text search index.
@@ -56,55 +605,1152 @@ class SqlLite3FullTextSearchEngine(FullTextSearchEngine):
         Args:
             doc: A dictionary representing the document to insert.
         """
+        with self._write():
+            self._insert(doc, doc_id)
 
-        self._cursor.executemany(
-            "INSERT INTO texts (text_id, doc_id, key, text)"
-            "VALUES (:text_id, :doc_id, :key, :text)",
-            tuple(
-                {
-                    "text_id": str(uuid.uuid4()),
-                    "doc_id": doc_id,
-                    "key": k,
-                    "text": self._tokenize(v),
-                }
-                for k, v in _flatten_document(doc).items()
-            ),
-        )
-        self._conn.commit()
+    def insert_many(
+        self,
+        docs: Iterable[tuple[DocumentId, Document]],
+        batch_size: int = 1000,
+        relax_durability: bool = False,
+        workers: int = 1,
+        tokenizer_factory: Callable[[], Tokenizer] | None = None,
+        queue_size: int | None = None,
+    ) -> None:
+        """Insert many documents, committing once per batch.
+
+        Documents are consumed lazily, so `docs` may be a generator over a
+        corpus that does not fit in memory.
+
+        With `workers` equal to 1, each batch is tokenized with the write
+        lock held, like `insert`. With `workers` greater than 1, flattening,
+        normalization and tokenization run in a pool of worker processes,
+        each with its own tokenizer built by `tokenizer_factory`. This
+        process stays the only writer and inserts the results in input
+        order. A batch tokenized before a concurrent `rebuild` swapped in
+        another tokenizer is tokenized again in this process.
+
+        Args:
+            docs: An iterable of (doc_id, doc) pairs.
+            batch_size: The number of documents per transaction.
+            relax_durability: If True, lower `synchronous` and
+                `journal_mode` for the duration of the load and restore
+                them afterwards.
+            workers: The number of tokenizer processes. 1 tokenizes inline.
+            tokenizer_factory: A picklable callable creating a tokenizer in
+                each worker. Defaults to a copy of the engine tokenizer,
+                which keeps its options and must be picklable.
+            queue_size: The maximum number of chunks in flight before
+                reading more documents. Defaults to twice `workers`.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self._check_writable()
+
+        tokenizer = self._tokenizer
+        if workers == 1 or tokenizer is None:
+            tokenized: Iterable[
+                tuple[DocumentId, Document, dict[str, _TokenizedField] | None]
+            ] = ((doc_id, doc, None) for doc_id, doc in docs)
+        else:
+            from .pipeline import tokenize_documents
+
+            tokenized = tokenize_documents(
+                docs,
+                tokenizer_factory or functools.partial(copy.copy, tokenizer),
+                workers=workers,
+                queue_size=queue_size,
+                index_policy=self._index_policy,
+                store_source=self._store_source,
+            )
+
+        with (
+            relaxed_durability(self._conn)
+            if relax_durability
+            else nullcontext()
+        ):
+            self._insert_documents(tokenized, batch_size, tokenizer)
 
     def delete(self, doc_id: DocumentId) -> None:
         """Delete a document from the full-text search index.
         Args:
             doc_id: The ID of the document to delete.
         """
-        self._cursor.execute(
-            "DELETE FROM texts WHERE doc_id = ?",
-            (doc_id,),
+        with self._write():
+            self._delete(doc_id)
+
+    def delete_many(
+        self,
+        doc_ids: Iterable[DocumentId],
+        batch_size: int = 1000,
+    ) -> None:
+        """Delete many documents, committing once per batch.
+
+        Args:
+            doc_ids: An iterable of document IDs to delete.
+            batch_size: The number of documents per transaction.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        for batch in itertools.batched(doc_ids, batch_size, strict=False):
+            with self._write():
+                for doc_id in batch:
+                    self._delete(doc_id)
+
+    def update(self, doc: Document, doc_id: DocumentId) -> None:
+        """Update a document, re-tokenizing only the fields that changed.
+
+        Each stored field keeps a digest of its source value. Fields whose
+        digest is unchanged are left untouched, changed fields are
+        re-tokenized and rewritten, and fields no longer present are
+        removed, all in one transaction. Updating a document that is not
+        indexed inserts it.
+
+        Args:
+            doc: A dictionary representing the updated document.
+            doc_id: The ID of the document to update.
+        """
+        values = _flatten_document(doc, self._index_policy)
+        with self._write():
+            stored: dict[str, tuple[int, bytes | None]] = {}
+            removed: list[int] = []
+            for row_id, key, digest in self._cursor.execute(
+                "SELECT id, key, digest FROM fields WHERE doc_id = ?",
+                (doc_id,),
+            ).fetchall():
+                if key in stored or key not in values:
+                    removed.append(row_id)
+                else:
+                    stored[key] = (row_id, digest)
+
+            dirty: list[tuple[str, bytes]] = []
+            for key, value in values.items():
+                digest = _digest(value)
+                if key not in stored or stored[key][1] != digest:
+                    dirty.append((key, digest))
+            normalized = _normalize_texts(
+                [values[key] for key, _ in dirty], self._instrumentation
+            )
+            texts = _tokenize_normalized(
+                self._local_tokenizer(self._tokenizer),
+                normalized,
+                self._instrumentation,
+            )
+            keep_source = self._store_source and self._tokenizer is not None
+
+            changed: list[tuple[str, bytes, str | None, int]] = []
+            added: dict[str, _TokenizedField] = {}
+            for (key, digest), text, source in zip(
+                dirty, texts, normalized, strict=True
+            ):
+                source = source if keep_source else None
+                if key in stored:
+                    changed.append((text, digest, source, stored[key][0]))
+                else:
+                    added[key] = _TokenizedField(text, digest, source)
+
+            with timer(self._instrumentation, "fts.write"):
+                self._cursor.executemany(
+                    "DELETE FROM fields WHERE id = ?",
+                    ((row_id,) for row_id in removed),
+                )
+                self._cursor.executemany(
+                    "UPDATE fields SET text = ?, digest = ?, source = ? "
+                    "WHERE id = ?",
+                    changed,
+                )
+            self._insert_tokenized(doc_id, added)
+
+    def _cached_search(
+        self,
+        tokenized: str,
+        limit: int | None,
+        offset: int,
+        order: SearchOrder | None,
+        fields: tuple[str, ...] | None = None,
+    ) -> list[str]:
+        """Run a search, using the result cache if it is enabled."""
+        if self._result_cache is None:
+            return self._search(tokenized, limit, offset, order, fields)
+
+        key = (
+            self._write_generation(),
+            tokenized,
+            limit,
+            offset,
+            order,
+            fields,
+        )
+        if (cached := self._result_cache.get(key)) is not None:
+            return list(cached)
+        results = self._search(tokenized, limit, offset, order, fields)
+        self._result_cache.put(key, tuple(results))
+        return results
+
+    def _search(
+        self,
+        tokenized: str,
+        limit: int | None,
+        offset: int,
+        order: SearchOrder | None,
+        fields: tuple[str, ...] | None = None,
+    ) -> list[str]:
+        """Run a search for an already tokenized query."""
+        sql, params = self._search_statement(tokenized, order, fields)
+        with (
+            self._reader() as conn,
+            timer(self._instrumentation, "fts.query"),
+        ):
+            return [
+                r[0]
+                for r in conn.execute(
+                    sql + " LIMIT ? OFFSET ?",
+                    (*params, -1 if limit is None else limit, offset),
+                )
+            ]
+
+    def _search_statement(
+        self,
+        tokenized: str,
+        order: SearchOrder | None,
+        fields: tuple[str, ...] | None = None,
+    ) -> tuple[str, tuple]:
+        """Build the search statement for an already tokenized query.
+
+        The statement selects one row per matching document with the
+        columns doc_id, key and rank.
+
+        Every term is quoted as an FTS5 string, so a query matches its
+        tokens literally and never as FTS5 query syntax.
+
+        In morphological mode, `fields` is matched by the FTS5 query
+        against the `key_token` column, so only the postings of those
+        keys are visited.
+
+        In trigram mode, terms of at least three characters are matched
+        by the trigram index. Shorter terms cannot use it and are matched
+        with LIKE against the stored text instead. `fields` is matched on
+        the key of each joined row, because trigram-indexing the keys
+        would grow the index by a trigram per key character.
+        """
+        if fields is not None and not fields:
+            return _search_sql(order, "0"), ()
+
+        if self._index_mode == "morphological":
+            if not tokenized.strip():
+                # E.g. a query of stopwords only, which FTS5 cannot parse.
+                return _search_sql(order, "0"), ()
+            terms = _quote_terms(tokenized.split())
+            if fields is None:
+                return _search_sql(order, "t.text MATCH ?"), (terms,)
+            keys = " OR ".join(f'"{_key_token(k)}"' for k in fields)
+            return _search_sql(order, "t.texts MATCH ?"), (
+                f"text : ({terms}) AND key_token : ({keys})",
+            )
+
+        long_terms = [t for t in tokenized.split() if len(t) >= 3]
+        short_terms = [t for t in tokenized.split() if len(t) < 3]
+        conditions = []
+        params: list[str] = []
+        if long_terms:
+            conditions.append("t.text MATCH ?")
+            params.append(_quote_terms(long_terms))
+        for term in short_terms:
+            conditions.append("f.text LIKE ? ESCAPE '\\'")
+            params.append(f"%{_escape_like(term)}%")
+        if conditions and fields is not None:
+            conditions.append(f"f.key IN ({', '.join('?' * len(fields))})")
+            params.extend(fields)
+        return _search_sql(order, " AND ".join(conditions) or "0"), tuple(
+            params
         )
-        self._conn.commit()
 
-    def _tokenize(self, text: str) -> str:
-        """Tokenize a given text using the configured tokenizer.
+    @contextmanager
+    def _reader(self) -> Generator[sqlite3.Connection]:
+        """Get a connection for read-only queries.
+
+        In thread-safe mode this borrows a pooled read-only connection,
+        otherwise it is the engine connection.
+        """
+        if self._read_pool is None:
+            yield self._conn
+        else:
+            with self._read_pool.connection() as conn:
+                yield conn
+
+    def _write_generation(self) -> tuple[int, int]:
+        """Identify the current state of the index for result caching.
+
+        The local counter is bumped by every write of this engine, and
+        `PRAGMA data_version` changes when another connection, possibly in
+        another process, commits to the same database file.
+        """
+        if self._read_pool is None:
+            conn = self._conn
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        else:
+            with self._version_lock:
+                conn = self._version_conn
+                data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        return self._generation, data_version
+
+    @contextmanager
+    def _write(self) -> Generator[None]:
+        """Run a write transaction and invalidate cached search results.
 
-        This method normalizes the text to NFKC form and tokenizes it,
-        returning a string of tokens joined by spaces.
+        Writes are serialized by a lock so the single writer connection
+        can be shared between threads.
+        """
+        self._check_writable()
+        with self._write_lock:
+            try:
+                with transaction(self._conn, self._on_commit):
+                    yield
+            finally:
+                self._generation += 1
+                if self._result_cache is not None:
+                    self._result_cache.clear()
+
+    @contextmanager
+    def _rebuilding(
+        self,
+        tokenizer: Tokenizer | None,
+        query_tokenizer: Tokenizer | None = None,
+    ) -> Generator["SqlLite3FullTextSearchEngine"]:
+        """Build a replacement database and swap it in on exit.
+
+        The yielded engine writes to an empty side database with the index
+        mode, policy and merge settings of this one. If the block completes,
+        the tables of other owners sharing the file, such as those of a
+        `Sqlite3KVStore`, are copied into the side database, unless the
+        block created them. The side database is then optimized and copied
+        over this database by the backup API, which replaces its pages in
+        one transaction. Writes made by other connections to those tables
+        in the meantime are lost.
 
         Args:
-            text: The text to tokenize.
+            tokenizer: The tokenizer of the new index, or None to keep the
+                current one.
+            query_tokenizer: The new query tokenizer, or None for the
+                default described in `rebuild`.
         Returns:
-            A string of tokens joined by spaces.
+            A context manager yielding the engine of the side database.
+        Raises:
+            ValueError: If the database holds a virtual table of another
+                owner, which can't be copied.
         """
-        return " ".join(
-            [
-                t
-                for t in self._tokenizer.tokenize(
-                    unicodedata.normalize("NFKC", text)
+        self._check_writable()
+        _check_copyable(self._conn)
+        if tokenizer is None:
+            tokenizer = self._tokenizer
+            query_tokenizer = query_tokenizer or self._query_tokenizer
+        else:
+            query_tokenizer = query_tokenizer or tokenizer
+
+        side = None if self._path == ":memory:" else f"{self._path}.rebuild"
+        with self._write_lock:
+            if side is not None:
+                remove_database(side)
+            builder = SqlLite3FullTextSearchEngine(
+                tokenizer,
+                side,
+                index_mode=self._index_mode,
+                index_policy=self._index_policy,
+                store_source=self._store_source,
+            )
+            try:
+                builder.configure_merges(**self._merge_settings())
+                yield builder
+                _copy_other_tables(self._conn, builder._conn)
+                builder.optimize()
+                with timer(self._instrumentation, "fts.maintenance"):
+                    builder._conn.backup(self._conn)
+                self._tokenizer = tokenizer
+                self._query_tokenizer = query_tokenizer
+            finally:
+                builder.close()
+                if side is not None:
+                    remove_database(side)
+                self._generation += 1
+                if self._result_cache is not None:
+                    self._result_cache.clear()
+
+    def _merge_settings(self) -> dict[str, int]:
+        """Get the merge settings changed by `configure_merges`."""
+        with self._reader() as conn:
+            return dict(
+                conn.execute(
+                    "SELECT k, v FROM texts_config "
+                    "WHERE k IN ('automerge', 'crisismerge', 'usermerge')"
                 )
-            ]
+            )
+
+    @contextmanager
+    def _maintenance(self) -> Generator[None]:
+        """Run an index maintenance transaction.
+
+        Maintenance does not change search results, so the result cache
+        is kept, unlike with `_write`.
+        """
+        self._check_writable()
+        with (
+            self._write_lock,
+            timer(self._instrumentation, "fts.maintenance"),
+            transaction(self._conn, self._on_commit),
+        ):
+            yield
+
+    def _prepare_schema(self, index_mode: IndexMode, wal: bool) -> None:
+        """Create or migrate the schema, or check it if opened read-only."""
+        if self._access_mode == "readwrite":
+            if wal:
+                self._conn.execute("PRAGMA journal_mode = WAL")
+            _migrate(self._conn, index_mode)
+            return
+        try:
+            _check_schema(self._conn)
+        except BaseException:
+            self.close()
+            raise
+
+    def _check_writable(self) -> None:
+        """Raise `ReadOnlyError` if the engine was opened read-only."""
+        if self._access_mode != "readwrite":
+            raise ReadOnlyError(
+                f"the index was opened in {self._access_mode} mode"
+            )
+
+    def _insert_fields(
+        self,
+        docs: Iterable[tuple[DocumentId, dict[str, "_TokenizedField"]]],
+        batch_size: int,
+        replace: bool = False,
+    ) -> int:
+        """Insert tokenized documents, committing once per batch.
+
+        Args:
+            docs: The documents and their tokenized fields.
+            batch_size: The number of documents per transaction.
+            replace: If True, first delete the fields of each document.
+        Returns:
+            The number of inserted documents.
+        """
+        count = 0
+        for batch in itertools.batched(docs, batch_size, strict=False):
+            with self._write():
+                for doc_id, fields in batch:
+                    if replace:
+                        self._delete(doc_id)
+                    self._insert_tokenized(doc_id, fields)
+            count += len(batch)
+        return count
+
+    def _insert_documents(
+        self,
+        docs: Iterable[
+            tuple[DocumentId, Document, dict[str, "_TokenizedField"] | None]
+        ],
+        batch_size: int,
+        tokenized_by: Tokenizer | None,
+    ) -> None:
+        """Insert documents, committing once per batch.
+
+        Documents without fields are tokenized with the write lock held.
+        Fields tokenized beforehand are tokenized again if a `rebuild`
+        swapped in another tokenizer than `tokenized_by` meanwhile, so the
+        index never mixes the tokens of two tokenizers.
+        """
+        for batch in itertools.batched(docs, batch_size, strict=False):
+            with self._write():
+                stale = self._tokenizer is not tokenized_by
+                for doc_id, doc, fields in batch:
+                    if fields is None or stale:
+                        fields = self._tokenize_document(doc)
+                    self._insert_tokenized(doc_id, fields)
+
+    def _retokenized_fields(
+        self,
+        tokenizer: Tokenizer | None,
+        batch_size: int,
+    ) -> Generator[tuple[DocumentId, dict[str, "_TokenizedField"]]]:
+        """Tokenize the stored source of every field of the index again.
+
+        The sources of a batch of documents are tokenized in one call.
+        In trigram mode, the source of a field is its text.
+        """
+        with self._reader() as conn:
+            stored = _stored_fields(conn)
+            for batch in itertools.batched(stored, batch_size, strict=False):
+                sources = []
+                for doc_id, rows in batch:
+                    for key, text, _, source in rows:
+                        if source is None and self._tokenizer is not None:
+                            raise ValueError(
+                                f"field {key!r} of document {doc_id!r} has "
+                                "no stored source to re-tokenize"
+                            )
+                        sources.append(text if source is None else source)
+                texts = iter(
+                    _tokenize_normalized(
+                        self._local_tokenizer(tokenizer),
+                        sources,
+                        self._instrumentation,
+                    )
+                )
+                for doc_id, rows in batch:
+                    yield (
+                        doc_id,
+                        {
+                            key: _TokenizedField(next(texts), digest, source)
+                            for key, _, digest, source in rows
+                        },
+                    )
+
+    def _insert(self, doc: Document, doc_id: DocumentId) -> None:
+        """Insert a document without committing."""
+        self._insert_tokenized(doc_id, self._tokenize_document(doc))
+
+    def _insert_tokenized(
+        self,
+        doc_id: DocumentId,
+        fields: dict[str, "_TokenizedField"],
+    ) -> None:
+        """Insert already tokenized fields without committing."""
+        with timer(self._instrumentation, "fts.write"):
+            self._cursor.executemany(
+                "INSERT INTO fields (doc_id, key, text, digest, source) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    (doc_id, k, v.text, v.digest, v.source)
+                    for k, v in fields.items()
+                ),
+            )
+
+    def _delete(self, doc_id: DocumentId) -> None:
+        """Delete a document without committing."""
+        with timer(self._instrumentation, "fts.write"):
+            self._cursor.execute(
+                "DELETE FROM fields WHERE doc_id = ?",
+                (doc_id,),
+            )
+
+    def _local_tokenizer(self, tokenizer: Tokenizer | None) -> Tokenizer | None:
+        """Get the copy of a tokenizer owned by this thread.
+
+        In thread-safe mode, every thread tokenizes with its own copy, so
+        that no tokenizer is used by two threads at once. Otherwise the
+        tokenizer itself is returned.
+        """
+        if tokenizer is None or self._read_pool is None:
+            return tokenizer
+        copies = self._thread_tokenizers.__dict__.setdefault("copies", {})
+        # The original is kept so that its id isn't reused while copied.
+        entry = copies.get(id(tokenizer))
+        if entry is None or entry[0] is not tokenizer:
+            entry = copies[id(tokenizer)] = (tokenizer, copy.copy(tokenizer))
+        return entry[1]
+
+    def _tokenize_query(self, query: str) -> str:
+        """Tokenize a search query using the query tokenizer."""
+        return _tokenize_text(
+            self._local_tokenizer(self._query_tokenizer),
+            query,
+            self._instrumentation,
+        )
+
+    def _tokenize_document(
+        self,
+        doc: Document,
+    ) -> dict[str, "_TokenizedField"]:
+        """Flatten a document and tokenize each of its fields."""
+        return _tokenize_document(
+            self._local_tokenizer(self._tokenizer),
+            doc,
+            self._instrumentation,
+            self._index_policy,
+            self._store_source,
+        )
+
+
+def _migrate(conn: sqlite3.Connection, index_mode: IndexMode) -> None:
+    """Bring the index schema up to the current version.
+
+    The schema version is kept in `PRAGMA user_version`. A new database
+    starts at version 0 and runs every migration in order.
+
+    Args:
+        conn: The connection to the index database.
+        index_mode: The index mode used if the index is created.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > len(_MIGRATIONS):
+        raise RuntimeError(
+            f"index schema version {version} is newer than this library"
+        )
+    for target, migration in enumerate(_MIGRATIONS[version:], version + 1):
+        with transaction(conn):
+            migration(conn, index_mode)
+            conn.execute(f"PRAGMA user_version = {target}")
+
+
+def _check_schema(conn: sqlite3.Connection) -> None:
+    """Check that a read-only index is at the current schema version.
+
+    Args:
+        conn: The read-only connection to the index database.
+    Raises:
+        ReadOnlyError: If the index needs a migration.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > len(_MIGRATIONS):
+        raise RuntimeError(
+            f"index schema version {version} is newer than this library"
+        )
+    if version < len(_MIGRATIONS):
+        raise ReadOnlyError(
+            f"index schema version {version} must be migrated to "
+            f"{len(_MIGRATIONS)} by opening the index in readwrite mode"
+        )
+
+
+def _migrate_to_v1(conn: sqlite3.Connection, index_mode: IndexMode) -> None:
+    """Create the rowid-mapped schema.
+
+    Field texts live in the regular `fields` table, indexed by doc_id, and
+    the `texts` FTS5 table uses it as external content linked by rowid.
+    Triggers keep the full-text index in sync with `fields`, so deletes
+    and replaces are indexed lookups on `fields`.
+
+    Indexes created before versioning stored doc_id, key and a uuid
+    text_id inside the FTS5 table. They are copied over and dropped.
+    """
+    legacy = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'texts'"
+    ).fetchone()
+    if legacy:
+        # Legacy indexes always hold morphological tokens.
+        index_mode = "morphological"
+        conn.execute("ALTER TABLE texts RENAME TO texts_v0")
+
+    conn.execute(
+        """
+        CREATE TABLE fields (
+            id INTEGER PRIMARY KEY,
+            doc_id TEXT NOT NULL,
+            key TEXT NOT NULL,
+            text TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX fields_doc_id_key ON fields (doc_id, key)")
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE texts USING fts5(
+            text,
+            content = 'fields',
+            content_rowid = 'id',
+            tokenize = '{_FTS_TOKENIZE[index_mode]}'
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER fields_ai AFTER INSERT ON fields BEGIN
+            INSERT INTO texts (rowid, text) VALUES (new.id, new.text);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER fields_ad AFTER DELETE ON fields BEGIN
+            INSERT INTO texts (texts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER fields_au AFTER UPDATE OF text ON fields BEGIN
+            INSERT INTO texts (texts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO texts (rowid, text) VALUES (new.id, new.text);
+        END
+        """
+    )
+
+    if legacy:
+        conn.execute(
+            "INSERT INTO fields (doc_id, key, text) "
+            "SELECT doc_id, key, text FROM texts_v0"
+        )
+        conn.execute("DROP TABLE texts_v0")
+
+
+def _migrate_to_v2(conn: sqlite3.Connection, index_mode: IndexMode) -> None:
+    """Add a digest of each field's source value for incremental updates.
+
+    Rows indexed before this version have no digest and are treated as
+    changed by the next update of their document.
+    """
+    conn.execute("ALTER TABLE fields ADD COLUMN digest BLOB")
+
+
+def _migrate_to_v3(conn: sqlite3.Connection, index_mode: IndexMode) -> None:
+    """Index the key of each field for field-scoped searches.
+
+    `key_token` is a virtual generated column of `fields` encoding the key
+    as one alphanumeric token. In morphological mode, the `texts` table is
+    recreated with it as a second column and rebuilt from `fields`, and
+    its rank function gives the column no weight so that it does not
+    change the bm25 ranking. Trigram indexes keep their single column.
+    """
+    conn.execute(
+        "ALTER TABLE fields ADD COLUMN key_token TEXT "
+        "GENERATED ALWAYS AS ('k' || hex(key) || 'k') VIRTUAL"
+    )
+    if _index_mode(conn) != "morphological":
+        return
+
+    for trigger in ("fields_ai", "fields_ad", "fields_au"):
+        conn.execute(f"DROP TRIGGER {trigger}")
+    conn.execute("DROP TABLE texts")
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE texts USING fts5(
+            text,
+            key_token,
+            content = 'fields',
+            content_rowid = 'id',
+            tokenize = '{_FTS_TOKENIZE["morphological"]}'
         )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER fields_ai AFTER INSERT ON fields BEGIN
+            INSERT INTO texts (rowid, text, key_token)
+            VALUES (new.id, new.text, new.key_token);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER fields_ad AFTER DELETE ON fields BEGIN
+            INSERT INTO texts (texts, rowid, text, key_token)
+            VALUES ('delete', old.id, old.text, old.key_token);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER fields_au AFTER UPDATE OF text ON fields BEGIN
+            INSERT INTO texts (texts, rowid, text, key_token)
+            VALUES ('delete', old.id, old.text, old.key_token);
+            INSERT INTO texts (rowid, text, key_token)
+            VALUES (new.id, new.text, new.key_token);
+        END
+        """
+    )
+    conn.execute("INSERT INTO texts (texts) VALUES ('rebuild')")
+    conn.execute(
+        "INSERT INTO texts (texts, rank) VALUES ('rank', 'bm25(1, 0)')"
+    )
+
+
+def _migrate_to_v4(conn: sqlite3.Connection, index_mode: IndexMode) -> None:
+    """Add the normalized source text of each field for re-tokenization.
+
+    The column is only filled by engines with `store_source`, and the
+    full-text index does not read it.
+    """
+    conn.execute("ALTER TABLE fields ADD COLUMN source TEXT")
+
+
+_MIGRATIONS: list[Callable[[sqlite3.Connection, IndexMode], None]] = [
+    _migrate_to_v1,
+    _migrate_to_v2,
+    _migrate_to_v3,
+    _migrate_to_v4,
+]
+
+
+def _index_mode(conn: sqlite3.Connection) -> IndexMode:
+    """Detect the index mode from the schema of the `texts` table."""
+    (sql,) = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'texts'"
+    ).fetchone()
+    return "trigram" if "'trigram'" in sql else "morphological"
+
 
+def _search_sql(order: SearchOrder | None, where: str) -> str:
+    """Build the query selecting one row per matching document.
 
-def _flatten_document(doc: Document) -> dict[str, str]:
+    The selected columns are doc_id, the key of the best matching field
+    and its bm25 rank (lower is better).
+
+    Args:
+        order: "bm25" to rank by relevance, or None for no ordering.
+        where: The condition selecting matching rows of `texts` AS t and
+            `fields` AS f.
+    Returns:
+        The SQL statement.
+    """
+    if order not in ("bm25", None):
+        raise ValueError(f"unsupported search order: {order!r}")
+
+    sql = (
+        "SELECT f.doc_id AS doc_id, f.key AS key, min(t.rank) AS rank "
+        "FROM texts AS t JOIN fields AS f ON f.id = t.rowid "
+        f"WHERE {where} GROUP BY f.doc_id"
+    )
+    if order == "bm25":
+        sql += " ORDER BY rank"
+    return sql
+
+
+def _key_token(key: str) -> str:
+    """Encode a flattened key like the `key_token` column of `fields`."""
+    return f"k{key.encode().hex().upper()}k"
+
+
+def _structure(record: bytes) -> tuple[int, int]:
+    """Read the level and segment counts of an FTS5 structure record.
+
+    The record starts with a 4-byte cookie, then, in SQLite 3.45 and
+    later, an optional 4-byte version 2 marker, followed by the number of
+    levels and segments as varints.
+    """
+    offset = 8 if record[4:8] == b"\xff\x00\x00\x01" else 4
+    levels, offset = _varint(record, offset)
+    segments, _ = _varint(record, offset)
+    return levels, segments
+
+
+def _varint(data: bytes, offset: int) -> tuple[int, int]:
+    """Decode an SQLite varint, returning its value and the next offset."""
+    value = 0
+    for i in range(offset, min(offset + 9, len(data))):
+        if i == offset + 8:
+            return (value << 8) | data[i], i + 1
+        value = (value << 7) | (data[i] & 0x7F)
+        if data[i] < 0x80:
+            return value, i + 1
+    raise ValueError("truncated varint")
+
+
+def _check_copyable(conn: sqlite3.Connection) -> None:
+    """Check that `_copy_other_tables` can copy the tables of a database."""
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND sql LIKE 'CREATE VIRTUAL TABLE%' AND name != 'texts'"
+    ):
+        raise ValueError(
+            f"cannot rebuild a database holding the virtual table {name!r}"
+        )
+
+
+def _copy_other_tables(
+    source: sqlite3.Connection,
+    dest: sqlite3.Connection,
+) -> None:
+    """Copy the tables, indexes, triggers and views missing from `dest`.
+
+    A rebuild replaces the whole database file, so every object that the
+    side database lacks is copied with its rows.
+    """
+    existing = {
+        name for (name,) in dest.execute("SELECT name FROM sqlite_master")
+    }
+    # Tables first, so that indexes, triggers and views find them.
+    missing = [
+        (kind, name, sql)
+        for kind, name, sql in source.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' "
+            "ORDER BY type != 'table', rowid"
+        )
+        if name not in existing
+    ]
+    tables = [name for kind, name, _ in missing if kind == "table"]
+    with transaction(dest):
+        for kind, name, sql in missing:
+            dest.execute(sql)
+            if kind != "table":
+                continue
+            quoted = '"' + name.replace('"', '""') + '"'
+            rows = source.execute(f"SELECT * FROM {quoted}")
+            params = ", ".join("?" * len(rows.description))
+            dest.executemany(f"INSERT INTO {quoted} VALUES ({params})", rows)
+        if tables and _has_table(dest, "sqlite_sequence"):
+            marks = ", ".join("?" * len(tables))
+            dest.execute(
+                f"DELETE FROM sqlite_sequence WHERE name IN ({marks})", tables
+            )
+            dest.executemany(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                source.execute(
+                    "SELECT name, seq FROM sqlite_sequence "
+                    f"WHERE name IN ({marks})",
+                    tables,
+                ),
+            )
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    """Check whether a database has a table."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (name,),
+    ).fetchone()
+    return row is not None
+
+
+def _stored_fields(
+    conn: sqlite3.Connection,
+) -> Generator[tuple[DocumentId, list[tuple]]]:
+    """Read the stored fields of every document in one statement.
+
+    Returns:
+        A generator of (doc_id, [(key, text, digest, source), ...]) pairs.
+    """
+    rows = conn.execute(
+        "SELECT doc_id, key, text, digest, source FROM fields ORDER BY doc_id"
+    )
+    for doc_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+        yield DocumentId(doc_id), [row[1:] for row in group]
+
+
+def _write_tokens(
+    dest: str | os.PathLike,
+    index_mode: IndexMode,
+    stored: Iterable[tuple[DocumentId, list[tuple]]],
+) -> int:
+    """Write stored fields as a token export, replacing `dest` at the end.
+
+    Args:
+        dest: The path of the file, compressed if it ends with ".gz".
+        index_mode: The index mode of the exported index.
+        stored: The stored fields of each document, as read by
+            `_stored_fields`.
+    Returns:
+        The number of exported documents.
+    """
+    dest = os.fspath(dest)
+    partial = f"{dest}.partial"
+    header = {
+        "format": _TOKENS_FORMAT,
+        "version": _TOKENS_VERSION,
+        "index_mode": index_mode,
+    }
+    count = 0
+    try:
+        with _open_text(partial, "w", compress=dest.endswith(".gz")) as f:
+            f.write(json.dumps(header) + "\n")
+            for doc_id, rows in stored:
+                fields = {
+                    key: [text, None if digest is None else digest.hex()]
+                    + ([] if source is None else [source])
+                    for key, text, digest, source in rows
+                }
+                line = {"doc_id": doc_id, "fields": fields}
+                f.write(
+                    json.dumps(line, ensure_ascii=False, separators=(",", ":"))
+                    + "\n"
+                )
+                count += 1
+        os.replace(partial, dest)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(partial)
+        raise
+    return count
+
+
+@contextmanager
+def _read_tokens(
+    src: str | os.PathLike,
+    index_mode: IndexMode,
+) -> Generator[Iterable[tuple[DocumentId, dict[str, "_TokenizedField"]]]]:
+    """Open a token export and check that it matches the index mode.
+
+    Args:
+        src: The path of the file, compressed if it ends with ".gz".
+        index_mode: The index mode of the importing index.
+    Returns:
+        A context manager yielding the tokenized fields of each document,
+        read lazily.
+    Raises:
+        ValueError: If the file is not a supported token export.
+        IndexModeMismatchError: If the file was exported in another mode.
+    """
+    src = os.fspath(src)
+    with _open_text(src, "r", compress=src.endswith(".gz")) as f:
+        header = json.loads(f.readline() or "null")
+        if (
+            not isinstance(header, dict)
+            or header.get("format") != _TOKENS_FORMAT
+            or header.get("version") != _TOKENS_VERSION
+        ):
+            raise ValueError(f"{src} is not a supported token export")
+        if header["index_mode"] != index_mode:
+            raise IndexModeMismatchError(
+                f"the tokens were exported in {header['index_mode']} mode, "
+                f"not {index_mode} mode"
+            )
+        yield (_parse_tokens_line(line) for line in f)
+
+
+def _open_text(path: str, mode: str, compress: bool) -> IO[str]:
+    """Open a UTF-8 text file, compressed with gzip if `compress`."""
+    if compress:
+        return gzip.open(path, f"{mode}t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _parse_tokens_line(
+    line: str,
+) -> tuple[DocumentId, dict[str, "_TokenizedField"]]:
+    """Parse a document line of a token export."""
+    doc = json.loads(line)
+    fields = {}
+    for key, (text, digest, *source) in doc["fields"].items():
+        fields[key] = _TokenizedField(
+            text,
+            None if digest is None else bytes.fromhex(digest),
+            *source,
+        )
+    return DocumentId(doc["doc_id"]), fields
+
+
+def _quote_terms(terms: Iterable[str]) -> str:
+    """Join query terms into an FTS5 query matching each term literally."""
+    return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def _escape_like(text: str) -> str:
+    """Escape the LIKE wildcards of a text using a backslash."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _tokenize_text(
+    tokenizer: Tokenizer | None,
+    text: str,
+    instrumentation: Instrumentation | None = None,
+) -> str:
+    """Normalize a text to NFKC form and join its tokens by spaces.
+
+    Args:
+        tokenizer: The tokenizer to use, or None to only normalize the
+            text, as in trigram mode.
+        text: The text to tokenize.
+        instrumentation: Times normalization and tokenization, or None.
+    Returns:
+        A string of tokens joined by spaces.
+    """
+    return _tokenize_texts(tokenizer, [text], instrumentation)[0]
+
+
+def _tokenize_texts(
+    tokenizer: Tokenizer | None,
+    texts: list[str],
+    instrumentation: Instrumentation | None = None,
+) -> list[str]:
+    """Normalize texts to NFKC form and join the tokens of each by spaces.
+
+    The texts are tokenized by a single `tokenize_batch` call, so the
+    per-call overhead of the tokenizer is paid once for all of them.
+
+    Args:
+        tokenizer: The tokenizer to use, or None to only normalize the
+            texts, as in trigram mode.
+        texts: The texts to tokenize.
+        instrumentation: Times normalization and tokenization, or None.
+    Returns:
+        A list with the space-joined tokens of each text.
+    """
+    return _tokenize_normalized(
+        tokenizer, _normalize_texts(texts, instrumentation), instrumentation
+    )
+
+
+def _normalize_texts(
+    texts: list[str],
+    instrumentation: Instrumentation | None = None,
+) -> list[str]:
+    """Normalize texts to NFKC form."""
+    with timer(instrumentation, "fts.normalize"):
+        return [unicodedata.normalize("NFKC", t) for t in texts]
+
+
+def _tokenize_normalized(
+    tokenizer: Tokenizer | None,
+    normalized: list[str],
+    instrumentation: Instrumentation | None = None,
+) -> list[str]:
+    """Join the tokens of each normalized text by spaces."""
+    if tokenizer is None:
+        return normalized
+    with timer(instrumentation, "fts.tokenize"):
+        return tokenizer.tokenize_batch(normalized)
+
+
+class _TokenizedField(NamedTuple):
+    """A tokenized field with the digest of its source value."""
+
+    text: str
+    digest: bytes | None
+    source: str | None = None
+    """The normalized text of the field, if it is stored."""
+
+
+def _tokenize_document(
+    tokenizer: Tokenizer | None,
+    doc: Document,
+    instrumentation: Instrumentation | None = None,
+    index_policy: IndexPolicy | None = None,
+    store_source: bool = False,
+) -> dict[str, _TokenizedField]:
+    """Flatten a document and tokenize each of its indexed fields.
+
+    Args:
+        tokenizer: The tokenizer to use, or None to only normalize.
+        doc: The document to tokenize.
+        instrumentation: Times each stage, or None.
+        index_policy: Selects the indexed fields, or None for all.
+        store_source: If True, keep the normalized text of each field.
+            It is not kept without a tokenizer, where it is the text.
+    Returns:
+        A dictionary mapping flattened keys to tokenized fields.
+    """
+    with timer(instrumentation, "fts.flatten"):
+        fields = _flatten_document(doc, index_policy)
+    normalized = _normalize_texts(list(fields.values()), instrumentation)
+    texts = _tokenize_normalized(tokenizer, normalized, instrumentation)
+    if not store_source or tokenizer is None:
+        return {
+            k: _TokenizedField(text, _digest(v))
+            for (k, v), text in zip(fields.items(), texts, strict=True)
+        }
+    return {
+        k: _TokenizedField(text, _digest(v), source)
+        for (k, v), text, source in zip(
+            fields.items(), texts, normalized, strict=True
+        )
+    }
+
+
+def _digest(value: str) -> bytes:
+    """Hash a flattened field value to detect changes."""
+    return hashlib.blake2b(value.encode(), digest_size=16).digest()
+
+
+def _flatten_document(
+    doc: Document,
+    index_policy: IndexPolicy | None = None,
+) -> dict[str, str]:
     """Flatten a nested document dictionary
 
     This function flattens a nested dictionary into a single-level dictionary
@@ -112,18 +1758,21 @@ def _flatten_document(doc: Document) -> dict[str, str]:
 
     Args:
         doc: The dictionary to flatten.
+        index_policy: Selects the fields to keep, or None to keep all.
     Returns:
         A flattened dictionary with keys in dot notation.
     """
 
     def _dfs(d, p):
         if isinstance(d, dict):
-            for k, v in d.items():
-                yield from _dfs(v, f"{p}.{k}")
+            if index_policy is None or not index_policy.excludes(p):
+                for k, v in d.items():
+                    yield from _dfs(v, f"{p}.{k}")
         elif isinstance(d, list):
-            for i, v in enumerate(d):
-                yield from _dfs(v, f"{p}[{i}]")
-        else:
+            if index_policy is None or not index_policy.excludes(p):
+                for i, v in enumerate(d):
+                    yield from _dfs(v, f"{p}[{i}]")
+        elif index_policy is None or index_policy.indexes(p, d):
             yield str(p), str(d)
 
     return dict(_dfs(doc, "@root"))
@@ -0,0 +1,243 @@
+"""Opt-in timing of the stages of indexing, searching and storage.
+
+Pass an `Instrumentation` to `SqlLite3FullTextSearchEngine`,
+`Sqlite3KVStore` or `WarabiDB` to collect a counter and a latency
+histogram per stage. Without one, the hot paths only check for None.
+
+The stages are:
+
+- fts.flatten: flattening a document into fields.
+- fts.normalize: NFKC normalization of the fields of a document, or of a
+  query.
+- fts.tokenize: tokenizing the normalized fields of a document in one
+  batch, or a query.
+- fts.write: executing index write statements.
+- fts.commit: committing an index transaction.
+- fts.query: executing a search statement and fetching its rows.
+- fts.search: a whole `search` call, including tokenization and caching.
+- fts.maintenance: an `optimize`, `merge` or `configure_merges` call.
+- kvs.serialize / kvs.deserialize: converting documents from and to JSON.
+- kvs.write / kvs.read: executing store statements.
+- kvs.commit: committing a store transaction.
+
+Tokenization in worker processes, as with `insert_many(workers=...)`, is
+not timed.
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+from collections.abc import Callable
+from contextlib import AbstractContextManager, nullcontext
+from typing import NamedTuple
+
+Hook = Callable[[str, float], None]
+"""A callback receiving the stage name and its duration in seconds."""
+
+HISTOGRAM_BOUNDS: tuple[float, ...] = (
+    1e-6, 2.5e-6, 5e-6,
+    1e-5, 2.5e-5, 5e-5,
+    1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3,
+    1e-2, 2.5e-2, 5e-2,
+    0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0,
+    10.0, math.inf,
+)  # fmt: skip
+"""The inclusive upper bounds of the histogram buckets, in seconds."""
+
+_logger = logging.getLogger(__name__)
+
+
+class StageStats(NamedTuple):
+    """The latency statistics of a stage."""
+
+    count: int
+    total: float
+    max: float
+    buckets: tuple[int, ...]
+    """The number of durations per bucket of `HISTOGRAM_BOUNDS`."""
+
+    @property
+    def mean(self) -> float:
+        """The mean duration in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+
+class Instrumentation:
+    """A thread-safe collector of per-stage latencies.
+
+    Each recorded duration updates the statistics of its stage and is
+    passed to every hook, e.g. to export it to a metrics system. Searches
+    slower than `slow_query_threshold` are logged as warnings by the
+    `warabi.instrumentation` logger, with the raw and tokenized query.
+    """
+
+    def __init__(
+        self,
+        slow_query_threshold: float | None = None,
+        hooks: list[Hook] | None = None,
+    ) -> None:
+        """Initialize Instrumentation.
+
+        Args:
+            slow_query_threshold: The duration in seconds from which a
+                search is logged, or None to disable slow-query logging.
+            hooks: Callbacks called with every recorded stage and
+                duration. They run on the thread doing the work and must
+                be fast.
+        """
+        self._slow_query_threshold = slow_query_threshold
+        self._hooks = list(hooks or [])
+        self._lock = threading.Lock()
+        self._stats: dict[str, _StageCounter] = {}
+
+    def add_hook(self, hook: Hook) -> None:
+        """Add a callback called with every recorded stage and duration.
+
+        Args:
+            hook: The callback to add.
+        """
+        self._hooks = [*self._hooks, hook]
+
+    def remove_hook(self, hook: Hook) -> None:
+        """Remove a callback added before.
+
+        Args:
+            hook: The callback to remove.
+        """
+        self._hooks = [h for h in self._hooks if h is not hook]
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Record the duration of a stage.
+
+        Args:
+            stage: The name of the stage.
+            seconds: The duration in seconds.
+        """
+        bucket = bisect.bisect_left(HISTOGRAM_BOUNDS, seconds)
+        with self._lock:
+            stats = self._stats.get(stage)
+            if stats is None:
+                stats = self._stats[stage] = _StageCounter()
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.buckets[bucket] += 1
+        for hook in self._hooks:
+            hook(stage, seconds)
+
+    def record_search(self, query: str, tokenized: str, seconds: float) -> None:
+        """Record a whole search, logging it if it is slow.
+
+        Args:
+            query: The query as given by the caller.
+            tokenized: The query as matched against the index.
+            seconds: The duration of the search in seconds.
+        """
+        self.record("fts.search", seconds)
+        threshold = self._slow_query_threshold
+        if threshold is not None and seconds >= threshold:
+            _logger.warning(
+                "slow search took %.3f s: query=%r tokenized=%r",
+                seconds,
+                query,
+                tokenized,
+            )
+
+    def timer(self, stage: str) -> "_Timer":
+        """Time the enclosed block as a stage.
+
+        Args:
+            stage: The name of the stage.
+        Returns:
+            A context manager recording its duration on exit.
+        """
+        return _Timer(self, stage)
+
+    def stats(self) -> dict[str, StageStats]:
+        """Get the statistics of every recorded stage.
+
+        Returns:
+            A dictionary mapping stage names to their statistics.
+        """
+        with self._lock:
+            return {
+                stage: StageStats(c.count, c.total, c.max, tuple(c.buckets))
+                for stage, c in self._stats.items()
+            }
+
+    def reset(self) -> None:
+        """Clear the statistics of every stage."""
+        with self._lock:
+            self._stats.clear()
+
+
+class _StageCounter:
+    """The mutable statistics of a stage."""
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(HISTOGRAM_BOUNDS)
+
+
+class _Timer:
+    """A context manager recording the duration of its block."""
+
+    __slots__ = ("_instrumentation", "_stage", "_start")
+
+    def __init__(self, instrumentation: Instrumentation, stage: str) -> None:
+        self._instrumentation = instrumentation
+        self._stage = stage
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self._instrumentation.record(
+            self._stage, time.perf_counter() - self._start
+        )
+
+
+_NO_TIMER = nullcontext()
+
+
+def timer(
+    instrumentation: Instrumentation | None,
+    stage: str,
+) -> AbstractContextManager[None]:
+    """Time a block if instrumentation is enabled.
+
+    Args:
+        instrumentation: The instrumentation, or None if disabled.
+        stage: The name of the stage.
+    Returns:
+        A context manager timing the block, or a shared no-op one.
+    """
+    if instrumentation is None:
+        return _NO_TIMER
+    return instrumentation.timer(stage)
+
+
+def commit_recorder(
+    instrumentation: Instrumentation | None,
+    stage: str,
+) -> Callable[[float], None] | None:
+    """Get a callback recording commit durations as a stage.
+
+    Args:
+        instrumentation: The instrumentation, or None if disabled.
+        stage: The name of the stage.
+    Returns:
+        A callback for `transaction(on_commit=...)`, or None if disabled.
+    """
+    if instrumentation is None:
+        return None
+    return lambda seconds: instrumentation.record(stage, seconds)
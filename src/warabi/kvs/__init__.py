@@ -1,3 +1,4 @@
+from collections.abc import Iterable
 from typing import Protocol
 
 from ..common import Document, DocumentId
@@ -25,6 +26,32 @@ class KVStore(Protocol):
         """
         raise NotImplementedError
 
+    def get_many(
+        self,
+        doc_ids: Iterable[DocumentId],
+    ) -> list[Document | None]:
+        """Get the documents associated with the given document IDs
+
+        Args:
+            doc_ids: The IDs of the documents to retrieve
+        Returns:
+            A list of documents in the order of `doc_ids`, with None for
+            IDs that were not found
+        """
+        return [self.get(doc_id) for doc_id in doc_ids]
+
+    def insert_many(
+        self,
+        docs: Iterable[tuple[DocumentId, Document]],
+    ) -> None:
+        """Insert many documents into the store
+
+        Args:
+            docs: An iterable of (doc_id, doc) pairs
+        """
+        for doc_id, doc in docs:
+            self.insert(doc, doc_id)
+
     def update(self, doc: Document, doc_id: DocumentId) -> None:
         """Update an existing document in the store
 
@@ -0,0 +1,397 @@
+"""An append-only, log-structured document store."""
+
+import json
+import logging
+import os
+import threading
+from collections.abc import Iterable
+from typing import BinaryIO
+
+from ..common import Document, DocumentId
+from ..errors import CorruptLogError, LogLockedError
+from . import KVStore
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+_logger = logging.getLogger(__name__)
+
+
+class LogKVStore(KVStore):
+    """A document store appending every write to a log file.
+
+    Each write appends one JSON line, `["put", doc_id, doc]` or
+    `["del", doc_id]`, so its cost depends on the size of the document
+    only, not on the size of the store. An in-memory index maps each
+    doc_id to the offset of its latest record, so a read is one seek.
+
+    Records replaced by later writes are garbage. Once the garbage makes
+    up `compaction_ratio` of the log, a background thread rewrites the
+    live records to a new file and swaps it in with `os.replace`. Writes
+    continue meanwhile and are carried over to the new file.
+
+    On open, the log is replayed to rebuild the index. A partial last
+    record, as left by a crash in the middle of a write, is truncated.
+
+    The store can be shared between threads of one process. Only one
+    store may open a log at a time, which an exclusive lock on a
+    `{path}.lock` file enforces where `fcntl` is available. The lock file
+    is never replaced by a compaction, unlike the log.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        sync: bool = False,
+        compaction_ratio: float = 0.5,
+        compaction_min_bytes: int = 1 << 20,
+    ) -> None:
+        """Initialize LogKVStore.
+
+        Args:
+            path: The path of the log file. It is created if missing.
+            sync: If True, fsync the log after every write, so that writes
+                survive an OS crash and not only a process crash.
+            compaction_ratio: The fraction of garbage in the log that
+                starts a compaction, or a value above 1 to compact only
+                when `compact` is called.
+            compaction_min_bytes: The log size below which it is never
+                compacted automatically.
+        Raises:
+            CorruptLogError: If a record before the end of the log is
+                damaged, or any record is not a put or delete record.
+            LogLockedError: If another store, possibly in another process,
+                has the log open.
+        """
+        if compaction_ratio <= 0:
+            raise ValueError("compaction_ratio must be positive")
+        self._path = os.fspath(path)
+        self._sync = sync
+        self._compaction_ratio = compaction_ratio
+        self._compaction_min_bytes = compaction_min_bytes
+        self._lock = threading.RLock()
+        # Held for a whole compaction, and taken before `_lock`.
+        self._compaction_lock = threading.Lock()
+        self._compactor: threading.Thread | None = None
+
+        # Taken first, as the replay may truncate the log and the removal
+        # below would break a compaction of the owner.
+        self._lock_file = _lock(f"{self._path}.lock")
+        try:
+            # A compaction interrupted before its rename left the log
+            # intact.
+            _remove(f"{self._path}.compact")
+            self._file: BinaryIO = open(self._path, "a+b")
+            try:
+                self._index: dict[str, tuple[int, int]] = {}
+                self._garbage = 0
+                self._size = self._replay()
+            except BaseException:
+                self._file.close()
+                raise
+        except BaseException:
+            self._lock_file.close()
+            raise
+        self._closed = False
+
+    def __del__(self):
+        """Ensure the log and lock files are closed"""
+        if not getattr(self, "_closed", True):
+            self._file.close()
+            self._lock_file.close()
+
+    def close(self) -> None:
+        """Wait for a running compaction and close the log file.
+
+        Closing a store more than once has no effect.
+        """
+        with self._compaction_lock, self._lock:
+            if not self._closed:
+                self._file.close()
+                self._lock_file.close()
+                self._closed = True
+
+    def __len__(self) -> int:
+        """The number of documents in the store."""
+        return len(self._index)
+
+    def insert(self, doc: Document, doc_id: DocumentId) -> None:
+        """Insert a document into the store.
+
+        Args:
+            doc: A dictionary representing the document to insert.
+            doc_id: The ID of the document.
+        Raises:
+            ValueError: If the document ID already exists.
+        """
+        self.insert_many([(doc_id, doc)])
+
+    def insert_many(
+        self,
+        docs: Iterable[tuple[DocumentId, Document]],
+    ) -> None:
+        """Insert many documents with a single append.
+
+        Args:
+            docs: An iterable of (doc_id, doc) pairs.
+        Raises:
+            ValueError: If a document ID already exists. No document is
+                inserted then.
+        """
+        records = [["put", str(doc_id), doc] for doc_id, doc in docs]
+        with self._lock:
+            seen = set()
+            for _, key, _ in records:
+                if key in self._index or key in seen:
+                    raise ValueError(f"document {key!r} already exists")
+                seen.add(key)
+            self._append(records)
+
+    def get(self, doc_id: DocumentId) -> Document | None:
+        """Get the value associated with the given document ID.
+
+        Args:
+            doc_id: The ID of the document to retrieve.
+        Returns:
+            A dictionary representing the document, or None if not found.
+        """
+        with self._lock:
+            location = self._index.get(str(doc_id))
+            if location is None:
+                return None
+            offset, length = location
+            self._file.seek(offset)
+            line = self._file.read(length)
+        return Document(json.loads(line)[2])
+
+    def update(self, doc: Document, doc_id: DocumentId) -> None:
+        """Update an existing document in the store.
+
+        Args:
+            doc: A dictionary representing the updated document.
+            doc_id: The ID of the document to update.
+        """
+        key = str(doc_id)
+        with self._lock:
+            if key in self._index:
+                self._append([["put", key, doc]])
+
+    def delete(self, doc_id: DocumentId) -> None:
+        """Delete the document with the given ID.
+
+        Args:
+            doc_id: The ID of the document to delete.
+        """
+        key = str(doc_id)
+        with self._lock:
+            if key in self._index:
+                self._append([["del", key]])
+
+    def compact(self) -> None:
+        """Rewrite the log with the live records only, in this thread.
+
+        A compaction already running in the background is waited for.
+        """
+        self._compact()
+
+    def _append(self, records: list[list]) -> None:
+        """Append records to the log and apply them to the index.
+
+        Must be called with the lock held.
+        """
+        if self._closed:
+            raise ValueError("the store is closed")
+        lines = [_dumps(record) for record in records]
+        self._file.write(b"".join(lines))
+        self._file.flush()
+        if self._sync:
+            os.fsync(self._file.fileno())
+        for line in lines:
+            self._garbage += _apply(self._index, line, self._size)
+            self._size += len(line)
+        self._maybe_compact()
+
+    def _replay(self) -> int:
+        """Rebuild the index from the log, truncating a torn last record.
+
+        Returns:
+            The size of the log in bytes.
+        """
+        self._file.seek(0)
+        offset = 0
+        for number, line in enumerate(self._file, 1):
+            location = f"line {number} (offset {offset}) of {self._path}"
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("missing newline")
+                self._garbage += _apply(self._index, line, offset)
+            except CorruptLogError as e:
+                raise CorruptLogError(f"{e} at {location}") from None
+            except ValueError as e:
+                if self._file.read(1):
+                    raise CorruptLogError(
+                        f"damaged record at {location}"
+                    ) from e
+                _logger.warning(
+                    "truncating a partial record at offset %d of %s",
+                    offset,
+                    self._path,
+                )
+                self._file.truncate(offset)
+                break
+            offset += len(line)
+        return offset
+
+    def _maybe_compact(self) -> None:
+        """Start a background compaction if the log has enough garbage.
+
+        Must be called with the lock held.
+        """
+        if (
+            self._compactor is None
+            and self._size >= self._compaction_min_bytes
+            and self._garbage >= self._size * self._compaction_ratio
+        ):
+            self._compactor = threading.Thread(
+                target=self._run_compaction,
+                name="warabi-log-compactor",
+                daemon=True,
+            )
+            self._compactor.start()
+
+    def _run_compaction(self) -> None:
+        """Compact the log in the background thread."""
+        try:
+            self._compact()
+        except Exception:
+            # The log is left as it was, and a later write retries.
+            _logger.exception("log compaction failed")
+        finally:
+            with self._lock:
+                self._compactor = None
+
+    def _compact(self) -> None:
+        """Copy the live records to a new log and swap it in.
+
+        The records live when the compaction starts are copied without
+        holding the lock. The records appended meanwhile are then copied
+        and replayed with the lock held, right before the swap.
+        """
+        with self._compaction_lock:
+            self._compact_locked()
+
+    def _compact_locked(self) -> None:
+        """Compact the log, with the compaction lock held."""
+        target = f"{self._path}.compact"
+        with self._lock:
+            if self._closed:
+                return
+            live = sorted(
+                (offset, length, key)
+                for key, (offset, length) in self._index.items()
+            )
+            copied = self._size
+        index: dict[str, tuple[int, int]] = {}
+        try:
+            with (
+                open(self._path, "rb") as source,
+                open(target, "wb") as out,
+            ):
+                for offset, length, key in live:
+                    source.seek(offset)
+                    index[key] = (out.tell(), length)
+                    out.write(source.read(length))
+
+                with self._lock:
+                    source.seek(copied)
+                    tail = source.read(self._size - copied)
+                    garbage = 0
+                    offset = out.tell()
+                    for line in tail.splitlines(keepends=True):
+                        garbage += _apply(index, line, offset)
+                        offset += len(line)
+                    out.write(tail)
+                    out.flush()
+                    os.fsync(out.fileno())
+                    self._file.close()
+                    try:
+                        os.replace(target, self._path)
+                    finally:
+                        self._file = open(self._path, "a+b")
+                    self._index = index
+                    self._size = offset
+                    self._garbage = garbage
+        except BaseException:
+            _remove(target)
+            raise
+
+
+def _apply(
+    index: dict[str, tuple[int, int]],
+    line: bytes,
+    offset: int,
+) -> int:
+    """Apply the record at an offset of the log to an index.
+
+    Returns:
+        The number of bytes of the log that became garbage.
+    Raises:
+        ValueError: If the line is not valid JSON.
+        CorruptLogError: If the line is not a put or delete record.
+    """
+    record = json.loads(line)
+    if not _is_record(record):
+        raise CorruptLogError("malformed record")
+    op, key, *_ = record
+    previous = index.pop(key, None)
+    garbage = 0 if previous is None else previous[1]
+    if op == "put":
+        index[key] = (offset, len(line))
+    else:
+        garbage += len(line)
+    return garbage
+
+
+def _is_record(record: object) -> bool:
+    """Check that a parsed line is a put or a delete record."""
+    match record:
+        case ["put", str(), dict()] | ["del", str()]:
+            return True
+        case _:
+            return False
+
+
+def _dumps(record: list) -> bytes:
+    """Serialize a log record to a JSON line."""
+    text = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+    return f"{text}\n".encode()
+
+
+def _lock(path: str) -> BinaryIO:
+    """Open a lock file and take an exclusive lock on it without waiting.
+
+    Returns:
+        The open lock file, which holds the lock until it is closed.
+    Raises:
+        LogLockedError: If the lock is held by another open file.
+    """
+    file = open(path, "a+b")
+    if fcntl is not None:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            raise LogLockedError(
+                f"{path} is locked: the log is already open"
+            ) from None
+    return file
+
+
+def _remove(path: str) -> None:
+    """Delete a file if it exists."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,237 @@
+import itertools
+import json
+import os
+import sqlite3
+from collections.abc import Generator, Iterable
+from contextlib import contextmanager
+
+from ..common import AccessMode, Document, DocumentId
+from ..errors import ReadOnlyError
+from ..instrumentation import Instrumentation, commit_recorder, timer
+from ..sqlite_utils import (
+    READ_ONLY_MMAP_SIZE,
+    apply_pragmas,
+    connect,
+    transaction,
+)
+from . import KVStore
+
+# Keep well below SQLITE_MAX_VARIABLE_NUMBER for `IN (...)` lookups.
+_MAX_VARIABLES = 500
+
+
+class Sqlite3KVStore(KVStore):
+    def __init__(
+        self,
+        path: str | os.PathLike | None = None,
+        connection: sqlite3.Connection | None = None,
+        instrumentation: Instrumentation | None = None,
+        access_mode: AccessMode = "readwrite",
+        mmap_size: int | None = None,
+    ):
+        """Initialize Sqlite3KVStore.
+
+        Documents are stored as JSON in a `documents` table keyed by a
+        `doc_id` primary key, so point lookups use the B-tree index.
+        The table does not collide with the full-text search tables, so
+        the same file can be passed to `SqlLite3FullTextSearchEngine`.
+
+        Args:
+            path: The file path to the SQLite database.
+                   If None, uses in-memory storage.
+            connection: An existing connection to use instead of opening
+                `path`. Writes then join a transaction already open on it,
+                and the connection is left open when the store is deleted.
+            instrumentation: Collects the latency of serialization, SQL
+                execution and commits, or None to disable it.
+            access_mode: "readwrite" creates the `documents` table if
+                needed. "readonly" and "immutable" open an existing store
+                without creating anything, and writes raise
+                `ReadOnlyError`. See `AccessMode`.
+            mmap_size: The `mmap_size` pragma of the connection opened for
+                `path`, or None to keep the SQLite default, or
+                `READ_ONLY_MMAP_SIZE` in a read-only access mode.
+        """
+        if path is not None and connection is not None:
+            raise ValueError("path and connection are mutually exclusive")
+
+        self._owns_connection = connection is None
+        self._instrumentation = instrumentation
+        self._on_commit = commit_recorder(instrumentation, "kvs.commit")
+        self._access_mode = access_mode
+        read_only = access_mode != "readwrite"
+        if connection is None:
+            self._path = str(path) if path is not None else ":memory:"
+            self._conn = connect(self._path, access_mode)
+            if read_only and mmap_size is None:
+                mmap_size = READ_ONLY_MMAP_SIZE
+            apply_pragmas(self._conn, mmap_size)
+        else:
+            self._conn = connection
+        self._cursor = self._conn.cursor()
+        if read_only:
+            return
+
+        if path is not None:
+            self._cursor.execute("PRAGMA journal_mode = WAL")
+        self._cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                document TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def __del__(self):
+        """Ensure the database connection is closed"""
+        if getattr(self, "_owns_connection", False):
+            self._conn.close()
+
+    def insert(self, doc: Document, doc_id: DocumentId) -> None:
+        """Insert a document into the store.
+
+        Args:
+            doc: A dictionary representing the document to insert.
+            doc_id: The ID of the document.
+        Raises:
+            sqlite3.IntegrityError: If the document ID already exists.
+        """
+        with timer(self._instrumentation, "kvs.serialize"):
+            document = _dumps(doc)
+        with (
+            self._write(),
+            timer(self._instrumentation, "kvs.write"),
+        ):
+            self._cursor.execute(
+                "INSERT INTO documents (doc_id, document) VALUES (?, ?)",
+                (str(doc_id), document),
+            )
+
+    def insert_many(
+        self,
+        docs: Iterable[tuple[DocumentId, Document]],
+        batch_size: int = 1000,
+    ) -> None:
+        """Insert many documents, committing once per batch.
+
+        Args:
+            docs: An iterable of (doc_id, doc) pairs.
+            batch_size: The number of documents per transaction.
+        Raises:
+            sqlite3.IntegrityError: If a document ID already exists.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        for batch in itertools.batched(docs, batch_size, strict=False):
+            with timer(self._instrumentation, "kvs.serialize"):
+                rows = [(str(doc_id), _dumps(doc)) for doc_id, doc in batch]
+            with (
+                self._write(),
+                timer(self._instrumentation, "kvs.write"),
+            ):
+                self._cursor.executemany(
+                    "INSERT INTO documents (doc_id, document) VALUES (?, ?)",
+                    rows,
+                )
+
+    def get(self, doc_id: DocumentId) -> Document | None:
+        """Get the value associated with the given document ID.
+
+        Args:
+            doc_id: The ID of the document to retrieve.
+        Returns:
+            A dictionary representing the document, or None if not found.
+        """
+        with timer(self._instrumentation, "kvs.read"):
+            row = self._cursor.execute(
+                "SELECT document FROM documents WHERE doc_id = ?",
+                (str(doc_id),),
+            ).fetchone()
+        if row is None:
+            return None
+        with timer(self._instrumentation, "kvs.deserialize"):
+            return _loads(row[0])
+
+    def get_many(
+        self,
+        doc_ids: Iterable[DocumentId],
+    ) -> list[Document | None]:
+        """Get the documents associated with the given document IDs.
+
+        Args:
+            doc_ids: The IDs of the documents to retrieve.
+        Returns:
+            A list of documents in the order of `doc_ids`, with None for
+            IDs that were not found.
+        """
+        keys = [str(doc_id) for doc_id in doc_ids]
+        found: dict[str, str] = {}
+        with timer(self._instrumentation, "kvs.read"):
+            for batch in itertools.batched(
+                dict.fromkeys(keys), _MAX_VARIABLES, strict=False
+            ):
+                found.update(
+                    self._cursor.execute(
+                        "SELECT doc_id, document FROM documents "
+                        f"WHERE doc_id IN ({', '.join('?' * len(batch))})",
+                        batch,
+                    )
+                )
+        with timer(self._instrumentation, "kvs.deserialize"):
+            return [_loads(found[k]) if k in found else None for k in keys]
+
+    def update(self, doc: Document, doc_id: DocumentId) -> None:
+        """Update an existing document in the store.
+
+        Args:
+            doc: A dictionary representing the updated document.
+            doc_id: The ID of the document to update.
+        """
+        with timer(self._instrumentation, "kvs.serialize"):
+            document = _dumps(doc)
+        with (
+            self._write(),
+            timer(self._instrumentation, "kvs.write"),
+        ):
+            self._cursor.execute(
+                "UPDATE documents SET document = ? WHERE doc_id = ?",
+                (document, str(doc_id)),
+            )
+
+    def delete(self, doc_id: DocumentId) -> None:
+        """Delete the document with the given ID.
+
+        Args:
+            doc_id: The ID of the document to delete.
+        """
+        with (
+            self._write(),
+            timer(self._instrumentation, "kvs.write"),
+        ):
+            self._cursor.execute(
+                "DELETE FROM documents WHERE doc_id = ?",
+                (str(doc_id),),
+            )
+
+    @contextmanager
+    def _write(self) -> Generator[None]:
+        """Run a write transaction, refusing it in a read-only access mode."""
+        if self._access_mode != "readwrite":
+            raise ReadOnlyError(
+                f"the store was opened in {self._access_mode} mode"
+            )
+        with transaction(self._conn, self._on_commit):
+            yield
+
+
+def _dumps(doc: Document) -> str:
+    """Serialize a document to JSON text."""
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+
+def _loads(text: str) -> Document:
+    """Deserialize a document from JSON text."""
+    return Document(json.loads(text))
@@ -3,7 +3,8 @@ import os
 from tinydb import Query, TinyDB
 from tinydb.storages import MemoryStorage
 
-from ..common import Document, DocumentId
+from ..common import AccessMode, Document, DocumentId
+from ..errors import ReadOnlyError
 from . import KVStore
 
 
@@ -11,15 +12,28 @@ class TinyDbKVStore(KVStore):
     def __init__(
         self,
         path: str | os.PathLike | None = None,
+        access_mode: AccessMode = "readwrite",
     ):
         """Initialize TinyDbKVStore.
 
         Args:
             path: The file path to the TinyDB database.
                    If None, uses in-memory storage.
+            access_mode: "readwrite", or "readonly" or "immutable" to open
+                an existing file for reading only, so that writes raise
+                `ReadOnlyError`. Both read-only modes behave the same.
         """
+        if access_mode not in ("readwrite", "readonly", "immutable"):
+            raise ValueError(f"unsupported access mode: {access_mode!r}")
+        self._read_only = access_mode != "readwrite"
         if path is None:
+            if self._read_only:
+                raise ValueError(
+                    f"{access_mode} mode requires a database file path"
+                )
             self._db = TinyDB(storage=MemoryStorage)
+        elif self._read_only:
+            self._db = TinyDB(path, access_mode="r")
         else:
             self._db = TinyDB(path)
 
@@ -30,6 +44,7 @@ class TinyDbKVStore(KVStore):
             doc: A dictionary representing the document to insert.
             doc_id: The ID of the document.
         """
+        self._check_writable()
         self._db.insert({"doc_id": str(doc_id), "document": doc})
 
     def get(self, doc_id: DocumentId) -> Document | None:
@@ -50,6 +65,7 @@ class TinyDbKVStore(KVStore):
             doc: A dictionary representing the updated document.
             doc_id: The ID of the document to update.
         """
+        self._check_writable()
         self._db.update({"document": doc}, Query().doc_id == str(doc_id))
 
     def delete(self, doc_id: DocumentId) -> None:
@@ -58,4 +74,10 @@ class TinyDbKVStore(KVStore):
         Args:
             doc_id: The ID of the document to delete.
         """
+        self._check_writable()
         self._db.remove(Query().doc_id == str(doc_id))
+
+    def _check_writable(self) -> None:
+        """Raise `ReadOnlyError` if the store was opened read-only."""
+        if self._read_only:
+            raise ReadOnlyError("the store was opened in a read-only mode")
@@ -0,0 +1,230 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from pathlib import Path
+
+from .common import AccessMode
+
+READ_ONLY_MMAP_SIZE = 1 << 30
+"""The default `mmap_size` of read-only connections, in bytes.
+
+Memory-mapped pages live in the OS page cache, so every process mapping
+the same file shares them instead of copying them into its own cache.
+"""
+
+
+@contextmanager
+def transaction(
+    conn: sqlite3.Connection,
+    on_commit: Callable[[float], None] | None = None,
+) -> Generator[sqlite3.Connection]:
+    """Run the enclosed statements in a single transaction.
+
+    If the connection is already inside a transaction, the enclosed
+    statements join it and the outer owner is responsible for committing.
+
+    Args:
+        conn: The connection to run the transaction on.
+        on_commit: A callback called with the duration of the commit in
+            seconds, if this block commits.
+    Returns:
+        A context manager yielding the connection.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        if on_commit is None:
+            conn.commit()
+        else:
+            start = time.perf_counter()
+            conn.commit()
+            on_commit(time.perf_counter() - start)
+
+
+@contextmanager
+def relaxed_durability(conn: sqlite3.Connection) -> Generator[None]:
+    """Temporarily trade durability for write throughput.
+
+    Sets `synchronous` to OFF and, unless the database already uses WAL,
+    `journal_mode` to MEMORY. Both pragmas are restored on exit. A crash
+    while relaxed may corrupt the database, so use it only for loads that
+    can be repeated from the source data.
+
+    Args:
+        conn: The connection to relax.
+    Returns:
+        A context manager that restores the pragmas on exit.
+    """
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.execute("PRAGMA synchronous = OFF")
+    if journal_mode.lower() != "wal":
+        conn.execute("PRAGMA journal_mode = MEMORY")
+    try:
+        yield
+    finally:
+        if journal_mode.lower() != "wal":
+            conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+
+
+def apply_pragmas(
+    conn: sqlite3.Connection,
+    mmap_size: int | None = None,
+    cache_size: int | None = None,
+) -> None:
+    """Apply optional per-connection performance pragmas.
+
+    Args:
+        conn: The connection to configure.
+        mmap_size: The maximum number of bytes to memory-map, or None to
+            keep the SQLite default.
+        cache_size: The page cache size, in pages if positive or in KiB
+            if negative, or None to keep the SQLite default.
+    """
+    if mmap_size is not None:
+        conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    if cache_size is not None:
+        conn.execute(f"PRAGMA cache_size = {int(cache_size)}")
+
+
+def read_only_uri(path: str | os.PathLike, immutable: bool = False) -> str:
+    """Build a URI opening a database file in read-only mode.
+
+    Args:
+        path: The path to the database file.
+        immutable: If True, also declare that the file never changes, so
+            SQLite skips file locking and change detection.
+    Returns:
+        A `file:` URI for `sqlite3.connect(..., uri=True)`.
+    """
+    uri = f"{Path(path).absolute().as_uri()}?mode=ro"
+    return f"{uri}&immutable=1" if immutable else uri
+
+
+def connect(
+    path: str,
+    access_mode: AccessMode = "readwrite",
+    check_same_thread: bool = True,
+) -> sqlite3.Connection:
+    """Open a database file in an access mode.
+
+    Args:
+        path: The path to the database file, or ":memory:".
+        access_mode: "readwrite", or "readonly" or "immutable" to open an
+            existing file without write access.
+        check_same_thread: Passed to `sqlite3.connect`.
+    Returns:
+        The new connection.
+    Raises:
+        ValueError: If `access_mode` is unknown, or read-only for an
+            in-memory database.
+    """
+    if access_mode == "readwrite":
+        return sqlite3.connect(path, check_same_thread=check_same_thread)
+    if access_mode not in ("readonly", "immutable"):
+        raise ValueError(f"unsupported access mode: {access_mode!r}")
+    if path == ":memory:":
+        raise ValueError(f"{access_mode} mode requires a database file path")
+    return sqlite3.connect(
+        read_only_uri(path, immutable=access_mode == "immutable"),
+        uri=True,
+        check_same_thread=check_same_thread,
+    )
+
+
+def remove_database(path: str | os.PathLike) -> None:
+    """Delete a database file with its journal, WAL and shared-memory files.
+
+    Args:
+        path: The path to the database file. Missing files are ignored.
+    """
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        Path(f"{os.fspath(path)}{suffix}").unlink(missing_ok=True)
+
+
+class ConnectionPool:
+    """A pool of SQLite connections shared between threads.
+
+    Connections are created lazily by `factory`, and up to `size` of them
+    are kept for reuse. A thread borrows a connection for the duration of
+    a `connection()` block. When every kept connection is borrowed, the
+    borrower gets an extra connection that is closed on return instead of
+    waiting, so that one thread can hold several connections at once,
+    e.g. for concurrent `iter_search` iterations.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], sqlite3.Connection],
+        size: int,
+    ) -> None:
+        """Initialize ConnectionPool.
+
+        Args:
+            factory: A callable opening a new connection. The connection
+                must allow use from other threads.
+            size: The maximum number of connections kept for reuse.
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self._factory = factory
+        self._size = size
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._all: list[sqlite3.Connection] = []
+        # The number of kept connections, counting those being opened.
+        self._kept = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Generator[sqlite3.Connection]:
+        """Borrow a connection from the pool.
+
+        Returns:
+            A context manager yielding a connection, which is returned to
+            the pool, or closed if it is an extra one, on exit.
+        """
+        try:
+            conn = self._idle.get_nowait()
+            kept = True
+        except queue.Empty:
+            with self._lock:
+                kept = self._kept < self._size
+                if kept:
+                    self._kept += 1
+            try:
+                conn = self._factory()
+            except BaseException:
+                if kept:
+                    with self._lock:
+                        self._kept -= 1
+                raise
+            if kept:
+                with self._lock:
+                    self._all.append(conn)
+        try:
+            yield conn
+        finally:
+            if kept:
+                self._idle.put(conn)
+            else:
+                conn.close()
+
+    def close(self) -> None:
+        """Close every connection opened by the pool."""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
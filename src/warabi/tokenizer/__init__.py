@@ -1,6 +1,7 @@
+import importlib
 from abc import abstractmethod
-from collections.abc import Generator
-from typing import Protocol
+from collections.abc import Callable, Generator, Iterable
+from typing import Any, Protocol
 
 
 class Tokenizer(Protocol):
@@ -17,3 +18,76 @@ class Tokenizer(Protocol):
         raise NotImplementedError(
             "This method should be overridden by subclasses."
         )
+
+    def tokenize_batch(self, texts: Iterable[str]) -> list[str]:
+        """Tokenize many texts, joining the tokens of each by spaces.
+
+        Tokenizers can override this to amortize per-call overhead, e.g.
+        by reusing buffers, when indexing many short fields.
+
+        Args:
+            texts: The texts to tokenize.
+
+        Returns:
+            A list with the space-joined tokens of each text.
+        """
+        return [" ".join(self.tokenize(text)) for text in texts]
+
+    def warm_up(self) -> None:
+        """Load the resources of the tokenizer ahead of the first use.
+
+        Tokenizers may load their dictionaries lazily, so the first call
+        to `tokenize` pays for it. Call this at startup, or before forking
+        workers, to move that cost out of the first request.
+        """
+
+
+# Built-in tokenizers are referenced by "module:attribute" so that their
+# backends are only imported when requested.
+_FACTORIES: dict[str, Callable[..., Tokenizer] | str] = {
+    "janome": ".janome_tokenizer:JanomeTokenizer",
+    "sudachi": ".sudachi_tokenizer:SudachiTokenizer",
+}
+
+
+def register_tokenizer(
+    name: str,
+    factory: Callable[..., Tokenizer] | str,
+) -> None:
+    """Register a tokenizer under a name for `get_tokenizer`.
+
+    Args:
+        name: The name of the tokenizer.
+        factory: A callable creating the tokenizer, or a "module:attribute"
+            reference to one, which is imported on first use.
+    """
+    _FACTORIES[name] = factory
+
+
+def get_tokenizer(name: str, **options: Any) -> Tokenizer:
+    """Create a registered tokenizer, importing its backend if needed.
+
+    The built-in "janome" and "sudachi" tokenizers share one loaded
+    dictionary per process and load it on first use.
+
+    Args:
+        name: The name of the tokenizer.
+        **options: Keyword arguments passed to the tokenizer, e.g.
+            `mmap=True` for "janome".
+    Returns:
+        A new tokenizer.
+    Raises:
+        ValueError: If no tokenizer is registered under `name`.
+    """
+    try:
+        factory = _FACTORIES[name]
+    except KeyError:
+        raise ValueError(
+            f"unknown tokenizer {name!r}, expected one of {list(_FACTORIES)}"
+        ) from None
+    if isinstance(factory, str):
+        module, _, attribute = factory.partition(":")
+        factory = getattr(
+            importlib.import_module(module, __package__), attribute
+        )
+    return factory(**options)
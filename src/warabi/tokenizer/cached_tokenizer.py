@@ -0,0 +1,97 @@
+from collections.abc import Generator, Iterable
+
+from ..cache import CacheInfo, LRUCache
+from . import Tokenizer
+
+
+class CachedTokenizer(Tokenizer):
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        maxsize: int | None = 4096,
+        max_bytes: int | None = None,
+    ):
+        """Initialize the caching tokenizer.
+
+        Results are cached per input text. The FTS engine normalizes text
+        before tokenizing, so the cache is keyed on the normalized text.
+        Wrap the index tokenizer, the query tokenizer, or both, to enable
+        caching on the index and query paths separately.
+
+        Args:
+            tokenizer: The tokenizer whose results are cached.
+            maxsize: The maximum number of cached texts, or None for no
+                limit.
+            max_bytes: The maximum UTF-8 size of the cached texts and
+                tokens, or None for no limit.
+        """
+        self._tokenizer = tokenizer
+        self._cache: LRUCache[str, tuple[str, ...]] = LRUCache(
+            maxsize=maxsize,
+            max_weight=max_bytes,
+            weigh=_weigh,
+        )
+
+    def tokenize(self, text: str) -> Generator[str]:
+        """Tokenize a given text into tokens.
+
+        Args:
+            text: The text to tokenize.
+
+        Returns:
+            A generator of tokens.
+        """
+        tokens = self._cache.get(text)
+        if tokens is None:
+            tokens = tuple(self._tokenizer.tokenize(text))
+            self._cache.put(text, tokens)
+        yield from tokens
+
+    def tokenize_batch(self, texts: Iterable[str]) -> list[str]:
+        """Tokenize many texts, joining the tokens of each by spaces.
+
+        Cache misses are tokenized together by the wrapped tokenizer.
+
+        Args:
+            texts: The texts to tokenize.
+
+        Returns:
+            A list with the space-joined tokens of each text.
+        """
+        results: list[str] = []
+        misses: dict[str, list[int]] = {}
+        for i, text in enumerate(texts):
+            tokens = self._cache.get(text)
+            if tokens is None:
+                misses.setdefault(text, []).append(i)
+                results.append("")
+            else:
+                results.append(" ".join(tokens))
+        if misses:
+            tokenized = self._tokenizer.tokenize_batch(misses)
+            for (text, indices), joined in zip(
+                misses.items(), tokenized, strict=True
+            ):
+                self._cache.put(
+                    text, tuple(joined.split(" ")) if joined else ()
+                )
+                for i in indices:
+                    results[i] = joined
+        return results
+
+    def warm_up(self) -> None:
+        """Load the resources of the wrapped tokenizer."""
+        self._tokenizer.warm_up()
+
+    def cache_info(self) -> CacheInfo:
+        """Get the hit and miss statistics of the cache."""
+        return self._cache.cache_info()
+
+    def cache_clear(self) -> None:
+        """Remove all cached results."""
+        self._cache.clear()
+
+
+def _weigh(text: str, tokens: tuple[str, ...]) -> int:
+    """Approximate the memory held by a cache entry in bytes."""
+    return len(text.encode()) + sum(len(t.encode()) for t in tokens)
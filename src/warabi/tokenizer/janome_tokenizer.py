@@ -1,14 +1,66 @@
-from collections.abc import Generator
-
-import janome.tokenizer
+import threading
+from collections.abc import Generator, Iterable, Sequence
+from typing import TYPE_CHECKING, Literal
 
 from . import Tokenizer
 
+if TYPE_CHECKING:
+    import janome.tokenizer
+
+JanomeForm = Literal["surface", "base"]
+
+FUNCTION_WORD_POS: tuple[tuple[str, ...], ...] = (
+    ("助詞",),
+    ("助動詞",),
+    ("記号",),
+)
+"""Part-of-speech prefixes of particles, auxiliary verbs and symbols."""
+
+_lock = threading.Lock()
+_shared: dict[bool | None, "janome.tokenizer.Tokenizer"] = {}
+
 
 class JanomeTokenizer(Tokenizer):
-    def __init__(self):
-        """Initialize the Janome tokenizer."""
-        self._tokenizer = janome.tokenizer.Tokenizer()
+    def __init__(
+        self,
+        mmap: bool | None = None,
+        form: JanomeForm = "surface",
+        exclude_pos: Iterable[Sequence[str]] = (),
+        stopwords: Iterable[str] = (),
+    ):
+        """Initialize the Janome tokenizer.
+
+        Janome and its dictionary are loaded on first use, and the loaded
+        tokenizer is shared by every instance in the process.
+
+        Args:
+            mmap: If True, memory-map the system dictionary instead of
+                loading it into memory, which loads faster and lets forked
+                worker processes share its pages. None uses the Janome
+                default, which is True on 64-bit platforms.
+            form: The form of each emitted token: its "surface" form or
+                its "base" form, e.g. "行く" for "行っ".
+            exclude_pos: Part-of-speech prefixes whose tokens are dropped,
+                e.g. `FUNCTION_WORD_POS` or `[("名詞", "数")]`.
+            stopwords: Tokens that are dropped, compared in `form`.
+        """
+        if form not in ("surface", "base"):
+            raise ValueError(f"unsupported token form: {form!r}")
+
+        self._mmap = mmap
+        self._form = form
+        self._exclude_pos = tuple(tuple(pos) for pos in exclude_pos)
+        self._stopwords = frozenset(stopwords)
+        # Without options, tokenizing in wakati mode skips building the
+        # part of speech and base form of every token.
+        self._plain = (
+            form == "surface" and not self._exclude_pos and not self._stopwords
+        )
+        self._tokenizer: janome.tokenizer.Tokenizer | None = None
+
+    def __getstate__(self) -> dict:
+        """Pickle the options only, e.g. for tokenizer worker processes."""
+        return {**self.__dict__, "_tokenizer": None}
 
     def tokenize(self, text: str) -> Generator[str]:
         """Tokenize a given text into tokens.
@@ -19,9 +71,74 @@ class JanomeTokenizer(Tokenizer):
         Returns:
             A generator of tokens.
         """
-        for t in self._tokenizer.tokenize(
+        tokenizer = self._tokenizer or self._load()
+        if not self._plain:
+            yield from self._filter(tokenizer, text)
+            return
+        for t in tokenizer.tokenize(
             text,
             wakati=True,
         ):
             if token := str(t).strip():
                 yield token
+
+    def tokenize_batch(self, texts: Iterable[str]) -> list[str]:
+        """Tokenize many texts, joining the tokens of each by spaces.
+
+        Args:
+            texts: The texts to tokenize.
+
+        Returns:
+            A list with the space-joined tokens of each text.
+        """
+        tokenizer = self._tokenizer or self._load()
+        if not self._plain:
+            return [" ".join(self._filter(tokenizer, text)) for text in texts]
+        # Splitting the joined surfaces drops whitespace tokens in C
+        # instead of stripping every token in Python.
+        return [
+            " ".join(" ".join(tokenizer.tokenize(text, wakati=True)).split())
+            for text in texts
+        ]
+
+    def warm_up(self) -> None:
+        """Load Janome and its dictionary ahead of the first tokenization."""
+        self._load()
+
+    def _filter(
+        self,
+        tokenizer: "janome.tokenizer.Tokenizer",
+        text: str,
+    ) -> Generator[str]:
+        """Yield the tokens of a text kept by the options."""
+        exclude_pos = self._exclude_pos
+        stopwords = self._stopwords
+        base = self._form == "base"
+        for t in tokenizer.tokenize(text):
+            if exclude_pos:
+                pos = tuple(t.part_of_speech.split(","))
+                if any(pos[: len(prefix)] == prefix for prefix in exclude_pos):
+                    continue
+            token = (t.base_form if base else t.surface).strip()
+            if token and token not in stopwords:
+                yield token
+
+    def _load(self) -> "janome.tokenizer.Tokenizer":
+        """Get the Janome tokenizer shared in the process, loading it."""
+        if self._tokenizer is None:
+            self._tokenizer = _shared_tokenizer(self._mmap)
+        return self._tokenizer
+
+
+def _shared_tokenizer(mmap: bool | None) -> "janome.tokenizer.Tokenizer":
+    """Get the Janome tokenizer of the process for a dictionary mode."""
+    with _lock:
+        if (tokenizer := _shared.get(mmap)) is None:
+            import janome.tokenizer
+
+            if mmap is None:
+                tokenizer = janome.tokenizer.Tokenizer()
+            else:
+                tokenizer = janome.tokenizer.Tokenizer(mmap=mmap)
+            _shared[mmap] = tokenizer
+        return tokenizer
@@ -1,16 +1,87 @@
-from collections.abc import Generator
-
-import sudachipy.dictionary
-import sudachipy.tokenizer
+import threading
+from collections.abc import Callable, Generator, Iterable, Sequence
+from typing import TYPE_CHECKING, Literal
 
 from . import Tokenizer
 
+if TYPE_CHECKING:
+    import sudachipy
+    import sudachipy.dictionary
+    import sudachipy.tokenizer
+
+SudachiSplitMode = Literal["A", "B", "C", "multi"]
+SudachiForm = Literal["surface", "normalized", "dictionary"]
+
+FUNCTION_WORD_POS: tuple[tuple[str, ...], ...] = (
+    ("助詞",),
+    ("助動詞",),
+    ("補助記号",),
+    ("空白",),
+)
+"""Part-of-speech prefixes of particles, auxiliary verbs and symbols."""
+
+_lock = threading.Lock()
+_shared_dictionary: "sudachipy.dictionary.Dictionary | None" = None
+
 
 class SudachiTokenizer(Tokenizer):
-    def __init__(self):
-        """Initialize the Sudachi tokenizer."""
-        self._tokenizer = sudachipy.dictionary.Dictionary().create()
-        self._mode = sudachipy.tokenizer.Tokenizer.SplitMode.C
+    def __init__(
+        self,
+        split_mode: SudachiSplitMode = "C",
+        form: SudachiForm = "surface",
+        exclude_pos: Iterable[Sequence[str]] = (),
+        stopwords: Iterable[str] = (),
+    ):
+        """Initialize the Sudachi tokenizer.
+
+        SudachiPy and its dictionary are loaded on first use, and the
+        dictionary is shared by every instance in the process. A SudachiPy
+        tokenizer can't be used by two threads at once, so each thread
+        using the instance creates its own.
+
+        Args:
+            split_mode: "A" for the shortest units, "B" for middle units,
+                "C" for named-entity length units, or "multi" to emit
+                each C unit followed by its A units when it splits
+                further. "multi" lets a query for a part of a compound
+                word match it. Queries of such an index are best
+                tokenized in mode "A" or "C".
+            form: The form of each emitted token: its "surface" form, its
+                "normalized" form with spelling variants unified, or its
+                "dictionary" form.
+            exclude_pos: Part-of-speech prefixes whose morphemes are
+                dropped, e.g. `FUNCTION_WORD_POS` or `[("助詞",)]`.
+            stopwords: Tokens that are dropped, compared in `form`.
+        """
+        if split_mode not in ("A", "B", "C", "multi"):
+            raise ValueError(f"unsupported split mode: {split_mode!r}")
+        if form not in ("surface", "normalized", "dictionary"):
+            raise ValueError(f"unsupported token form: {form!r}")
+
+        self._split_mode = split_mode
+        self._form = form
+        self._exclude_pos = tuple(tuple(pos) for pos in exclude_pos)
+        self._stopwords = frozenset(stopwords)
+        self._plain = (
+            split_mode != "multi"
+            and form == "surface"
+            and not self._exclude_pos
+            and not self._stopwords
+        )
+        # The SudachiPy tokenizer and morpheme buffer of each thread.
+        self._local = threading.local()
+        self._excluded: Callable[[sudachipy.Morpheme], bool] | None = None
+        self._sub_mode: sudachipy.tokenizer.Tokenizer.SplitMode | None = None
+
+    def __getstate__(self) -> dict:
+        """Pickle the options only, e.g. for tokenizer worker processes."""
+        state = {**self.__dict__, "_excluded": None, "_sub_mode": None}
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore the options, with no thread state loaded yet."""
+        self.__dict__.update(state, _local=threading.local())
 
     def tokenize(self, text: str) -> Generator[str]:
         """Tokenize a given text into tokens.
@@ -21,9 +92,106 @@ class SudachiTokenizer(Tokenizer):
         Returns:
             A generator of tokens.
         """
-        for t in self._tokenizer.tokenize(
-            text.strip(),
-            self._mode,
-        ):
-            if token := t.surface().strip():
-                yield token
+        tokenizer = self._load()
+        morphemes = tokenizer.tokenize(text.strip())
+        if self._plain:
+            for t in morphemes:
+                if token := t.surface().strip():
+                    yield token
+        else:
+            yield from self._filter(morphemes)
+
+    def tokenize_batch(self, texts: Iterable[str]) -> list[str]:
+        """Tokenize many texts, joining the tokens of each by spaces.
+
+        One morpheme list per thread is reused for every text instead of
+        allocating a new one per call.
+
+        Args:
+            texts: The texts to tokenize.
+
+        Returns:
+            A list with the space-joined tokens of each text.
+        """
+        tokenizer = self._load()
+        local = self._local
+        morphemes = getattr(local, "morphemes", None)
+        results = []
+        for text in texts:
+            morphemes = tokenizer.tokenize(text, out=morphemes)
+            if self._plain:
+                # Splitting the joined surfaces drops whitespace morphemes
+                # in C instead of stripping every surface in Python.
+                results.append(
+                    " ".join(" ".join([m.surface() for m in morphemes]).split())
+                )
+            else:
+                results.append(" ".join(self._filter(morphemes)))
+        local.morphemes = morphemes
+        return results
+
+    def warm_up(self) -> None:
+        """Load SudachiPy and its dictionary ahead of the first use."""
+        self._load()
+
+    def _filter(
+        self,
+        morphemes: "sudachipy.MorphemeList",
+    ) -> Generator[str]:
+        """Yield the tokens of the morphemes kept by the options."""
+        excluded = self._excluded
+        form = self._form
+        stopwords = self._stopwords
+        sub_mode = self._sub_mode
+        for m in morphemes:
+            if excluded is not None and excluded(m):
+                continue
+            units = [m]
+            if sub_mode is not None:
+                parts = m.split(sub_mode)
+                if len(parts) > 1:
+                    units.extend(parts)
+            for unit in units:
+                if form == "surface":
+                    token = unit.surface().strip()
+                elif form == "normalized":
+                    token = unit.normalized_form().strip()
+                else:
+                    token = unit.dictionary_form().strip()
+                if token and token not in stopwords:
+                    yield token
+
+    def _load(self) -> "sudachipy.tokenizer.Tokenizer":
+        """Get the tokenizer of this thread, creating it from the dictionary."""
+        tokenizer = getattr(self._local, "tokenizer", None)
+        if tokenizer is None:
+            dictionary = _dictionary()
+            if self._exclude_pos:
+                # The matcher tests POS ids, which avoids building the POS
+                # tuple of every morpheme.
+                self._excluded = dictionary.pos_matcher(list(self._exclude_pos))
+            mode = self._split_mode
+            if mode == "multi":
+                mode = "C"
+                self._sub_mode = _split_mode("A")
+            tokenizer = dictionary.tokenizer(mode=_split_mode(mode))
+            self._local.tokenizer = tokenizer
+        return tokenizer
+
+
+def _split_mode(name: str) -> "sudachipy.tokenizer.Tokenizer.SplitMode":
+    """Get a Sudachi split mode by its name."""
+    import sudachipy.tokenizer
+
+    return getattr(sudachipy.tokenizer.Tokenizer.SplitMode, name)
+
+
+def _dictionary() -> "sudachipy.dictionary.Dictionary":
+    """Get the Sudachi dictionary of the process, loading it once."""
+    global _shared_dictionary
+    with _lock:
+        if _shared_dictionary is None:
+            import sudachipy.dictionary
+
+            _shared_dictionary = sudachipy.dictionary.Dictionary()
+        return _shared_dictionary
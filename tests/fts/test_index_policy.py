@@ -0,0 +1,44 @@
+import pytest
+
+from warabi.fts.index_policy import NON_TEXT_TYPES, IndexPolicy
+
+
+@pytest.mark.parametrize(
+    ("key", "value", "expected"),
+    [
+        ("@root.body", "text", True),
+        ("@root.body.text", "text", True),
+        ("@root.bodyguard", "text", False),
+        ("@root.body.url", "text", False),
+        ("@root.tags[3]", "text", True),
+        ("@root.tags", "text", False),
+        ("@root.meta.title", "text", True),
+        ("@root.meta.sub.title", "text", False),
+        ("@root.body", 42, False),
+        ("@root.body", None, False),
+    ],
+)
+def test_indexes(key: str, value: object, expected: bool):
+    """Test matching keys against include and exclude patterns."""
+    # given
+    policy = IndexPolicy(
+        include=["@root.body", "@root.tags[*]", "@root.*.title"],
+        exclude=["@root.body.url"],
+        skip_types=NON_TEXT_TYPES,
+    )
+
+    # when
+    indexed = policy.indexes(key, value)
+
+    # then
+    assert indexed is expected
+
+
+def test_default_indexes_everything():
+    """Test that a policy without options indexes every field."""
+    # given
+    policy = IndexPolicy()
+
+    # then
+    assert policy.indexes("@root.count", 1)
+    assert not policy.excludes("@root.meta")
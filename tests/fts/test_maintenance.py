@@ -0,0 +1,62 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from warabi.common import Document, DocumentId
+from warabi.fts.maintenance import IndexMaintainer
+from warabi.fts.sqlite3_fts import SqlLite3FullTextSearchEngine
+
+from .test_sqlite3_fts import MockTokenizer
+
+
+@pytest.fixture
+def engine(tmp_path: Path):
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), tmp_path / "test.db", threadsafe=True
+    )
+    engine.configure_merges(automerge=0, usermerge=2)
+    for i in range(8):
+        engine.insert(Document({"content": f"word{i}"}), DocumentId(f"doc{i}"))
+    yield engine
+    engine.close()
+
+
+def test_run_once_merges_until_done(engine: SqlLite3FullTextSearchEngine):
+    """Test that a slice merges until no work is left within its budget."""
+    # given
+    maintainer = IndexMaintainer(engine, time_budget=10.0)
+
+    # when
+    steps = maintainer.run_once()
+
+    # then
+    assert steps >= 1
+    assert engine.index_stats(count_terms=False).segments == 1
+    assert maintainer.run_once() == 0
+
+
+def test_run_once_stops_at_time_budget(engine: SqlLite3FullTextSearchEngine):
+    """Test that a slice with no budget runs a single step."""
+    # given
+    maintainer = IndexMaintainer(engine, time_budget=0.0, pages=1)
+
+    # when
+    steps = maintainer.run_once()
+
+    # then
+    assert steps == 1
+
+
+def test_background_thread(engine: SqlLite3FullTextSearchEngine):
+    """Test that the background thread merges the index while it runs."""
+    # when
+    with IndexMaintainer(engine, interval=0.01):
+        deadline = time.monotonic() + 5
+        while engine.index_stats(count_terms=False).segments > 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    # then
+    assert engine.index_stats(count_terms=False).segments == 1
+    assert len(engine.search("word3")) == 1
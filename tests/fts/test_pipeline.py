@@ -0,0 +1,42 @@
+import pytest
+
+from warabi.common import Document, DocumentId
+from warabi.fts.pipeline import tokenize_documents
+from warabi.tokenizer import Tokenizer
+
+
+class MockTokenizer(Tokenizer):
+    def tokenize(self, text: str) -> list[str]:
+        return text.split()
+
+
+def test_tokenize_documents_preserves_order():
+    """Test that tokenized documents come back in input order."""
+    # given
+    docs = [
+        (DocumentId(f"doc{i}"), Document({"content": f"ｗｏｒｄ {i}"}))
+        for i in range(20)
+    ]
+
+    # when
+    results = list(
+        tokenize_documents(
+            docs,
+            MockTokenizer,
+            workers=2,
+            chunk_size=3,
+            queue_size=1,
+        )
+    )
+
+    # then
+    assert [(doc_id, doc) for doc_id, doc, _ in results] == docs
+    assert [fields["@root.content"].text for _, _, fields in results] == [
+        f"word {i}" for i in range(20)
+    ]
+
+
+def test_tokenize_documents_invalid_workers():
+    """Test that a non-positive worker count is rejected."""
+    with pytest.raises(ValueError, match="workers"):
+        list(tokenize_documents([], MockTokenizer, workers=0))
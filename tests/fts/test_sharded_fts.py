@@ -0,0 +1,335 @@
+import threading
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from warabi.common import Document, DocumentId
+from warabi.errors import ReadOnlyError
+from warabi.fts.sharded_fts import ShardedFullTextSearchEngine, _jump_hash
+from warabi.fts.sqlite3_fts import SqlLite3FullTextSearchEngine
+from warabi.tokenizer import Tokenizer
+from warabi.tokenizer.sudachi_tokenizer import SudachiTokenizer
+
+from .test_sqlite3_fts import MockTokenizer
+
+
+@pytest.fixture
+def tokenizer() -> MockTokenizer:
+    return MockTokenizer()
+
+
+@pytest.fixture
+def sharded_engine(tokenizer: Tokenizer, tmp_path: Path):
+    engine = ShardedFullTextSearchEngine(tmp_path / "index", tokenizer, 3)
+    yield engine
+    engine.close()
+
+
+def _docs(n: int) -> list[tuple[DocumentId, Document]]:
+    return [
+        (DocumentId(f"doc{i}"), Document({"body": f"common word{i}"}))
+        for i in range(n)
+    ]
+
+
+def _shard_doc_ids(engine: ShardedFullTextSearchEngine) -> list[set[str]]:
+    return [set(shard.search("common")) for shard in engine._shards]
+
+
+def test_jump_hash_moves_keys_only_to_new_bucket():
+    """Test that growing the buckets moves keys only into the new one."""
+    # given
+    keys = range(0, 2**64, 2**64 // 1000)
+
+    # when
+    before = [_jump_hash(k, 4) for k in keys]
+    after = [_jump_hash(k, 5) for k in keys]
+
+    # then
+    assert all(a in (b, 4) for b, a in zip(before, after, strict=True))
+    assert 100 < after.count(4) < 300
+
+
+def test_insert_and_search(sharded_engine: ShardedFullTextSearchEngine):
+    """Test that documents are spread over shards and all are found."""
+    # given
+    docs = _docs(30)
+
+    # when
+    for doc_id, doc in docs:
+        sharded_engine.insert(doc, doc_id)
+
+    # then
+    assert set(sharded_engine.search("common")) == {
+        f"doc{i}" for i in range(30)
+    }
+    assert sharded_engine.search("word7") == ["doc7"]
+    assert all(_shard_doc_ids(sharded_engine))
+
+
+def test_search_merges_by_rank(sharded_engine: ShardedFullTextSearchEngine):
+    """Test that the merged results follow the ranks of all shards."""
+    # given
+    for i in range(12):
+        filler = " ".join(["filler"] * i)
+        sharded_engine.insert(
+            Document({"body": f"page {filler}"}), DocumentId(f"doc{i}")
+        )
+
+    # when
+    hits = sharded_engine.search_hits("page")
+    page = sharded_engine.search("page", limit=3, offset=2)
+
+    # then
+    ranks = [hit.rank for hit in hits]
+    assert ranks == sorted(ranks)
+    assert page == [hit.doc_id for hit in hits[2:5]]
+    assert set(sharded_engine.search("page", order=None)) == {
+        hit.doc_id for hit in hits
+    }
+
+
+def test_insert_many_update_and_delete(
+    sharded_engine: ShardedFullTextSearchEngine,
+):
+    """Test bulk and single writes routed to the shards."""
+    # given
+    sharded_engine.insert_many(_docs(20), batch_size=7)
+
+    # when
+    sharded_engine.update(Document({"body": "changed"}), DocumentId("doc3"))
+    sharded_engine.delete(DocumentId("doc4"))
+    sharded_engine.delete_many([DocumentId("doc5"), DocumentId("doc6")])
+
+    # then
+    assert len(sharded_engine.search("common")) == 16
+    assert sharded_engine.search("changed") == ["doc3"]
+    assert sharded_engine.search("word4") == []
+
+
+def test_reopen_keeps_shards(tokenizer: Tokenizer, tmp_path: Path):
+    """Test that an existing index is reopened with its shard count."""
+    # given
+    engine = ShardedFullTextSearchEngine(tmp_path, tokenizer, shards=2)
+    engine.insert_many(_docs(5))
+    engine.close()
+
+    # when
+    reopened = ShardedFullTextSearchEngine(tmp_path, tokenizer)
+
+    # then
+    assert reopened.shard_count == 2
+    assert len(reopened.search("common")) == 5
+    reopened.close()
+    with pytest.raises(ValueError, match="add_shard"):
+        ShardedFullTextSearchEngine(tmp_path, tokenizer, shards=3)
+
+
+def test_add_shard_rebalances(sharded_engine: ShardedFullTextSearchEngine):
+    """Test that adding a shard moves only the documents it now owns."""
+    # given
+    sharded_engine.insert_many(_docs(200))
+    before = _shard_doc_ids(sharded_engine)
+
+    # when
+    moved = sharded_engine.add_shard()
+
+    # then
+    after = _shard_doc_ids(sharded_engine)
+    assert sharded_engine.shard_count == 4
+    assert moved == len(after[3]) > 0
+    assert all(after[i] <= before[i] for i in range(3))
+    assert Counter(sharded_engine.search("common")) == Counter(
+        f"doc{i}" for i in range(200)
+    )
+    assert all(sharded_engine._shard_index(d) == 3 for d in after[3])
+
+
+def test_rebalance_is_repeatable(sharded_engine: ShardedFullTextSearchEngine):
+    """Test that an interrupted rebalance can be run again."""
+    # given
+    sharded_engine.insert_many(_docs(50))
+    sharded_engine.add_shard(rebalance=False)
+    # Simulate a crash after copying a document but before deleting it.
+    misplaced = next(
+        doc_id
+        for doc_id in _shard_doc_ids(sharded_engine)[0]
+        if sharded_engine._shard_index(doc_id) == 3
+    )
+    target: SqlLite3FullTextSearchEngine = sharded_engine._shards[3]
+    target.insert(Document({"body": f"common {misplaced}"}), misplaced)
+
+    # when
+    sharded_engine.rebalance()
+
+    # then
+    assert sharded_engine.rebalance() == 0
+    assert sorted(sharded_engine.search("common")) == sorted(
+        f"doc{i}" for i in range(50)
+    )
+
+
+def test_search_fields(sharded_engine: ShardedFullTextSearchEngine):
+    """Test restricting a search over every shard to some fields."""
+    # given
+    for i in range(6):
+        sharded_engine.insert(
+            Document({"title": f"title{i}", "body": "title0"}),
+            DocumentId(f"doc{i}"),
+        )
+
+    # when
+    results = sharded_engine.search("title0", fields=["@root.title"])
+
+    # then
+    assert results == ["doc0"]
+    assert len(sharded_engine.search("title0", fields=["@root.body"])) == 6
+
+
+def test_maintenance(sharded_engine: ShardedFullTextSearchEngine):
+    """Test merging every shard and summing their statistics."""
+    # given
+    sharded_engine.configure_merges(automerge=0)
+    for i in range(12):
+        sharded_engine.insert(
+            Document({"content": f"word{i}"}), DocumentId(f"doc{i}")
+        )
+
+    # when
+    before = sharded_engine.index_stats()
+    while sharded_engine.merge(-16):
+        pass
+    after = sharded_engine.index_stats()
+    sharded_engine.add_shard()
+
+    # then
+    assert before.fields == after.fields == 12
+    assert before.segments == 12
+    assert after.segments == 3
+    assert after.terms == 12
+    new_shard = sharded_engine._shards[-1]
+    automerge = new_shard._conn.execute(
+        "SELECT v FROM texts_config WHERE k = 'automerge'"
+    ).fetchone()
+    assert automerge == (0,)
+
+
+def test_export_and_import_tokens(
+    sharded_engine: ShardedFullTextSearchEngine,
+    tokenizer: Tokenizer,
+    tmp_path: Path,
+):
+    """Test moving tokenized documents to an index with other shards."""
+    # given
+    sharded_engine.insert_many(
+        (DocumentId(f"doc{i}"), Document({"content": f"word{i} shared"}))
+        for i in range(12)
+    )
+    target = ShardedFullTextSearchEngine(
+        tmp_path / "target", tokenizer, shards=5
+    )
+
+    # when
+    exported = sharded_engine.export_tokens(tmp_path / "tokens.jsonl")
+    imported = target.import_tokens(tmp_path / "tokens.jsonl", batch_size=5)
+    target.import_tokens(tmp_path / "tokens.jsonl")
+
+    # then
+    assert exported == imported == 12
+    assert len(target.search("shared")) == 12
+    assert target.search("word7") == ["doc7"]
+    rows = [
+        shard._conn.execute("SELECT COUNT(*) FROM fields").fetchone()[0]
+        for shard in target._shards
+    ]
+    assert sum(rows) == 12
+    target.close()
+
+
+def test_concurrent_search_with_sudachi(tmp_path: Path):
+    """Test searching from many threads with a non-reentrant tokenizer."""
+    # given
+    engine = ShardedFullTextSearchEngine(
+        tmp_path / "index", SudachiTokenizer(), 2
+    )
+    engine.insert(
+        Document({"content": "東京都で美味しいラーメンを食べた"}),
+        DocumentId("1"),
+    )
+    errors: list[BaseException] = []
+    barrier = threading.Barrier(8)
+
+    def search(n: int):
+        try:
+            barrier.wait()
+            for i in range(50):
+                hits = engine.search(f"美味しいラーメン{n}番{i}杯 東京都")
+                assert hits == []
+                assert engine.search("ラーメン") == ["1"]
+        except BaseException as e:
+            errors.append(e)
+
+    # when
+    threads = [threading.Thread(target=search, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # then
+    assert errors == []
+    engine.close()
+
+
+def test_read_only_mode(
+    sharded_engine: ShardedFullTextSearchEngine,
+    tokenizer: Tokenizer,
+    tmp_path: Path,
+):
+    """Test searching the shards of an index opened read-only."""
+    # given
+    sharded_engine.insert_many(
+        (DocumentId(f"doc{i}"), Document({"content": "shared"}))
+        for i in range(12)
+    )
+
+    # when
+    engine = ShardedFullTextSearchEngine(
+        sharded_engine._directory, tokenizer, access_mode="readonly"
+    )
+
+    # then
+    assert len(engine.search("shared")) == 12
+    with pytest.raises(ReadOnlyError):
+        engine.insert(Document({"content": "new"}), DocumentId("new"))
+    with pytest.raises(ReadOnlyError):
+        engine.add_shard()
+    with pytest.raises(ValueError, match="no shards"):
+        ShardedFullTextSearchEngine(
+            tmp_path / "missing", tokenizer, access_mode="readonly"
+        )
+    assert not (tmp_path / "missing").exists()
+    engine.close()
+
+
+def test_snapshot(
+    sharded_engine: ShardedFullTextSearchEngine,
+    tokenizer: Tokenizer,
+    tmp_path: Path,
+):
+    """Test that a snapshot opens as a sharded index with every document."""
+    # given
+    sharded_engine.insert_many(
+        (DocumentId(f"doc{i}"), Document({"content": "shared"}))
+        for i in range(12)
+    )
+
+    # when
+    sharded_engine.snapshot(tmp_path / "snapshot")
+
+    # then
+    copy = ShardedFullTextSearchEngine(tmp_path / "snapshot", tokenizer)
+    assert copy.shard_count == 3
+    assert len(copy.search("shared")) == 12
+    copy.close()
@@ -1,13 +1,23 @@
+import sqlite3
+import threading
 from pathlib import Path
 
 import pytest
 
-from warabi.common import Document, DocumentId
+from warabi.common import AccessMode, Document, DocumentId
+from warabi.errors import IndexModeMismatchError, ReadOnlyError
+from warabi.fts import IndexMode, SearchHit
+from warabi.fts.index_policy import NON_TEXT_TYPES, IndexPolicy
 from warabi.fts.sqlite3_fts import (
+    _MIGRATIONS,
     SqlLite3FullTextSearchEngine,
     _flatten_document,
 )
+from warabi.instrumentation import Instrumentation
+from warabi.sqlite_utils import READ_ONLY_MMAP_SIZE
 from warabi.tokenizer import Tokenizer
+from warabi.tokenizer.cached_tokenizer import CachedTokenizer
+from warabi.tokenizer.sudachi_tokenizer import SudachiTokenizer
 
 
 class MockTokenizer(Tokenizer):
@@ -15,6 +25,24 @@ class MockTokenizer(Tokenizer):
         return text.split()
 
 
+class UpperTokenizer(Tokenizer):
+    def tokenize(self, text: str) -> list[str]:
+        return [f"x{t}" for t in text.split()]
+
+
+class FailingTokenizer(Tokenizer):
+    def tokenize(self, text: str) -> list[str]:
+        raise AssertionError("unexpected tokenization")
+
+
+class StopwordTokenizer(Tokenizer):
+    def __init__(self, stopwords: set[str]):
+        self.stopwords = stopwords
+
+    def tokenize(self, text: str) -> list[str]:
+        return [t for t in text.split() if t not in self.stopwords]
+
+
 @pytest.fixture
 def tokenizer() -> MockTokenizer:
     return MockTokenizer()
@@ -182,20 +210,160 @@ def test_insert_and_search(fts_engine: SqlLite3FullTextSearchEngine):
     assert results_none == []
 
 
-def test_search_returns_doc_id_per_match(
+def test_search_returns_doc_id_once_per_document(
     fts_engine: SqlLite3FullTextSearchEngine,
 ):
-    """Test that search returns a document ID for each field match."""
+    """Test that search collapses field matches to one doc_id."""
     # given
     doc = Document({"title": "test", "body": "another test"})
     fts_engine.insert(doc, DocumentId("doc1"))
 
     # when
-    # "test" appears in two fields, so the doc_id should be returned twice
+    # "test" appears in two fields, but the doc_id is returned once
     results = fts_engine.search("test")
 
     # then
-    assert sorted(results) == ["doc1", "doc1"]
+    assert results == ["doc1"]
+
+
+def test_search_orders_by_bm25(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test that more relevant documents are ranked first."""
+    # given
+    fts_engine.insert(
+        Document({"body": "apple banana cherry durian elder fig"}),
+        DocumentId("weak"),
+    )
+    fts_engine.insert(Document({"body": "apple apple"}), DocumentId("strong"))
+
+    # when
+    results = fts_engine.search("apple")
+
+    # then
+    assert results == ["strong", "weak"]
+
+
+def test_search_limit_and_offset(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test paginating through ranked results."""
+    # given
+    for i in range(5):
+        filler = " ".join(["filler"] * i)
+        fts_engine.insert(
+            Document({"body": f"page {filler}"}), DocumentId(f"doc{i}")
+        )
+
+    # when
+    first = fts_engine.search("page", limit=2)
+    second = fts_engine.search("page", limit=2, offset=2)
+    rest = fts_engine.search("page", offset=4)
+
+    # then
+    assert first == ["doc0", "doc1"]
+    assert second == ["doc2", "doc3"]
+    assert rest == ["doc4"]
+
+
+def test_search_without_order(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test searching without ranking."""
+    # given
+    fts_engine.insert(Document({"body": "plain"}), DocumentId("doc1"))
+    fts_engine.insert(Document({"body": "plain text"}), DocumentId("doc2"))
+
+    # when
+    results = fts_engine.search("plain", order=None)
+
+    # then
+    assert set(results) == {"doc1", "doc2"}
+
+
+def test_search_invalid_order(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test that an unknown order is rejected."""
+    with pytest.raises(ValueError, match="order"):
+        fts_engine.search("anything", order="random")  # type: ignore[arg-type]
+
+
+def test_iter_search(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test lazily iterating over ranked results in small batches."""
+    # given
+    for i in range(5):
+        filler = " ".join(["filler"] * i)
+        fts_engine.insert(
+            Document({"body": f"export {filler}"}), DocumentId(f"doc{i}")
+        )
+
+    # when
+    results = list(fts_engine.iter_search("export", batch_size=2))
+
+    # then
+    assert results == [f"doc{i}" for i in range(5)]
+
+
+def test_iter_search_with_hits(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test that hits carry the best matching key and its rank."""
+    # given
+    fts_engine.insert(
+        Document({"title": "hit", "body": "hit plus other words"}),
+        DocumentId("doc1"),
+    )
+
+    # when
+    hits = list(fts_engine.iter_search("hit", with_hits=True))
+
+    # then
+    assert len(hits) == 1
+    assert isinstance(hits[0], SearchHit)
+    assert hits[0].doc_id == "doc1"
+    assert hits[0].key == "@root.title"
+    assert hits[0].rank < 0
+
+
+def test_iter_search_concurrent_iterations(
+    fts_engine: SqlLite3FullTextSearchEngine,
+):
+    """Test that interleaved iterations and searches do not interfere."""
+    # given
+    for i in range(4):
+        fts_engine.insert(
+            Document({"body": f"alpha beta n{i}"}), DocumentId(f"doc{i}")
+        )
+
+    # when
+    alpha = fts_engine.iter_search("alpha", batch_size=1, order=None)
+    beta = fts_engine.iter_search("beta", batch_size=1, order=None)
+    interleaved = []
+    for a, b in zip(alpha, beta, strict=True):
+        interleaved.append((a, b))
+        assert fts_engine.search("n0") == ["doc0"]
+
+    # then
+    assert [a for a, _ in interleaved] == [f"doc{i}" for i in range(4)]
+    assert [b for _, b in interleaved] == [f"doc{i}" for i in range(4)]
+
+
+def test_iter_search_more_iterations_than_read_pool(tmp_path: Path):
+    """Test live iterations beyond the read pool size in thread-safe mode."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), tmp_path / "test.db", threadsafe=True, read_pool_size=2
+    )
+    for i in range(3):
+        engine.insert(Document({"body": f"alpha n{i}"}), DocumentId(f"doc{i}"))
+    found: list[str] = []
+
+    # when
+    iterations = [
+        engine.iter_search("alpha", batch_size=1, order=None) for _ in range(5)
+    ]
+    firsts = [next(iteration) for iteration in iterations]
+    other = threading.Thread(target=lambda: found.extend(engine.search("n1")))
+    other.start()
+    other.join(timeout=10)
+    rests = [list(iteration) for iteration in iterations]
+
+    # then
+    assert firsts == ["doc0"] * 5
+    assert found == ["doc1"]
+    assert rests == [["doc1", "doc2"]] * 5
+    engine.close()
 
 
 def test_delete(fts_engine: SqlLite3FullTextSearchEngine):
@@ -253,6 +421,267 @@ def test_update_by_delete_and_insert(
     assert set(fts_engine.search("updated")) == {"doc1"}
 
 
+class CountingTokenizer(Tokenizer):
+    def __init__(self):
+        self.calls: list[str] = []
+
+    def tokenize(self, text: str) -> list[str]:
+        self.calls.append(text)
+        return text.split()
+
+
+def test_update_retokenizes_only_changed_fields():
+    """Test that update only tokenizes added and changed fields."""
+    # given
+    tokenizer = CountingTokenizer()
+    engine = SqlLite3FullTextSearchEngine(tokenizer)
+    engine.insert(
+        Document(
+            {
+                "title": "stable title",
+                "status": "draft",
+                "tags": ["keep", "drop"],
+            }
+        ),
+        DocumentId("doc1"),
+    )
+    tokenizer.calls.clear()
+
+    # when
+    engine.update(
+        Document(
+            {
+                "title": "stable title",
+                "status": "published",
+                "tags": ["keep"],
+                "extra": "added",
+            }
+        ),
+        DocumentId("doc1"),
+    )
+
+    # then
+    assert sorted(tokenizer.calls) == ["added", "published"]
+    assert engine.search("draft") == []
+    assert engine.search("drop") == []
+    assert engine.search("published") == ["doc1"]
+    assert engine.search("added") == ["doc1"]
+    assert engine.search("stable") == ["doc1"]
+    assert engine.search("keep") == ["doc1"]
+
+
+def test_update_nonexistent_inserts(
+    fts_engine: SqlLite3FullTextSearchEngine,
+):
+    """Test that updating a document that is not indexed inserts it."""
+    # when
+    fts_engine.update(Document({"content": "fresh"}), DocumentId("doc1"))
+
+    # then
+    assert fts_engine.search("fresh") == ["doc1"]
+
+
+def test_update_leaves_other_documents(
+    fts_engine: SqlLite3FullTextSearchEngine,
+):
+    """Test that updating a document does not touch other documents."""
+    # given
+    fts_engine.insert(Document({"content": "same"}), DocumentId("doc1"))
+    fts_engine.insert(Document({"content": "same"}), DocumentId("doc2"))
+
+    # when
+    fts_engine.update(Document({"content": "different"}), DocumentId("doc1"))
+
+    # then
+    assert fts_engine.search("same") == ["doc2"]
+    assert fts_engine.search("different") == ["doc1"]
+
+
+def test_search_with_query_tokenizer(tokenizer: Tokenizer):
+    """Test that queries are tokenized by the query tokenizer."""
+    # given
+    query_tokenizer = CachedTokenizer(tokenizer)
+    engine = SqlLite3FullTextSearchEngine(
+        tokenizer,
+        query_tokenizer=query_tokenizer,
+    )
+    engine.insert(Document({"content": "cached query"}), DocumentId("doc1"))
+
+    # when
+    first = engine.search("cached")
+    second = engine.search("cached")
+
+    # then
+    assert first == second == ["doc1"]
+    info = query_tokenizer.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_result_cache_hits_until_write(tokenizer: Tokenizer):
+    """Test that cached results are served until the next write."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(tokenizer, result_cache_size=8)
+    engine.insert(Document({"content": "popular"}), DocumentId("doc1"))
+
+    # when
+    first = engine.search("popular")
+    first.append("mutated by caller")
+    second = engine.search("popular")
+    engine.insert(Document({"content": "popular"}), DocumentId("doc2"))
+    third = engine.search("popular")
+
+    # then
+    assert second == ["doc1"]
+    assert set(third) == {"doc1", "doc2"}
+    info = engine.result_cache_info()
+    assert info is not None
+    assert (info.hits, info.misses) == (1, 2)
+
+
+def test_result_cache_keyed_on_pagination(tokenizer: Tokenizer):
+    """Test that different limits and offsets are cached separately."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(tokenizer, result_cache_size=8)
+    engine.insert_many(
+        (DocumentId(f"doc{i}"), Document({"content": "page"})) for i in range(3)
+    )
+
+    # when
+    first = engine.search("page", limit=1)
+    second = engine.search("page", limit=1, offset=1)
+
+    # then
+    assert len(first) == len(second) == 1
+    assert first != second
+
+
+def test_result_cache_sees_other_connections(
+    tokenizer: Tokenizer,
+    tmp_path: Path,
+):
+    """Test that writes from another connection invalidate the cache."""
+    # given
+    db_path = tmp_path / "test.db"
+    reader = SqlLite3FullTextSearchEngine(
+        tokenizer, db_path, result_cache_size=8
+    )
+    writer = SqlLite3FullTextSearchEngine(tokenizer, db_path)
+    writer.insert(Document({"content": "shared"}), DocumentId("doc1"))
+    assert reader.search("shared") == ["doc1"]
+
+    # when
+    writer.delete(DocumentId("doc1"))
+
+    # then
+    assert reader.search("shared") == []
+
+
+def test_result_cache_disabled_by_default(
+    fts_engine: SqlLite3FullTextSearchEngine,
+):
+    """Test that the result cache is opt-in."""
+    assert fts_engine.result_cache_info() is None
+
+
+def test_threadsafe_requires_path(tokenizer: Tokenizer):
+    """Test that thread-safe mode is rejected for in-memory databases."""
+    with pytest.raises(ValueError, match="path"):
+        SqlLite3FullTextSearchEngine(tokenizer, threadsafe=True)
+
+
+def test_threadsafe_concurrent_search_and_write(
+    tokenizer: Tokenizer,
+    tmp_path: Path,
+):
+    """Test searching from many threads while another thread writes."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        tokenizer,
+        tmp_path / "test.db",
+        threadsafe=True,
+        read_pool_size=2,
+        mmap_size=1 << 20,
+        cache_size=-2000,
+        result_cache_size=16,
+    )
+    engine.insert(Document({"content": "stable"}), DocumentId("base"))
+    errors: list[BaseException] = []
+
+    def search():
+        try:
+            for _ in range(50):
+                assert "base" in engine.search("stable")
+                assert "base" in list(engine.iter_search("stable"))
+        except BaseException as e:
+            errors.append(e)
+
+    def write():
+        try:
+            for i in range(50):
+                engine.insert(
+                    Document({"content": "stable"}), DocumentId(f"doc{i}")
+                )
+        except BaseException as e:
+            errors.append(e)
+
+    # when
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    threads.append(threading.Thread(target=write))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # then
+    assert errors == []
+    assert len(engine.search("stable")) == 51
+    mode = engine._conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_threadsafe_concurrent_search_with_sudachi(
+    cached: bool,
+    tmp_path: Path,
+):
+    """Test searching from many threads with a non-reentrant tokenizer."""
+    # given
+    tokenizer: Tokenizer = SudachiTokenizer()
+    if cached:
+        # Copies of a cached tokenizer share the wrapped tokenizer.
+        tokenizer = CachedTokenizer(tokenizer, maxsize=None)
+    engine = SqlLite3FullTextSearchEngine(
+        tokenizer, tmp_path / "test.db", threadsafe=True
+    )
+    engine.insert(
+        Document({"content": "東京都で美味しいラーメンを食べた"}),
+        DocumentId("1"),
+    )
+    errors: list[BaseException] = []
+    barrier = threading.Barrier(8)
+
+    def search(n: int):
+        try:
+            barrier.wait()
+            for i in range(100):
+                hits = engine.search(f"美味しいラーメン{n}番{i}杯 東京都")
+                assert hits == []
+                assert engine.search("ラーメン") == ["1"]
+        except BaseException as e:
+            errors.append(e)
+
+    # when
+    threads = [threading.Thread(target=search, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # then
+    assert errors == []
+    engine.close()
+
+
 def test_persistence(tokenizer: Tokenizer, tmp_path: Path):
     """Test that the index is persisted to a file."""
     # given
@@ -271,3 +700,776 @@ def test_persistence(tokenizer: Tokenizer, tmp_path: Path):
     engine2 = SqlLite3FullTextSearchEngine(tokenizer=tokenizer, path=db_path)
     results = engine2.search("persistent")
     assert set(results) == {"doc1"}
+
+
+def test_insert_many(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test bulk inserting documents across several batches."""
+    # given
+    docs = (
+        (DocumentId(f"doc{i}"), Document({"content": f"bulk word{i}"}))
+        for i in range(5)
+    )
+
+    # when
+    fts_engine.insert_many(docs, batch_size=2)
+
+    # then
+    assert set(fts_engine.search("bulk")) == {f"doc{i}" for i in range(5)}
+    assert set(fts_engine.search("word3")) == {"doc3"}
+
+
+def test_insert_many_keeps_committed_batches_on_error(
+    fts_engine: SqlLite3FullTextSearchEngine,
+):
+    """Test that a failing source keeps only the completed batches."""
+
+    # given
+    def docs():
+        yield DocumentId("doc1"), Document({"content": "committed"})
+        yield DocumentId("doc2"), Document({"content": "committed"})
+        yield DocumentId("doc3"), Document({"content": "pending"})
+        raise RuntimeError("source failed")
+
+    # when
+    with pytest.raises(RuntimeError):
+        fts_engine.insert_many(docs(), batch_size=2)
+
+    # then
+    assert set(fts_engine.search("committed")) == {"doc1", "doc2"}
+    assert fts_engine.search("pending") == []
+
+
+def test_insert_many_relax_durability_restores_pragmas(
+    file_fts_engine: SqlLite3FullTextSearchEngine,
+):
+    """Test that relaxed durability settings are restored after loading."""
+    # given
+    conn = file_fts_engine._conn
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    docs = [(DocumentId("doc1"), Document({"content": "relaxed"}))]
+
+    # when
+    file_fts_engine.insert_many(docs, relax_durability=True)
+
+    # then
+    assert set(file_fts_engine.search("relaxed")) == {"doc1"}
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == synchronous
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == journal_mode
+
+
+def test_delete_many(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test bulk deleting documents."""
+    # given
+    fts_engine.insert_many(
+        (DocumentId(f"doc{i}"), Document({"content": "shared"}))
+        for i in range(5)
+    )
+
+    # when
+    fts_engine.delete_many(
+        [DocumentId("doc0"), DocumentId("doc2"), DocumentId("missing")],
+        batch_size=2,
+    )
+
+    # then
+    assert set(fts_engine.search("shared")) == {"doc1", "doc3", "doc4"}
+
+
+def test_insert_many_with_workers(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test bulk inserting with tokenization in worker processes."""
+    # given
+    docs = [
+        (DocumentId(f"doc{i}"), Document({"content": f"parallel word{i}"}))
+        for i in range(10)
+    ]
+
+    # when
+    fts_engine.insert_many(docs, batch_size=4, workers=2, queue_size=2)
+
+    # then
+    assert set(fts_engine.search("parallel")) == {f"doc{i}" for i in range(10)}
+    assert set(fts_engine.search("word7")) == {"doc7"}
+
+
+def test_insert_many_with_workers_keeps_tokenizer_options(tmp_path: Path):
+    """Test that worker processes tokenize with a copy of the tokenizer."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        StopwordTokenizer({"common"}), tmp_path / "test.db"
+    )
+    docs = [
+        (DocumentId(f"doc{i}"), Document({"content": f"common word{i}"}))
+        for i in range(4)
+    ]
+
+    # when
+    engine.insert_many(docs, workers=2)
+
+    # then
+    assert engine.search("common") == []
+    assert engine.search("word1") == ["doc1"]
+
+
+def test_index_policy_skips_fields(tmp_path: Path):
+    """Test that excluded fields are neither tokenized nor stored."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(),
+        tmp_path / "test.db",
+        index_policy=IndexPolicy(
+            exclude=["@root.meta.url"],
+            skip_types=NON_TEXT_TYPES,
+        ),
+    )
+    doc = Document({"title": "hello", "meta": {"url": "example", "views": 42}})
+
+    # when
+    engine.insert(doc, DocumentId("doc1"))
+    engine.insert_many([(DocumentId("doc2"), doc)], workers=2)
+    engine.update(Document({**doc, "title": "bye"}), DocumentId("doc1"))
+
+    # then
+    keys = engine._conn.execute("SELECT DISTINCT key FROM fields").fetchall()
+    assert keys == [("@root.title",)]
+    assert engine.search("example") == []
+    assert engine.search("42") == []
+    assert engine.search("bye") == ["doc1"]
+
+
+@pytest.mark.parametrize("index_mode", ["morphological", "trigram"])
+def test_search_fields(index_mode: IndexMode):
+    """Test restricting a search to some fields."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer() if index_mode == "morphological" else None,
+        index_mode=index_mode,
+    )
+    engine.insert(
+        Document({"title": "apple pie", "tags": ["fruit"]}), DocumentId("doc1")
+    )
+    engine.insert(
+        Document({"title": "cake", "tags": ["apple", "fruit"]}),
+        DocumentId("doc2"),
+    )
+
+    # when
+    titles = engine.search("apple", fields=["@root.title"])
+    tags = engine.search("apple", fields=["@root.tags[0]", "@root.tags[1]"])
+    hits = list(
+        engine.iter_search("fruit", with_hits=True, fields=["@root.tags[1]"])
+    )
+
+    # then
+    assert titles == ["doc1"]
+    assert tags == ["doc2"]
+    assert [(h.doc_id, h.key) for h in hits] == [("doc2", "@root.tags[1]")]
+    assert engine.search("apple", fields=[]) == []
+    assert set(engine.search("apple")) == {"doc1", "doc2"}
+
+
+def test_search_fields_cannot_be_escaped(tokenizer: Tokenizer):
+    """Test that query syntax in a query can't widen the searched fields."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(tokenizer)
+    engine.insert(
+        Document({"title": "public", "body": "secret"}), DocumentId("doc1")
+    )
+
+    # when
+    hits = engine.search("secret ) OR ( nomatch", fields=["@root.title"])
+
+    # then
+    assert hits == []
+    assert engine.search("secret", fields=["@root.body"]) == ["doc1"]
+
+
+@pytest.mark.parametrize(
+    ("query", "expected"),
+    [
+        ("C++", ["doc1"]),
+        ("C#", ["doc1"]),
+        ("a-b", ["doc1"]),
+        ("x:y", ["doc1"]),
+        ("AND", ["doc1"]),
+        ("OR", ["doc1"]),
+        ("NOT", ["doc1"]),
+        ('say "hi', ["doc1"]),
+        ("^a", ["doc1"]),
+        # Punctuation only has no token to match.
+        ("*", []),
+        ("(", []),
+    ],
+)
+@pytest.mark.parametrize("fields", [None, ["@root.title"]])
+def test_search_operators_and_punctuation(
+    query: str,
+    expected: list[str],
+    fields: list[str] | None,
+    tokenizer: Tokenizer,
+):
+    """Test that FTS5 operators and punctuation are matched literally."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(tokenizer)
+    engine.insert(Document({"title": query}), DocumentId("doc1"))
+    engine.insert(Document({"title": "unrelated"}), DocumentId("doc2"))
+
+    # when
+    hits = engine.search(query, fields=fields)
+
+    # then
+    assert hits == expected
+
+
+def test_migrate_v2_index(tokenizer: Tokenizer, tmp_path: Path):
+    """Test that an index created before key tokens is migrated."""
+    # given
+    db_path = tmp_path / "v2.db"
+    conn = sqlite3.connect(db_path)
+    for version, migration in enumerate(_MIGRATIONS[:2], 1):
+        migration(conn, "morphological")
+        conn.execute(f"PRAGMA user_version = {version}")
+    conn.execute(
+        "INSERT INTO fields (doc_id, key, text) "
+        "VALUES ('doc1', '@root.title', 'old title')"
+    )
+    conn.commit()
+    conn.close()
+
+    # when
+    engine = SqlLite3FullTextSearchEngine(tokenizer, db_path)
+
+    # then
+    assert engine.search("old") == ["doc1"]
+    assert engine.search("old", fields=["@root.title"]) == ["doc1"]
+    assert engine.search("old", fields=["@root.body"]) == []
+    engine.delete(DocumentId("doc1"))
+    assert engine.search("old") == []
+
+
+@pytest.mark.parametrize("threadsafe", [False, True])
+@pytest.mark.parametrize("access_mode", ["readonly", "immutable"])
+def test_read_only_mode(
+    access_mode: AccessMode,
+    threadsafe: bool,
+    tmp_path: Path,
+):
+    """Test searching an index opened read-only and rejecting writes."""
+    # given
+    db_path = tmp_path / "test.db"
+    writer = SqlLite3FullTextSearchEngine(MockTokenizer(), db_path)
+    writer.insert(Document({"content": "hello world"}), DocumentId("doc1"))
+    writer.close()
+
+    # when
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(),
+        db_path,
+        threadsafe=threadsafe,
+        access_mode=access_mode,
+    )
+
+    # then
+    assert engine.search("hello") == ["doc1"]
+    assert engine.index_stats().fields == 1
+    (mmap_size,) = engine._conn.execute("PRAGMA mmap_size").fetchone()
+    assert mmap_size == READ_ONLY_MMAP_SIZE
+    with pytest.raises(ReadOnlyError, match=access_mode):
+        engine.insert(Document({"content": "new"}), DocumentId("doc2"))
+    with pytest.raises(ReadOnlyError):
+        engine.insert_many([(DocumentId("doc2"), Document({"content": "a"}))])
+    with pytest.raises(ReadOnlyError):
+        engine.delete(DocumentId("doc1"))
+    with pytest.raises(ReadOnlyError):
+        engine.optimize()
+    with pytest.raises(ReadOnlyError):
+        engine.rebuild([])
+    assert engine.search("hello") == ["doc1"]
+
+
+def test_read_only_mode_sees_writes_of_other_connections(tmp_path: Path):
+    """Test that a cached read-only engine sees commits of a writer."""
+    # given
+    db_path = tmp_path / "test.db"
+    writer = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), db_path, threadsafe=True
+    )
+    writer.insert(Document({"content": "hello"}), DocumentId("doc1"))
+    reader = SqlLite3FullTextSearchEngine(
+        MockTokenizer(),
+        db_path,
+        threadsafe=True,
+        result_cache_size=8,
+        access_mode="readonly",
+    )
+    assert reader.search("hello") == ["doc1"]
+
+    # when
+    writer.insert(Document({"content": "hello"}), DocumentId("doc2"))
+
+    # then
+    assert sorted(reader.search("hello")) == ["doc1", "doc2"]
+
+
+def test_read_only_mode_rejects_outdated_schema(tmp_path: Path):
+    """Test that a read-only open does not migrate an old index."""
+    # given
+    db_path = tmp_path / "v2.db"
+    conn = sqlite3.connect(db_path)
+    for version, migration in enumerate(_MIGRATIONS[:2], 1):
+        migration(conn, "morphological")
+        conn.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+    conn.close()
+
+    # when / then
+    with pytest.raises(ReadOnlyError, match="readwrite mode"):
+        SqlLite3FullTextSearchEngine(
+            MockTokenizer(), db_path, access_mode="readonly"
+        )
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 2
+
+
+def test_read_only_mode_requires_path():
+    """Test that an in-memory index cannot be opened read-only."""
+    with pytest.raises(ValueError, match="requires a database file path"):
+        SqlLite3FullTextSearchEngine(MockTokenizer(), access_mode="readonly")
+
+
+def test_merge_and_optimize(tmp_path: Path):
+    """Test reducing the segment count by merge steps and optimize."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), tmp_path / "test.db", threadsafe=True
+    )
+    engine.configure_merges(automerge=0)
+    for i in range(10):
+        engine.insert(Document({"content": f"word{i} shared"}), f"doc{i}")
+    before = engine.index_stats()
+
+    # when
+    steps = 0
+    while engine.merge(-16):
+        steps += 1
+    merged = engine.index_stats()
+    engine.insert(Document({"content": "late"}), DocumentId("late"))
+    engine.optimize()
+    optimized = engine.index_stats(count_terms=False)
+
+    # then
+    assert before.segments == 10
+    assert before.fields == 10
+    assert before.terms == 11
+    assert steps >= 1
+    assert merged.segments == 1
+    assert merged.data_bytes < before.data_bytes
+    assert optimized.segments == 1
+    assert optimized.terms is None
+    assert len(engine.search("shared")) == 10
+
+
+def test_configure_merges(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test that merge settings are stored in the index."""
+    # when
+    fts_engine.configure_merges(automerge=8, crisismerge=32, usermerge=2)
+
+    # then
+    settings = dict(
+        fts_engine._conn.execute("SELECT k, v FROM texts_config").fetchall()
+    )
+    assert settings["automerge"] == 8
+    assert settings["crisismerge"] == 32
+    assert settings["usermerge"] == 2
+
+
+def test_index_stats_empty(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test the statistics of an empty index."""
+    # when
+    stats = fts_engine.index_stats()
+
+    # then
+    assert stats.fields == 0
+    assert stats.segments == 0
+    assert stats.terms == 0
+
+
+@pytest.mark.parametrize("threadsafe", [False, True])
+def test_snapshot(threadsafe: bool, tmp_path: Path):
+    """Test that a snapshot is a complete copy of the index."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(),
+        tmp_path / "test.db" if threadsafe else None,
+        threadsafe=threadsafe,
+    )
+    engine.insert_many(
+        (DocumentId(f"doc{i}"), Document({"content": f"word{i} shared"}))
+        for i in range(100)
+    )
+    dest = tmp_path / "snapshot.db"
+
+    # when
+    engine.snapshot(dest, pages=1)
+    engine.insert(Document({"content": "shared"}), DocumentId("late"))
+
+    # then
+    copy = SqlLite3FullTextSearchEngine(MockTokenizer(), dest)
+    assert len(copy.search("shared")) == 100
+    assert copy.search("word42") == ["doc42"]
+    assert not (tmp_path / "snapshot.db.partial").exists()
+
+
+def test_rebuild(tmp_path: Path):
+    """Test rebuilding with a new tokenizer while a search is running."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(),
+        tmp_path / "test.db",
+        threadsafe=True,
+        result_cache_size=8,
+    )
+    docs = [
+        (DocumentId(f"doc{i}"), Document({"content": f"word{i}"}))
+        for i in range(20)
+    ]
+    engine.insert_many(docs)
+    engine.configure_merges(automerge=2)
+    assert engine.search("word1") == ["doc1"]
+    running = engine.iter_search("word3", batch_size=1)
+    assert next(running) == "doc3"
+
+    # when
+    engine.rebuild(docs[:10], tokenizer=UpperTokenizer())
+
+    # then
+    assert list(running) == []
+    assert engine.search("word1") == ["doc1"]
+    assert engine.search("word15") == []
+    assert engine._conn.execute(
+        "SELECT text FROM fields WHERE doc_id = 'doc1'"
+    ).fetchone() == ("xword1",)
+    assert engine._merge_settings() == {"automerge": 2}
+    assert engine.index_stats(count_terms=False).segments == 1
+    assert not (tmp_path / "test.db.rebuild").exists()
+
+
+def test_store_source(tmp_path: Path):
+    """Test that the normalized text of written fields is kept."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), tmp_path / "test.db", store_source=True
+    )
+    engine.insert(
+        Document({"title": "ＡＢＣ word", "body": "old"}), DocumentId("doc1")
+    )
+
+    # when
+    engine.update(
+        Document({"title": "ＡＢＣ word", "body": "new"}), DocumentId("doc1")
+    )
+
+    # then
+    assert engine._conn.execute(
+        "SELECT key, text, source FROM fields ORDER BY key"
+    ).fetchall() == [
+        ("@root.body", "new", "new"),
+        ("@root.title", "ABC word", "ABC word"),
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_insert_many_during_rebuild(workers: int, tmp_path: Path):
+    """Test that a bulk load overlapping a rebuild uses the new tokenizer."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), tmp_path / "test.db", threadsafe=True
+    )
+    paused = threading.Event()
+    resumed = threading.Event()
+
+    def docs():
+        paused.set()
+        resumed.wait()
+        for i in range(3):
+            yield DocumentId(f"after{i}"), Document({"body": f"word n{i}"})
+
+    # when
+    load = threading.Thread(
+        target=lambda: engine.insert_many(docs(), batch_size=1, workers=workers)
+    )
+    load.start()
+    paused.wait()
+    engine.rebuild([], tokenizer=UpperTokenizer())
+    resumed.set()
+    load.join()
+
+    # then
+    assert sorted(engine.search("word")) == ["after0", "after1", "after2"]
+    assert engine.search("n1") == ["after1"]
+    engine.close()
+
+
+def test_rebuild_from_stored_source(tmp_path: Path):
+    """Test re-tokenizing the stored sources without the documents."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), tmp_path / "test.db", store_source=True
+    )
+    engine.insert_many(
+        (DocumentId(f"doc{i}"), Document({"content": f"word{i} shared"}))
+        for i in range(20)
+    )
+
+    # when
+    engine.rebuild(tokenizer=UpperTokenizer(), batch_size=7)
+
+    # then
+    assert engine.search("word3") == ["doc3"]
+    assert len(engine.search("shared")) == 20
+    assert engine._conn.execute(
+        "SELECT text, source FROM fields WHERE doc_id = 'doc3'"
+    ).fetchone() == ("xword3 xshared", "word3 shared")
+
+
+def test_rebuild_without_stored_source(tmp_path: Path):
+    """Test that a rebuild needs a stored source for every field."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(MockTokenizer(), tmp_path / "test.db")
+    engine.insert(Document({"content": "hello"}), DocumentId("doc1"))
+
+    # when / then
+    with pytest.raises(ValueError, match="no stored source"):
+        engine.rebuild(tokenizer=UpperTokenizer())
+    assert engine.search("hello") == ["doc1"]
+    assert not (tmp_path / "test.db.rebuild").exists()
+
+
+def test_rebuild_refuses_other_virtual_tables(tmp_path: Path):
+    """Test that a rebuild won't drop a virtual table it can't copy."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), tmp_path / "test.db", store_source=True
+    )
+    engine._conn.execute("CREATE VIRTUAL TABLE notes USING fts5(body)")
+
+    # when / then
+    with pytest.raises(ValueError, match="virtual table 'notes'"):
+        engine.rebuild()
+    assert not (tmp_path / "test.db.rebuild").exists()
+
+
+@pytest.mark.parametrize("name", ["tokens.jsonl", "tokens.jsonl.gz"])
+def test_export_and_import_tokens(name: str, tmp_path: Path):
+    """Test moving an index without tokenizing its documents again."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), tmp_path / "test.db", store_source=True
+    )
+    engine.insert(
+        Document({"title": "hello world", "tags": ["a", "b"]}),
+        DocumentId("doc1"),
+    )
+    engine.insert(Document({"title": "hello"}), DocumentId("doc2"))
+    target = SqlLite3FullTextSearchEngine(
+        FailingTokenizer(), query_tokenizer=MockTokenizer()
+    )
+
+    # when
+    exported = engine.export_tokens(tmp_path / name)
+    imported = target.import_tokens(tmp_path / name, batch_size=1)
+
+    # then
+    assert exported == imported == 2
+    assert sorted(target.search("hello")) == ["doc1", "doc2"]
+    assert target.search("b", fields=["@root.tags[1]"]) == ["doc1"]
+    assert target._conn.execute(
+        "SELECT source FROM fields WHERE key = '@root.title' ORDER BY doc_id"
+    ).fetchall() == [("hello world",), ("hello",)]
+    # Digests are kept, so unchanged fields are not tokenized again.
+    target.update(
+        Document({"title": "hello world", "tags": ["a", "b"]}),
+        DocumentId("doc1"),
+    )
+    assert not (tmp_path / f"{name}.partial").exists()
+
+
+def test_import_tokens_replaces_documents(tmp_path: Path):
+    """Test that importing twice into a non-empty index keeps one copy."""
+    # given
+    source = SqlLite3FullTextSearchEngine(MockTokenizer())
+    source.insert(Document({"title": "fresh text"}), DocumentId("x"))
+    source.insert(Document({"title": "other"}), DocumentId("y"))
+    source.export_tokens(tmp_path / "tokens.jsonl")
+    target = SqlLite3FullTextSearchEngine(MockTokenizer())
+    target.insert(Document({"title": "stale text"}), DocumentId("x"))
+    target.insert(Document({"title": "kept"}), DocumentId("z"))
+
+    # when
+    target.import_tokens(tmp_path / "tokens.jsonl")
+    target.import_tokens(tmp_path / "tokens.jsonl")
+
+    # then
+    assert target._conn.execute(
+        "SELECT doc_id, COUNT(*) FROM fields GROUP BY doc_id ORDER BY doc_id"
+    ).fetchall() == [("x", 1), ("y", 1), ("z", 1)]
+    assert target.search("text") == ["x"]
+    assert target.search("stale") == []
+    assert target.search("kept") == ["z"]
+
+
+def test_import_tokens_rejects_other_files(tmp_path: Path):
+    """Test that only token exports of the same index mode are imported."""
+    # given
+    engine = SqlLite3FullTextSearchEngine(MockTokenizer())
+    engine.insert(Document({"content": "hello"}), DocumentId("doc1"))
+    engine.export_tokens(tmp_path / "tokens.jsonl")
+    (tmp_path / "other.jsonl").write_text('{"doc_id": "doc1"}\n')
+    trigram = SqlLite3FullTextSearchEngine(None, index_mode="trigram")
+
+    # when / then
+    with pytest.raises(IndexModeMismatchError):
+        trigram.import_tokens(tmp_path / "tokens.jsonl")
+    with pytest.raises(ValueError, match="not a supported token export"):
+        engine.import_tokens(tmp_path / "other.jsonl")
+
+
+def test_migrate_legacy_index(tokenizer: Tokenizer, tmp_path: Path):
+    """Test that an index with the legacy FTS-only layout is migrated."""
+    # given
+    db_path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE texts USING fts5(
+            text_id,
+            doc_id,
+            key,
+            text,
+            tokenize = "unicode61 remove_diacritics 0"
+        )
+        """
+    )
+    conn.executemany(
+        "INSERT INTO texts (text_id, doc_id, key, text) VALUES (?, ?, ?, ?)",
+        [
+            ("uuid-1", "doc1", "@root.title", "legacy title"),
+            ("uuid-2", "doc1", "@root.body", "legacy body"),
+            ("uuid-3", "doc2", "@root.title", "other"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    # when
+    engine = SqlLite3FullTextSearchEngine(tokenizer, db_path)
+
+    # then
+    assert engine.search("legacy") == ["doc1"]
+    assert engine.search("other") == ["doc2"]
+    engine.delete(DocumentId("doc1"))
+    assert engine.search("legacy") == []
+    assert engine._conn.execute("PRAGMA user_version").fetchone()[0] >= 1
+    tables = {
+        r[0] for r in engine._conn.execute("SELECT name FROM sqlite_master")
+    }
+    assert "texts_v0" not in tables
+
+
+def test_delete_uses_doc_id_index(fts_engine: SqlLite3FullTextSearchEngine):
+    """Test that deleting a document is an indexed lookup."""
+    # when
+    plan = fts_engine._conn.execute(
+        "EXPLAIN QUERY PLAN DELETE FROM fields WHERE doc_id = ?",
+        ("doc1",),
+    ).fetchall()
+
+    # then
+    assert any("USING COVERING INDEX" in row[-1] for row in plan)
+
+
+@pytest.fixture
+def trigram_engine() -> SqlLite3FullTextSearchEngine:
+    """Provides an in-memory FTS engine in trigram mode."""
+    return SqlLite3FullTextSearchEngine(None, index_mode="trigram")
+
+
+def test_trigram_substring_search(
+    trigram_engine: SqlLite3FullTextSearchEngine,
+):
+    """Test that trigram mode matches substrings without a tokenizer."""
+    # given
+    trigram_engine.insert(
+        Document({"body": "東京都庁の展望室"}), DocumentId("doc1")
+    )
+    trigram_engine.insert(Document({"body": "京都の寺"}), DocumentId("doc2"))
+
+    # when / then
+    assert trigram_engine.search("都庁の展望") == ["doc1"]
+    assert trigram_engine.search("ＡＢＣ") == []
+    assert set(trigram_engine.search("京都")) == {"doc1", "doc2"}
+    assert trigram_engine.search("展望室 京都") == ["doc1"]
+    assert trigram_engine.search("寺") == ["doc2"]
+
+
+def test_trigram_normalizes_and_escapes(
+    trigram_engine: SqlLite3FullTextSearchEngine,
+):
+    """Test NFKC normalization and escaping of query syntax."""
+    # given
+    trigram_engine.insert(
+        Document({"body": 'ＡＢＣ-123 "quoted" 100%'}), DocumentId("doc1")
+    )
+    trigram_engine.insert(Document({"body": "100 percent"}), DocumentId("doc2"))
+
+    # when / then
+    assert trigram_engine.search("abc-12") == ["doc1"]
+    assert trigram_engine.search('"quoted"') == ["doc1"]
+    assert trigram_engine.search("0%") == ["doc1"]
+    assert list(trigram_engine.iter_search("abc")) == ["doc1"]
+
+
+def test_trigram_requires_no_tokenizer(tokenizer: Tokenizer):
+    """Test that the tokenizer argument must match the index mode."""
+    with pytest.raises(ValueError, match="tokenizer"):
+        SqlLite3FullTextSearchEngine(tokenizer, index_mode="trigram")
+    with pytest.raises(ValueError, match="tokenizer"):
+        SqlLite3FullTextSearchEngine(None)
+
+
+def test_index_mode_mismatch(tokenizer: Tokenizer, tmp_path: Path):
+    """Test that reopening an index in another mode is rejected."""
+    # given
+    db_path = tmp_path / "test.db"
+    SqlLite3FullTextSearchEngine(None, db_path, index_mode="trigram").close()
+
+    # when / then
+    with pytest.raises(IndexModeMismatchError):
+        SqlLite3FullTextSearchEngine(tokenizer, db_path)
+    reopened = SqlLite3FullTextSearchEngine(None, db_path, index_mode="trigram")
+    assert reopened.search("anything") == []
+
+
+def test_instrumentation_records_stages(tokenizer: Tokenizer):
+    """Test that indexing and searching report their stages."""
+    # given
+    instrumentation = Instrumentation()
+    engine = SqlLite3FullTextSearchEngine(
+        tokenizer, instrumentation=instrumentation
+    )
+
+    # when
+    engine.insert(Document({"a": "x y", "b": "y"}), DocumentId("doc1"))
+    engine.update(Document({"a": "x z", "b": "y"}), DocumentId("doc1"))
+    engine.search("z")
+
+    # then
+    stats = instrumentation.stats()
+    assert stats["fts.flatten"].count == 1
+    # Fields are tokenized in one batch per document or update.
+    assert stats["fts.normalize"].count == 3
+    assert stats["fts.tokenize"].count == 3
+    assert stats["fts.write"].count == 3
+    assert stats["fts.commit"].count == 2
+    assert stats["fts.query"].count == 1
+    assert stats["fts.search"].count == 1
@@ -0,0 +1,255 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from warabi.common import Document, DocumentId
+from warabi.errors import CorruptLogError, LogLockedError
+from warabi.kvs.log_kvs import LogKVStore
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> Path:
+    """Fixture for the path of a log file."""
+    return tmp_path / "docs.log"
+
+
+@pytest.fixture
+def kvs(path: Path):
+    """Fixture for a LogKVStore that is closed afterwards."""
+    kvs = LogKVStore(path)
+    yield kvs
+    kvs.close()
+
+
+def test_insert_and_get(kvs: LogKVStore):
+    """Test inserting a document and retrieving it."""
+    # given
+    doc_id = DocumentId("1")
+    doc = Document({"text": "日本語の文書", "tags": ["a", "b"]})
+
+    # when
+    kvs.insert(doc, doc_id)
+
+    # then
+    assert kvs.get(doc_id) == doc
+    assert kvs.get(DocumentId("2")) is None
+    assert len(kvs) == 1
+
+
+def test_insert_duplicate(kvs: LogKVStore):
+    """Test that inserting an existing document ID raises an error."""
+    # given
+    kvs.insert(Document({"text": "first"}), DocumentId("1"))
+
+    # when / then
+    with pytest.raises(ValueError, match="already exists"):
+        kvs.insert_many(
+            [
+                (DocumentId("2"), Document({"text": "second"})),
+                (DocumentId("1"), Document({"text": "again"})),
+            ]
+        )
+    assert kvs.get(DocumentId("2")) is None
+
+
+def test_insert_many_and_get_many(kvs: LogKVStore):
+    """Test inserting documents in one append and getting them back."""
+    # given
+    docs = [
+        (DocumentId(str(i)), Document({"text": f"doc {i}"})) for i in range(5)
+    ]
+
+    # when
+    kvs.insert_many(docs)
+
+    # then
+    assert kvs.get_many([DocumentId("3"), DocumentId("9")]) == [
+        Document({"text": "doc 3"}),
+        None,
+    ]
+
+
+def test_update_and_delete(kvs: LogKVStore):
+    """Test that updates and deletes of missing documents do nothing."""
+    # given
+    kvs.insert(Document({"text": "old"}), DocumentId("1"))
+    kvs.insert(Document({"text": "gone"}), DocumentId("2"))
+
+    # when
+    kvs.update(Document({"text": "new"}), DocumentId("1"))
+    kvs.update(Document({"text": "missing"}), DocumentId("3"))
+    kvs.delete(DocumentId("2"))
+    kvs.delete(DocumentId("4"))
+
+    # then
+    assert kvs.get(DocumentId("1")) == Document({"text": "new"})
+    assert kvs.get(DocumentId("2")) is None
+    assert kvs.get(DocumentId("3")) is None
+    assert len(kvs) == 1
+
+
+def test_reopen(path: Path):
+    """Test that reopening a log replays every write."""
+    # given
+    kvs = LogKVStore(path)
+    kvs.insert(Document({"text": "old"}), DocumentId("1"))
+    kvs.insert(Document({"text": "gone"}), DocumentId("2"))
+    kvs.update(Document({"text": "new"}), DocumentId("1"))
+    kvs.delete(DocumentId("2"))
+    kvs.close()
+
+    # when
+    reopened = LogKVStore(path)
+
+    # then
+    assert reopened.get(DocumentId("1")) == Document({"text": "new"})
+    assert reopened.get(DocumentId("2")) is None
+    assert len(reopened) == 1
+    reopened.close()
+
+
+def test_truncate_partial_record(path: Path):
+    """Test that a record torn by a crash is dropped on open."""
+    # given
+    kvs = LogKVStore(path)
+    kvs.insert(Document({"text": "kept"}), DocumentId("1"))
+    kvs.close()
+    size = path.stat().st_size
+    with open(path, "ab") as f:
+        f.write(b'["put","2",{"te')
+
+    # when
+    kvs = LogKVStore(path)
+    kvs.insert(Document({"text": "after"}), DocumentId("3"))
+    kvs.close()
+
+    # then
+    reopened = LogKVStore(path)
+    assert reopened.get(DocumentId("1")) == Document({"text": "kept"})
+    assert reopened.get(DocumentId("2")) is None
+    assert reopened.get(DocumentId("3")) == Document({"text": "after"})
+    assert path.read_bytes()[size:].startswith(b'["put","3"')
+    reopened.close()
+
+
+def test_damaged_record(path: Path):
+    """Test that a damaged record before the end of the log is an error."""
+    # given
+    path.write_bytes(b'["put","1",{}]\n{broken\n["put","2",{}]\n')
+
+    # when / then
+    with pytest.raises(CorruptLogError, match="offset 15"):
+        LogKVStore(path)
+
+
+@pytest.mark.parametrize(
+    "record",
+    [b"{}", b"1", b"[]", b'["put","2"]', b'["put",2,{}]', b'["drop","2"]'],
+)
+@pytest.mark.parametrize("last", [False, True])
+def test_malformed_record(record: bytes, last: bool, path: Path):
+    """Test that valid JSON that is not a log record is an error."""
+    # given
+    lines = [b'["put","1",{}]', record] + ([] if last else [b'["del","1"]'])
+    path.write_bytes(b"\n".join(lines) + b"\n")
+
+    # when / then
+    with pytest.raises(CorruptLogError, match="malformed record at line 2 "):
+        LogKVStore(path)
+
+
+def test_lock(kvs: LogKVStore, path: Path):
+    """Test that a log open in another process is left untouched."""
+    # given
+    kvs.insert(Document({"text": "kept"}), DocumentId("1"))
+    with open(path, "ab") as f:
+        # As seen by others while the owner appends a record.
+        f.write(b'["put","2",{"te')
+    size = path.stat().st_size
+    script = (
+        "import sys\n"
+        "from warabi.errors import LogLockedError\n"
+        "from warabi.kvs.log_kvs import LogKVStore\n"
+        "try:\n"
+        "    LogKVStore(sys.argv[1])\n"
+        "except LogLockedError:\n"
+        "    sys.exit(3)\n"
+    )
+
+    # when
+    other = subprocess.run([sys.executable, "-c", script, str(path)])
+
+    # then
+    assert other.returncode == 3
+    assert path.stat().st_size == size
+    with pytest.raises(LogLockedError, match="already open"):
+        LogKVStore(path)
+
+
+def test_lock_released(path: Path):
+    """Test that closing a store or failing to open it releases the lock."""
+    # given
+    LogKVStore(path).close()
+    path.write_bytes(b"{broken\n[]\n")
+
+    # when / then
+    for _ in range(2):
+        with pytest.raises(CorruptLogError):
+            LogKVStore(path)
+
+
+def test_compact(kvs: LogKVStore, path: Path):
+    """Test that compaction keeps only the live records."""
+    # given
+    for i in range(10):
+        kvs.insert(Document({"text": f"doc {i}"}), DocumentId(str(i)))
+    for i in range(10):
+        kvs.update(Document({"text": f"new {i}"}), DocumentId(str(i)))
+    for i in range(5):
+        kvs.delete(DocumentId(str(i)))
+    size = path.stat().st_size
+
+    # when
+    kvs.compact()
+
+    # then
+    assert path.stat().st_size < size / 3
+    assert kvs.get(DocumentId("7")) == Document({"text": "new 7"})
+    assert kvs.get(DocumentId("2")) is None
+    kvs.insert(Document({"text": "after"}), DocumentId("2"))
+    kvs.close()
+    reopened = LogKVStore(path)
+    assert reopened.get_many([DocumentId("2"), DocumentId("7")]) == [
+        Document({"text": "after"}),
+        Document({"text": "new 7"}),
+    ]
+    assert not Path(f"{path}.compact").exists()
+    reopened.close()
+
+
+def test_background_compaction_with_concurrent_writes(path: Path):
+    """Test that writes made during background compactions are kept."""
+    # given
+    kvs = LogKVStore(path, compaction_ratio=0.5, compaction_min_bytes=1024)
+    kvs.insert_many((DocumentId(str(i)), Document({"n": 0})) for i in range(50))
+    written = path.stat().st_size * 40
+    compactions = []
+
+    # when
+    for n in range(1, 40):
+        for i in range(50):
+            kvs.update(Document({"n": n}), DocumentId(str(i)))
+        compactions.append(kvs._compactor is not None)
+    kvs.close()
+
+    # then
+    reopened = LogKVStore(path)
+    assert any(compactions)
+    assert path.stat().st_size < written / 2
+    assert (
+        reopened.get_many(DocumentId(str(i)) for i in range(50))
+        == [Document({"n": 39})] * 50
+    )
+    reopened.close()
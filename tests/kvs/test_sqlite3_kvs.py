@@ -0,0 +1,246 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from warabi.common import Document, DocumentId
+from warabi.errors import ReadOnlyError
+from warabi.fts.sqlite3_fts import SqlLite3FullTextSearchEngine
+from warabi.instrumentation import Instrumentation
+from warabi.kvs.sqlite3_kvs import Sqlite3KVStore
+from warabi.tokenizer import Tokenizer
+
+
+class MockTokenizer(Tokenizer):
+    def tokenize(self, text: str) -> list[str]:
+        return text.split()
+
+
+@pytest.fixture
+def in_memory_kvs() -> Sqlite3KVStore:
+    """Fixture for an in-memory Sqlite3KVStore."""
+    return Sqlite3KVStore()
+
+
+@pytest.fixture
+def file_kvs(tmp_path: Path) -> Sqlite3KVStore:
+    """Fixture for a file-based Sqlite3KVStore."""
+    return Sqlite3KVStore(tmp_path / "test.db")
+
+
+@pytest.fixture(params=["in_memory", "file"])
+def kvs(
+    request,
+    in_memory_kvs,
+    file_kvs,
+) -> Sqlite3KVStore:
+    """Parametrized fixture to test both in-memory and file-based stores."""
+    if request.param == "in_memory":
+        return in_memory_kvs
+    return file_kvs
+
+
+def test_init_with_path_uses_wal(file_kvs: Sqlite3KVStore):
+    """Test that a file-based store enables WAL mode."""
+    mode = file_kvs._conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+
+def test_insert_and_get(kvs: Sqlite3KVStore):
+    """Test inserting a document and retrieving it."""
+    # given
+    doc_id = DocumentId("1")
+    doc = Document({"text": "これはテストです。", "tags": ["a", 1, True]})
+
+    # when
+    kvs.insert(doc, doc_id)
+    retrieved_doc = kvs.get(doc_id)
+
+    # then
+    assert retrieved_doc == doc
+
+
+def test_insert_duplicate(kvs: Sqlite3KVStore):
+    """Test that inserting an existing document ID raises an error."""
+    # given
+    kvs.insert(Document({"text": "first"}), DocumentId("1"))
+
+    # when / then
+    with pytest.raises(sqlite3.IntegrityError):
+        kvs.insert(Document({"text": "second"}), DocumentId("1"))
+    assert kvs.get(DocumentId("1")) == {"text": "first"}
+
+
+def test_get_nonexistent(kvs: Sqlite3KVStore):
+    """Test that getting a non-existent document returns None."""
+    assert kvs.get(DocumentId("999")) is None
+
+
+def test_insert_many_and_get_many(kvs: Sqlite3KVStore):
+    """Test batch inserting and retrieving documents."""
+    # given
+    docs = [
+        (DocumentId(str(i)), Document({"text": f"doc {i}"}))
+        for i in range(1200)
+    ]
+
+    # when
+    kvs.insert_many(docs, batch_size=500)
+    retrieved = kvs.get_many(
+        [DocumentId("3"), DocumentId("missing"), DocumentId("1199")]
+    )
+
+    # then
+    assert retrieved == [{"text": "doc 3"}, None, {"text": "doc 1199"}]
+
+
+def test_update(kvs: Sqlite3KVStore):
+    """Test updating an existing document."""
+    # given
+    doc_id = DocumentId("1")
+    kvs.insert(Document({"text": "Initial version."}), doc_id)
+
+    # when
+    kvs.update(Document({"text": "Updated version."}), doc_id)
+
+    # then
+    assert kvs.get(doc_id) == {"text": "Updated version."}
+
+
+def test_update_nonexistent(kvs: Sqlite3KVStore):
+    """Test that updating a non-existent document does nothing."""
+    # when
+    kvs.update(Document({"text": "some text"}), DocumentId("999"))
+
+    # then
+    assert kvs.get(DocumentId("999")) is None
+
+
+def test_delete(kvs: Sqlite3KVStore):
+    """Test deleting an existing document."""
+    # given
+    doc_id = DocumentId("1")
+    kvs.insert(Document({"text": "This document will be deleted."}), doc_id)
+
+    # when
+    kvs.delete(doc_id)
+
+    # then
+    assert kvs.get(doc_id) is None
+
+
+@pytest.mark.parametrize("access_mode", ["readonly", "immutable"])
+def test_read_only_mode(access_mode, tmp_path: Path):
+    """Test reading a store opened read-only and rejecting writes."""
+    # given
+    db_path = tmp_path / "test.db"
+    doc = Document({"text": "hello"})
+    writer = Sqlite3KVStore(db_path)
+    writer.insert(doc, DocumentId("1"))
+    # Closing the last connection checkpoints the WAL, which an immutable
+    # connection ignores.
+    del writer
+
+    # when
+    kvs = Sqlite3KVStore(db_path, access_mode=access_mode)
+
+    # then
+    assert kvs.get(DocumentId("1")) == doc
+    assert kvs.get_many([DocumentId("1"), DocumentId("2")]) == [doc, None]
+    with pytest.raises(ReadOnlyError, match=access_mode):
+        kvs.insert(doc, DocumentId("2"))
+    with pytest.raises(ReadOnlyError):
+        kvs.insert_many([(DocumentId("2"), doc)])
+    with pytest.raises(ReadOnlyError):
+        kvs.update(doc, DocumentId("1"))
+    with pytest.raises(ReadOnlyError):
+        kvs.delete(DocumentId("1"))
+
+
+def test_read_only_mode_skips_schema(tmp_path: Path):
+    """Test that a read-only store does not create its table."""
+    # given
+    db_path = tmp_path / "test.db"
+    sqlite3.connect(db_path).close()
+
+    # when
+    Sqlite3KVStore(db_path, access_mode="readonly")
+
+    # then
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT name FROM sqlite_master").fetchall() == []
+
+
+def test_share_file_with_fts_engine(tmp_path: Path):
+    """Test that the store and the FTS engine can share one file."""
+    # given
+    db_path = tmp_path / "shared.db"
+    kvs = Sqlite3KVStore(db_path)
+    fts = SqlLite3FullTextSearchEngine(MockTokenizer(), db_path)
+    doc = Document({"text": "shared file"})
+
+    # when
+    kvs.insert(doc, DocumentId("1"))
+    fts.insert(doc, DocumentId("1"))
+
+    # then
+    assert kvs.get(DocumentId("1")) == doc
+    assert fts.search("shared") == ["1"]
+
+
+def test_fts_rebuild_keeps_shared_store(tmp_path: Path):
+    """Test that rebuilding an index keeps the store sharing its file."""
+    # given
+    db_path = tmp_path / "shared.db"
+    kvs = Sqlite3KVStore(db_path)
+    fts = SqlLite3FullTextSearchEngine(
+        MockTokenizer(), db_path, store_source=True
+    )
+    kvs._conn.execute(
+        "CREATE INDEX documents_length ON documents (length(document))"
+    )
+    kvs._conn.execute(
+        "CREATE TABLE counters (id INTEGER PRIMARY KEY AUTOINCREMENT, n)"
+    )
+    kvs._conn.execute("INSERT INTO counters (n) VALUES (1)")
+    kvs._conn.commit()
+    doc = Document({"text": "shared file"})
+    kvs.insert(doc, DocumentId("d1"))
+    fts.insert(doc, DocumentId("d1"))
+
+    # when
+    fts.rebuild()
+
+    # then
+    assert kvs.get(DocumentId("d1")) == doc
+    assert fts.search("shared") == ["d1"]
+    conn = kvs._conn
+    assert conn.execute("SELECT n FROM counters").fetchall() == [(1,)]
+    assert conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'counters'"
+    ).fetchone() == (1,)
+    assert conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'documents_length'"
+    ).fetchone() == (1,)
+
+
+def test_instrumentation_records_stages():
+    """Test that store operations report their stages."""
+    # given
+    instrumentation = Instrumentation()
+    kvs = Sqlite3KVStore(instrumentation=instrumentation)
+
+    # when
+    kvs.insert(Document({"a": 1}), DocumentId("doc1"))
+    kvs.insert_many([(DocumentId("doc2"), Document({"a": 2}))])
+    kvs.get(DocumentId("doc1"))
+    kvs.get_many([DocumentId("doc1"), DocumentId("doc2")])
+    kvs.delete(DocumentId("doc2"))
+
+    # then
+    stats = instrumentation.stats()
+    assert stats["kvs.serialize"].count == 2
+    assert stats["kvs.write"].count == 3
+    assert stats["kvs.commit"].count == 3
+    assert stats["kvs.read"].count == 2
+    assert stats["kvs.deserialize"].count == 2
@@ -5,6 +5,7 @@ import pytest
 from tinydb.storages import JSONStorage, MemoryStorage
 
 from warabi.common import Document, DocumentId
+from warabi.errors import ReadOnlyError
 from warabi.kvs.tinydb_kvs import TinyDbKVStore
 
 
@@ -112,3 +113,22 @@ def test_delete(kvs: TinyDbKVStore):
 
     # then
     assert kvs.get(doc_id) is None
+
+
+def test_read_only_mode(tmp_path: Path):
+    """Test reading a store opened read-only and rejecting writes."""
+    # given
+    path = tmp_path / "test.db"
+    doc = Document({"text": "hello"})
+    TinyDbKVStore(path).insert(doc, DocumentId("1"))
+
+    # when
+    kvs = TinyDbKVStore(path, access_mode="readonly")
+
+    # then
+    assert kvs.get(DocumentId("1")) == doc
+    with pytest.raises(ReadOnlyError):
+        kvs.insert(doc, DocumentId("2"))
+    with pytest.raises(ReadOnlyError):
+        kvs.delete(DocumentId("1"))
+    assert TinyDbKVStore(path).get(DocumentId("1")) == doc
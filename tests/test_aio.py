@@ -0,0 +1,222 @@
+import asyncio
+import gc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from warabi.aio import AsyncWarabiDB
+from warabi.common import Document, DocumentId
+from warabi.fts.index_policy import IndexPolicy
+from warabi.tokenizer import Tokenizer
+
+
+class MockTokenizer(Tokenizer):
+    def tokenize(self, text: str) -> list[str]:
+        return text.split()
+
+
+class FailingTokenizer(Tokenizer):
+    def tokenize(self, text: str) -> list[str]:
+        if "fail" in text:
+            raise RuntimeError("tokenization failed")
+        return text.split()
+
+
+def test_crud_and_search():
+    """Test the async CRUD operations and search."""
+
+    async def main():
+        db = await AsyncWarabiDB.open(tokenizer_factory=MockTokenizer)
+        await db.insert(Document({"body": "async hello"}), DocumentId("doc1"))
+        await db.update(Document({"body": "async world"}), DocumentId("doc1"))
+        await db.insert(Document({"body": "async async"}), DocumentId("doc2"))
+        results = await db.search("async")
+        doc = await db.get(DocumentId("doc1"))
+        await db.delete(DocumentId("doc2"))
+        after_delete = await db.search("async")
+        await db.close()
+        return results, doc, after_delete
+
+    # when
+    results, doc, after_delete = asyncio.run(main())
+
+    # then
+    assert [doc_id for doc_id, _ in results] == ["doc2", "doc1"]
+    assert doc == {"body": "async world"}
+    assert after_delete == [(DocumentId("doc1"), {"body": "async world"})]
+
+
+def test_insert_many_with_thread_executor():
+    """Test bulk inserting with tokenization on a thread pool."""
+
+    async def main():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            db = await AsyncWarabiDB.open(
+                tokenizer_factory=MockTokenizer,
+                executor=executor,
+            )
+            await db.insert_many(
+                (
+                    (DocumentId(f"doc{i}"), Document({"body": f"bulk n{i}"}))
+                    for i in range(25)
+                ),
+                batch_size=10,
+            )
+            results = await db.search("bulk")
+            single = await db.search("n7")
+            await db.close()
+            return results, single
+
+    # when
+    results, single = asyncio.run(main())
+
+    # then
+    assert len(results) == 25
+    assert single == [(DocumentId("doc7"), {"body": "bulk n7"})]
+
+
+def test_insert_many_retrieves_errors_of_every_batch():
+    """Test that a failed batch doesn't leave a write error unretrieved."""
+    unretrieved: list[dict] = []
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda _, context: unretrieved.append(context)
+        )
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            db = await AsyncWarabiDB.open(
+                tokenizer_factory=FailingTokenizer,
+                executor=executor,
+            )
+            await db.insert(Document({"body": "first"}), DocumentId("doc1"))
+            error = None
+            try:
+                # The first batch fails to write a duplicate doc_id while
+                # the second one fails to tokenize.
+                await db.insert_many(
+                    [
+                        (DocumentId("doc1"), Document({"body": "again"})),
+                        (DocumentId("doc2"), Document({"body": "fail"})),
+                    ],
+                    batch_size=1,
+                )
+            except RuntimeError as e:
+                error = str(e)
+            await db.close()
+            # Collect the futures of the failed call.
+            gc.collect()
+            return error
+
+    # when
+    error = asyncio.run(main())
+
+    # then
+    assert error == "tokenization failed"
+    assert unretrieved == []
+
+
+def test_process_executor(tmp_path: Path):
+    """Test tokenization in worker processes with a file database."""
+
+    async def main():
+        with ProcessPoolExecutor(
+            max_workers=2,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            db = await AsyncWarabiDB.open(
+                tmp_path / "test.db",
+                tokenizer_factory=MockTokenizer,
+                executor=executor,
+            )
+            await db.insert(Document({"body": "process"}), DocumentId("doc1"))
+            results = await db.search("process")
+            await db.close()
+            return results
+
+    # when
+    results = asyncio.run(main())
+
+    # then
+    assert results == [(DocumentId("doc1"), {"body": "process"})]
+
+
+def test_iter_search():
+    """Test async iteration over matches in batches."""
+
+    async def main():
+        db = await AsyncWarabiDB.open(tokenizer_factory=MockTokenizer)
+        await db.insert_many(
+            (DocumentId(f"doc{i}"), Document({"body": "stream"}))
+            for i in range(7)
+        )
+        results = [doc_id async for doc_id, _ in db.iter_search("stream", 3)]
+        await db.close()
+        return results
+
+    # when
+    results = asyncio.run(main())
+
+    # then
+    assert sorted(results) == [f"doc{i}" for i in range(7)]
+
+
+def test_identical_searches_are_coalesced():
+    """Test that concurrent identical searches run a single query."""
+
+    async def main():
+        db = await AsyncWarabiDB.open(tokenizer_factory=MockTokenizer)
+        await db.insert(Document({"body": "popular"}), DocumentId("doc1"))
+        calls = 0
+        search_tokenized = db._db._search_tokenized
+
+        def counting(*args):
+            nonlocal calls
+            calls += 1
+            return search_tokenized(*args)
+
+        db._db._search_tokenized = counting
+        results = await asyncio.gather(
+            *(db.search("popular") for _ in range(5))
+        )
+        other = await db.search("popular", limit=1)
+        await db.close()
+        return results, other, calls
+
+    # when
+    results, other, calls = asyncio.run(main())
+
+    # then
+    assert all(
+        r == [(DocumentId("doc1"), {"body": "popular"})] for r in results
+    )
+    assert other == results[0]
+    assert calls == 2
+
+
+def test_index_policy_and_search_fields():
+    """Test the index policy on the tokenization executor and field search."""
+
+    async def main():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            db = await AsyncWarabiDB.open(
+                tokenizer_factory=MockTokenizer,
+                executor=executor,
+                index_policy=IndexPolicy(exclude=["@root.id"]),
+            )
+            await db.insert_many(
+                [
+                    (DocumentId("doc1"), Document({"title": "a", "id": "x"})),
+                    (DocumentId("doc2"), Document({"title": "x", "body": "a"})),
+                ]
+            )
+            excluded = await db.search("x")
+            titles = await db.search("a", fields=["@root.title"])
+            await db.close()
+            return excluded, titles
+
+    # when
+    excluded, titles = asyncio.run(main())
+
+    # then
+    assert [doc_id for doc_id, _ in excluded] == ["doc2"]
+    assert [doc_id for doc_id, _ in titles] == ["doc1"]
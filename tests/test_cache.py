@@ -0,0 +1,96 @@
+import pytest
+
+from warabi.cache import CacheInfo, LRUCache
+
+
+def test_get_and_put():
+    """Test storing and retrieving values with hit/miss counters."""
+    # given
+    cache: LRUCache[str, int] = LRUCache(maxsize=2)
+
+    # when
+    cache.put("a", 1)
+    hit = cache.get("a")
+    miss = cache.get("b")
+
+    # then
+    assert hit == 1
+    assert miss is None
+    assert cache.cache_info() == CacheInfo(
+        hits=1, misses=1, evictions=0, currsize=1, weight=0
+    )
+
+
+def test_evicts_least_recently_used():
+    """Test that the least recently used entry is evicted first."""
+    # given
+    cache: LRUCache[str, int] = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+
+    # when
+    cache.put("c", 3)
+
+    # then
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.cache_info().evictions == 1
+
+
+def test_evicts_by_weight():
+    """Test that entries are evicted to stay under the weight bound."""
+    # given
+    cache: LRUCache[str, str] = LRUCache(
+        maxsize=None,
+        max_weight=10,
+        weigh=lambda k, v: len(v),
+    )
+
+    # when
+    cache.put("a", "x" * 6)
+    cache.put("b", "x" * 6)
+    cache.put("huge", "x" * 11)
+
+    # then
+    assert cache.get("a") is None
+    assert cache.get("b") == "x" * 6
+    assert cache.get("huge") is None
+    assert cache.cache_info().weight == 6
+
+
+def test_replace_updates_weight():
+    """Test that replacing a key does not count the old weight."""
+    # given
+    cache: LRUCache[str, str] = LRUCache(max_weight=10, weigh=lambda k, v: 3)
+    cache.put("a", "old")
+
+    # when
+    cache.put("a", "new")
+
+    # then
+    assert cache.get("a") == "new"
+    assert cache.cache_info().weight == 3
+
+
+def test_clear():
+    """Test that clear removes entries and keeps statistics."""
+    # given
+    cache: LRUCache[str, int] = LRUCache()
+    cache.put("a", 1)
+    cache.get("a")
+
+    # when
+    cache.clear()
+
+    # then
+    assert cache.get("a") is None
+    assert cache.cache_info().currsize == 0
+    assert cache.cache_info().hits == 1
+
+
+def test_max_weight_requires_weigh():
+    """Test that a weight bound without a weigh function is rejected."""
+    with pytest.raises(ValueError, match="weigh"):
+        LRUCache(max_weight=10)
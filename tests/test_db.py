@@ -0,0 +1,240 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from warabi import WarabiDB
+from warabi.common import Document, DocumentId
+from warabi.errors import ReadOnlyError
+from warabi.fts.index_policy import IndexPolicy
+from warabi.tokenizer import Tokenizer
+
+
+class MockTokenizer(Tokenizer):
+    def tokenize(self, text: str) -> list[str]:
+        return text.split()
+
+
+class PrefixTokenizer(Tokenizer):
+    def tokenize(self, text: str) -> list[str]:
+        return [f"x{t}" for t in text.split()]
+
+
+@pytest.fixture
+def in_memory_db() -> WarabiDB:
+    """Fixture for an in-memory WarabiDB."""
+    return WarabiDB(tokenizer=MockTokenizer())
+
+
+@pytest.fixture
+def file_db(tmp_path: Path) -> WarabiDB:
+    """Fixture for a file-based WarabiDB."""
+    return WarabiDB(tmp_path / "test.db", tokenizer=MockTokenizer())
+
+
+@pytest.fixture(params=["in_memory", "file"])
+def db(request, in_memory_db, file_db) -> WarabiDB:
+    """Parametrized fixture to test both in-memory and file-based dbs."""
+    if request.param == "in_memory":
+        return in_memory_db
+    return file_db
+
+
+def test_insert_get_and_search(db: WarabiDB):
+    """Test inserting documents, retrieving and searching them."""
+    # given
+    doc1 = Document({"title": "first", "body": "shared words"})
+    doc2 = Document({"title": "second", "body": "shared shared"})
+
+    # when
+    db.insert(doc1, DocumentId("doc1"))
+    db.insert(doc2, DocumentId("doc2"))
+
+    # then
+    assert db.get(DocumentId("doc1")) == doc1
+    assert db.search("shared") == [
+        (DocumentId("doc2"), doc2),
+        (DocumentId("doc1"), doc1),
+    ]
+    assert db.search("shared", limit=1, offset=1) == [
+        (DocumentId("doc1"), doc1)
+    ]
+    assert db.search("missing") == []
+
+
+def test_insert_duplicate_is_atomic(db: WarabiDB):
+    """Test that a failed insert leaves neither document nor index."""
+    # given
+    db.insert(Document({"body": "original"}), DocumentId("doc1"))
+
+    # when
+    with pytest.raises(sqlite3.IntegrityError):
+        db.insert(Document({"body": "duplicate"}), DocumentId("doc1"))
+
+    # then
+    assert db.get(DocumentId("doc1")) == {"body": "original"}
+    assert db.search("duplicate") == []
+
+
+def test_insert_many(db: WarabiDB):
+    """Test bulk inserting documents."""
+    # when
+    db.insert_many(
+        (
+            (DocumentId(f"doc{i}"), Document({"body": f"bulk n{i}"}))
+            for i in range(5)
+        ),
+        batch_size=2,
+    )
+
+    # then
+    assert len(db.search("bulk")) == 5
+    assert db.get(DocumentId("doc4")) == {"body": "bulk n4"}
+
+
+def test_update(db: WarabiDB):
+    """Test updating a document and its index."""
+    # given
+    db.insert(Document({"body": "before"}), DocumentId("doc1"))
+
+    # when
+    db.update(Document({"body": "after"}), DocumentId("doc1"))
+
+    # then
+    assert db.get(DocumentId("doc1")) == {"body": "after"}
+    assert db.search("before") == []
+    assert db.search("after") == [(DocumentId("doc1"), {"body": "after"})]
+
+
+def test_update_nonexistent(db: WarabiDB):
+    """Test that updating a missing document does nothing."""
+    # when
+    db.update(Document({"body": "ghost"}), DocumentId("doc1"))
+
+    # then
+    assert db.get(DocumentId("doc1")) is None
+    assert db.search("ghost") == []
+
+
+def test_delete(db: WarabiDB):
+    """Test deleting a document and its index."""
+    # given
+    db.insert(Document({"body": "gone"}), DocumentId("doc1"))
+
+    # when
+    db.delete(DocumentId("doc1"))
+
+    # then
+    assert db.get(DocumentId("doc1")) is None
+    assert db.search("gone") == []
+
+
+def test_single_file(tmp_path: Path):
+    """Test that documents and index persist in one file."""
+    # given
+    db_path = tmp_path / "test.db"
+    db = WarabiDB(db_path, tokenizer=MockTokenizer())
+    db.insert(Document({"body": "persistent"}), DocumentId("doc1"))
+    db.close()
+
+    # when
+    reopened = WarabiDB(db_path, tokenizer=MockTokenizer())
+
+    # then
+    assert [p.name for p in tmp_path.iterdir()] == ["test.db"]
+    assert reopened.search("persistent") == [
+        (DocumentId("doc1"), {"body": "persistent"})
+    ]
+
+
+def test_default_tokenizer():
+    """Test searching Japanese text with the default tokenizer."""
+    # given
+    db = WarabiDB()
+    db.insert(Document({"body": "これはテストです。"}), DocumentId("doc1"))
+
+    # when
+    results = db.search("テスト")
+
+    # then
+    assert results == [(DocumentId("doc1"), {"body": "これはテストです。"})]
+
+
+def test_trigram_mode():
+    """Test a database indexed in trigram mode."""
+    # given
+    db = WarabiDB(index_mode="trigram")
+    db.insert(Document({"body": "ログ収集エージェント"}), DocumentId("doc1"))
+
+    # when
+    results = db.search("収集エージ")
+
+    # then
+    assert results == [(DocumentId("doc1"), {"body": "ログ収集エージェント"})]
+
+
+def test_index_policy_and_search_fields():
+    """Test indexing some fields only and searching a single field."""
+    # given
+    db = WarabiDB(
+        tokenizer=MockTokenizer(),
+        index_policy=IndexPolicy(include=["@root.title", "@root.body"]),
+    )
+    doc1 = Document({"title": "apple", "body": "pie", "id": "banana"})
+    doc2 = Document({"title": "pie", "body": "apple"})
+    db.insert(doc1, DocumentId("doc1"))
+    db.insert(doc2, DocumentId("doc2"))
+
+    # when
+    results = db.search("apple", fields=["@root.title"])
+
+    # then
+    assert results == [(DocumentId("doc1"), doc1)]
+    assert db.search("banana") == []
+    assert db.get(DocumentId("doc1")) == doc1
+
+
+def test_snapshot_and_rebuild(tmp_path: Path):
+    """Test backing up a database and rebuilding it with a new tokenizer."""
+    # given
+    db = WarabiDB(tmp_path / "test.db", tokenizer=MockTokenizer())
+    doc = Document({"body": "hello world"})
+    db.insert(doc, DocumentId("doc1"))
+
+    # when
+    db.snapshot(tmp_path / "snapshot.db")
+    db.rebuild(tokenizer=PrefixTokenizer())
+
+    # then
+    assert db.search("hello") == [(DocumentId("doc1"), doc)]
+    assert db._fts._conn.execute("SELECT text FROM fields").fetchall() == [
+        ("xhello xworld",)
+    ]
+    copy = WarabiDB(tmp_path / "snapshot.db", tokenizer=MockTokenizer())
+    assert copy.search("world") == [(DocumentId("doc1"), doc)]
+
+
+def test_read_only_mode(tmp_path: Path):
+    """Test searching a database opened read-only by a search worker."""
+    # given
+    writer = WarabiDB(tmp_path / "test.db", tokenizer=MockTokenizer())
+    doc = Document({"body": "hello world"})
+    writer.insert(doc, DocumentId("doc1"))
+
+    # when
+    db = WarabiDB(
+        tmp_path / "test.db",
+        tokenizer=MockTokenizer(),
+        access_mode="readonly",
+    )
+
+    # then
+    assert db.search("hello") == [(DocumentId("doc1"), doc)]
+    assert db.get(DocumentId("doc1")) == doc
+    with pytest.raises(ReadOnlyError):
+        db.insert(doc, DocumentId("doc2"))
+    with pytest.raises(ReadOnlyError):
+        db.delete(DocumentId("doc1"))
+    with pytest.raises(ReadOnlyError):
+        db.rebuild()
+    assert writer.get(DocumentId("doc1")) == doc
@@ -0,0 +1,70 @@
+import logging
+
+import pytest
+
+from warabi.instrumentation import HISTOGRAM_BOUNDS, Instrumentation, timer
+
+
+def test_record_updates_stats_and_histogram():
+    """Test that durations are counted, summed and bucketed per stage."""
+    # given
+    instrumentation = Instrumentation()
+
+    # when
+    instrumentation.record("stage", 0.002)
+    instrumentation.record("stage", 0.004)
+    instrumentation.record("other", 100.0)
+
+    # then
+    stats = instrumentation.stats()
+    assert stats["stage"].count == 2
+    assert stats["stage"].total == pytest.approx(0.006)
+    assert stats["stage"].mean == pytest.approx(0.003)
+    assert stats["stage"].max == 0.004
+    assert stats["stage"].buckets[HISTOGRAM_BOUNDS.index(2.5e-3)] == 1
+    assert stats["stage"].buckets[HISTOGRAM_BOUNDS.index(5e-3)] == 1
+    assert stats["other"].buckets[-1] == 1
+
+
+def test_hooks_receive_every_record():
+    """Test that hooks are called until they are removed."""
+    # given
+    received = []
+    extra = []
+
+    def hook(stage: str, seconds: float) -> None:
+        received.append((stage, seconds))
+
+    instrumentation = Instrumentation(hooks=[hook])
+    instrumentation.add_hook(lambda *r: extra.append(r))
+
+    # when
+    with instrumentation.timer("timed"):
+        pass
+    instrumentation.remove_hook(hook)
+    instrumentation.record("after", 1.0)
+
+    # then
+    assert [stage for stage, _ in received] == ["timed"]
+    assert [stage for stage, _ in extra] == ["timed", "after"]
+
+
+def test_slow_search_is_logged(caplog: pytest.LogCaptureFixture):
+    """Test that only searches over the threshold are logged."""
+    # given
+    instrumentation = Instrumentation(slow_query_threshold=0.5)
+
+    # when
+    with caplog.at_level(logging.WARNING, logger="warabi.instrumentation"):
+        instrumentation.record_search("速い", "速い", 0.1)
+        instrumentation.record_search("遅い検索", "遅い 検索", 0.7)
+
+    # then
+    assert len(caplog.records) == 1
+    assert "'遅い 検索'" in caplog.records[0].getMessage()
+    assert instrumentation.stats()["fts.search"].count == 2
+
+
+def test_timer_without_instrumentation_is_shared_noop():
+    """Test that disabled timing does not allocate a timer per block."""
+    assert timer(None, "a") is timer(None, "b")
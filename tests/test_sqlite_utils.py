@@ -0,0 +1,181 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+from warabi.sqlite_utils import (
+    ConnectionPool,
+    connect,
+    read_only_uri,
+    relaxed_durability,
+    transaction,
+)
+
+
+@pytest.fixture
+def conn() -> sqlite3.Connection:
+    """Fixture for an in-memory connection with a single table."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    return conn
+
+
+def test_transaction_commits(conn: sqlite3.Connection):
+    """Test that a successful block is committed."""
+    # when
+    with transaction(conn):
+        conn.execute("INSERT INTO t VALUES (1)")
+
+    # then
+    assert not conn.in_transaction
+    assert conn.execute("SELECT v FROM t").fetchall() == [(1,)]
+
+
+def test_transaction_rolls_back(conn: sqlite3.Connection):
+    """Test that a failing block is rolled back."""
+
+    # given
+    def insert_and_fail():
+        with transaction(conn):
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError("failed")
+
+    # when
+    with pytest.raises(RuntimeError):
+        insert_and_fail()
+
+    # then
+    assert conn.execute("SELECT v FROM t").fetchall() == []
+
+
+def test_transaction_joins_outer(conn: sqlite3.Connection):
+    """Test that a nested block leaves committing to the outer one."""
+
+    # given
+    def insert_nested_and_fail():
+        with transaction(conn):
+            with transaction(conn):
+                conn.execute("INSERT INTO t VALUES (1)")
+            assert conn.in_transaction
+            raise RuntimeError("outer failed")
+
+    # when
+    with pytest.raises(RuntimeError):
+        insert_nested_and_fail()
+
+    # then
+    assert conn.execute("SELECT v FROM t").fetchall() == []
+
+
+def test_relaxed_durability_restores(tmp_path: Path):
+    """Test that relaxed pragmas are restored on exit."""
+    # given
+    conn = sqlite3.connect(tmp_path / "test.db")
+
+    # when
+    with relaxed_durability(conn):
+        relaxed = conn.execute("PRAGMA synchronous").fetchone()[0]
+
+    # then
+    assert relaxed == 0
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+
+
+def test_read_only_uri(tmp_path: Path):
+    """Test that a read-only URI rejects writes."""
+    # given
+    db_path = tmp_path / "test.db"
+    sqlite3.connect(db_path).execute("CREATE TABLE t (v INTEGER)")
+
+    # when
+    conn = sqlite3.connect(read_only_uri(db_path), uri=True)
+
+    # then
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        conn.execute("INSERT INTO t VALUES (1)")
+
+
+def test_read_only_uri_immutable(tmp_path: Path):
+    """Test that an immutable URI is read-only too."""
+    # given
+    db_path = tmp_path / "test.db"
+    sqlite3.connect(db_path).execute("CREATE TABLE t (v INTEGER)")
+
+    # when
+    uri = read_only_uri(db_path, immutable=True)
+    conn = sqlite3.connect(uri, uri=True)
+
+    # then
+    assert uri.endswith("?mode=ro&immutable=1")
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        conn.execute("INSERT INTO t VALUES (1)")
+
+
+def test_connect_read_only_requires_existing_file(tmp_path: Path):
+    """Test that read-only modes neither create files nor use memory."""
+    with pytest.raises(sqlite3.OperationalError, match="unable to open"):
+        connect(str(tmp_path / "missing.db"), "readonly")
+    assert not (tmp_path / "missing.db").exists()
+    with pytest.raises(ValueError, match="requires a database file path"):
+        connect(":memory:", "immutable")
+    with pytest.raises(ValueError, match="unsupported access mode"):
+        connect(str(tmp_path / "test.db"), "append")  # type: ignore[arg-type]
+
+
+def test_connection_pool_bounds_connections():
+    """Test that the pool reuses connections and never exceeds its size."""
+    # given
+    opened: list[sqlite3.Connection] = []
+
+    def factory() -> sqlite3.Connection:
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        opened.append(conn)
+        return conn
+
+    pool = ConnectionPool(factory, size=2)
+    barrier = threading.Barrier(2)
+
+    def borrow():
+        with pool.connection() as conn:
+            barrier.wait()
+            conn.execute("SELECT 1")
+
+    # when
+    threads = [threading.Thread(target=borrow) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with pool.connection():
+        pass
+
+    # then
+    assert len(opened) == 2
+    pool.close()
+
+
+def test_connection_pool_opens_extra_connections():
+    """Test that borrowing beyond the size opens temporary connections."""
+    # given
+    opened: list[sqlite3.Connection] = []
+
+    def factory() -> sqlite3.Connection:
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        opened.append(conn)
+        return conn
+
+    pool = ConnectionPool(factory, size=2)
+
+    # when
+    with pool.connection(), pool.connection(), pool.connection() as extra:
+        extra.execute("SELECT 1")
+    with pool.connection(), pool.connection():
+        pass
+
+    # then
+    assert len(opened) == 3
+    with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+        extra.execute("SELECT 1")
+    pool.close()
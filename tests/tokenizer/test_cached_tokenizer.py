@@ -0,0 +1,93 @@
+import pytest
+
+from warabi.tokenizer import Tokenizer
+from warabi.tokenizer.cached_tokenizer import CachedTokenizer
+
+
+class CountingTokenizer(Tokenizer):
+    def __init__(self):
+        self.calls = 0
+
+    def tokenize(self, text: str) -> list[str]:
+        self.calls += 1
+        return text.split()
+
+
+@pytest.fixture
+def inner() -> CountingTokenizer:
+    """Fixture for the wrapped tokenizer."""
+    return CountingTokenizer()
+
+
+def test_tokenize_uses_cache(inner: CountingTokenizer):
+    """Test that repeated texts are tokenized once."""
+    # given
+    tokenizer = CachedTokenizer(inner)
+
+    # when
+    first = list(tokenizer.tokenize("これ は テスト"))
+    second = list(tokenizer.tokenize("これ は テスト"))
+
+    # then
+    assert first == second == ["これ", "は", "テスト"]
+    assert inner.calls == 1
+    info = tokenizer.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_tokenize_respects_maxsize(inner: CountingTokenizer):
+    """Test that the cache is bounded by the number of texts."""
+    # given
+    tokenizer = CachedTokenizer(inner, maxsize=1)
+
+    # when
+    list(tokenizer.tokenize("a"))
+    list(tokenizer.tokenize("b"))
+    list(tokenizer.tokenize("a"))
+
+    # then
+    assert inner.calls == 3
+    assert tokenizer.cache_info().currsize == 1
+
+
+def test_tokenize_respects_max_bytes(inner: CountingTokenizer):
+    """Test that the cache is bounded by the size of texts and tokens."""
+    # given
+    tokenizer = CachedTokenizer(inner, maxsize=None, max_bytes=12)
+
+    # when
+    # "テスト" is 9 bytes in UTF-8, as text and as token
+    list(tokenizer.tokenize("テスト"))
+
+    # then
+    assert tokenizer.cache_info().currsize == 0
+
+
+def test_cache_clear(inner: CountingTokenizer):
+    """Test that clearing the cache forces tokenization again."""
+    # given
+    tokenizer = CachedTokenizer(inner)
+    list(tokenizer.tokenize("a"))
+
+    # when
+    tokenizer.cache_clear()
+    list(tokenizer.tokenize("a"))
+
+    # then
+    assert inner.calls == 2
+
+
+def test_tokenize_batch_shares_cache(inner: CountingTokenizer):
+    """Test that batches tokenize each distinct uncached text once."""
+    # given
+    tokenizer = CachedTokenizer(inner)
+    list(tokenizer.tokenize("a b"))
+
+    # when
+    results = tokenizer.tokenize_batch(["a b", "c", "", "c"])
+
+    # then
+    assert results == ["a b", "c", "", "c"]
+    assert inner.calls == 3
+    assert list(tokenizer.tokenize("c")) == ["c"]
+    assert inner.calls == 3
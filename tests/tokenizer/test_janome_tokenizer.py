@@ -1,6 +1,8 @@
+import pickle
+
 import pytest
 
-from warabi.tokenizer.janome_tokenizer import JanomeTokenizer
+from warabi.tokenizer.janome_tokenizer import FUNCTION_WORD_POS, JanomeTokenizer
 
 
 @pytest.fixture
@@ -46,3 +48,53 @@ def test_tokenize_whitespace(tokenizer: JanomeTokenizer):
 
     # then
     assert tokens == []
+
+
+def test_tokenize_batch(tokenizer: JanomeTokenizer):
+    """Test that batch tokenization matches joining tokenize results."""
+    # given
+    texts = [
+        "これはテストです。",
+        "",
+        "   ",
+        "今日は 良い天気",
+        "これはテストです。",
+    ]
+
+    # when
+    results = tokenizer.tokenize_batch(texts)
+
+    # then
+    assert results == [" ".join(tokenizer.tokenize(t)) for t in texts]
+    assert results[0] == "これ は テスト です 。"
+
+
+def test_tokenize_filters():
+    """Test dropping function words and stopwords, and the token form."""
+    # given
+    tokenizer = JanomeTokenizer(
+        form="base",
+        exclude_pos=FUNCTION_WORD_POS,
+        stopwords=["会議"],
+    )
+    text = "委員会で会議を行った。"
+
+    # when
+    tokens = list(tokenizer.tokenize(text))
+
+    # then
+    assert tokens == ["委員", "会", "行う"]
+    assert tokenizer.tokenize_batch([text]) == ["委員 会 行う"]
+
+
+def test_pickle_keeps_options():
+    """Test that a pickled tokenizer keeps its options but not its state."""
+    # given
+    tokenizer = JanomeTokenizer(exclude_pos=[("助詞",)])
+    tokenizer.warm_up()
+
+    # when
+    restored = pickle.loads(pickle.dumps(tokenizer))
+
+    # then
+    assert list(restored.tokenize("これはテスト")) == ["これ", "テスト"]
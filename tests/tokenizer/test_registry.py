@@ -0,0 +1,93 @@
+import subprocess
+import sys
+
+import pytest
+
+import warabi.tokenizer
+from warabi.tokenizer import (
+    Tokenizer,
+    get_tokenizer,
+    register_tokenizer,
+    sudachi_tokenizer,
+)
+from warabi.tokenizer.janome_tokenizer import JanomeTokenizer
+from warabi.tokenizer.sudachi_tokenizer import SudachiTokenizer
+
+
+class UpperTokenizer(Tokenizer):
+    def __init__(self, prefix: str = ""):
+        self._prefix = prefix
+
+    def tokenize(self, text: str) -> list[str]:
+        return [self._prefix + t.upper() for t in text.split()]
+
+
+def test_get_builtin_tokenizers():
+    """Test creating the built-in tokenizers by name."""
+    assert isinstance(get_tokenizer("janome"), JanomeTokenizer)
+    assert isinstance(get_tokenizer("sudachi"), SudachiTokenizer)
+
+
+def test_get_unknown_tokenizer():
+    """Test that an unknown name is rejected."""
+    with pytest.raises(ValueError, match="unknown tokenizer"):
+        get_tokenizer("missing")
+
+
+def test_register_tokenizer_by_reference(monkeypatch: pytest.MonkeyPatch):
+    """Test registering a lazily imported tokenizer with options."""
+    # given
+    monkeypatch.setattr(
+        warabi.tokenizer, "_FACTORIES", dict(warabi.tokenizer._FACTORIES)
+    )
+    register_tokenizer("upper", f"{__name__}:UpperTokenizer")
+
+    # when
+    tokenizer = get_tokenizer("upper", prefix="_")
+
+    # then
+    assert list(tokenizer.tokenize("a b")) == ["_A", "_B"]
+
+
+def test_import_does_not_load_backends():
+    """Test that importing warabi defers importing tokenizer backends."""
+    code = (
+        "import sys, warabi, warabi.aio; "
+        "from warabi.tokenizer import get_tokenizer; "
+        "get_tokenizer('janome'); get_tokenizer('sudachi'); "
+        "assert 'janome' not in sys.modules, 'janome'; "
+        "assert 'sudachipy' not in sys.modules, 'sudachipy'"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_janome_instances_share_dictionary():
+    """Test that Janome is loaded once per process and dictionary mode."""
+    # given
+    first = JanomeTokenizer()
+    second = JanomeTokenizer()
+
+    # when
+    first.warm_up()
+    tokens = list(second.tokenize("これはテストです。"))
+
+    # then
+    assert first._tokenizer is second._tokenizer
+    assert tokens == ["これ", "は", "テスト", "です", "。"]
+
+
+def test_sudachi_instances_share_dictionary():
+    """Test that Sudachi instances share one dictionary."""
+    # given
+    first = SudachiTokenizer()
+    second = SudachiTokenizer()
+
+    # when
+    first.warm_up()
+    loaded = sudachi_tokenizer._shared_dictionary
+    tokens = list(second.tokenize("これはテストです。"))
+
+    # then
+    assert loaded is not None
+    assert sudachi_tokenizer._shared_dictionary is loaded
+    assert tokens == ["これ", "は", "テスト", "です", "。"]
@@ -1,6 +1,14 @@
+import copy
+import pickle
+import threading
+
 import pytest
 
-from warabi.tokenizer.sudachi_tokenizer import SudachiTokenizer
+from warabi.tokenizer.sudachi_tokenizer import (
+    FUNCTION_WORD_POS,
+    SudachiSplitMode,
+    SudachiTokenizer,
+)
 
 
 @pytest.fixture
@@ -46,3 +54,128 @@ def test_tokenize_whitespace(tokenizer: SudachiTokenizer):
 
     # then
     assert tokens == []
+
+
+def test_tokenize_batch(tokenizer: SudachiTokenizer):
+    """Test that batch tokenization matches joining tokenize results."""
+    # given
+    texts = [
+        "これはテストです。",
+        "",
+        "   ",
+        "今日は 良い天気",
+        "これはテストです。",
+    ]
+
+    # when
+    results = tokenizer.tokenize_batch(texts)
+
+    # then
+    assert results == [" ".join(tokenizer.tokenize(t)) for t in texts]
+    assert results[0] == "これ は テスト です 。"
+
+
+@pytest.mark.parametrize(
+    ("split_mode", "expected"),
+    [
+        ("A", ["選挙", "管理", "委員", "会", "の", "会議"]),
+        ("C", ["選挙管理委員会", "の", "会議"]),
+        (
+            "multi",
+            ["選挙管理委員会", "選挙", "管理", "委員", "会", "の", "会議"],
+        ),
+    ],
+)
+def test_tokenize_split_mode(split_mode: SudachiSplitMode, expected: list[str]):
+    """Test the tokens of each split mode."""
+    # given
+    tokenizer = SudachiTokenizer(split_mode=split_mode)
+
+    # when
+    tokens = list(tokenizer.tokenize("選挙管理委員会の会議"))
+
+    # then
+    assert tokens == expected
+    assert tokenizer.tokenize_batch(["選挙管理委員会の会議"]) == [
+        " ".join(expected)
+    ]
+
+
+def test_tokenize_filters():
+    """Test dropping function words and stopwords, and the token form."""
+    # given
+    tokenizer = SudachiTokenizer(
+        form="dictionary",
+        exclude_pos=FUNCTION_WORD_POS,
+        stopwords=["会議"],
+    )
+    text = "委員会で会議が行われました。"
+
+    # when
+    tokens = list(tokenizer.tokenize(text))
+
+    # then
+    assert tokens == ["委員会", "行う"]
+    assert tokenizer.tokenize_batch([text]) == ["委員会 行う"]
+
+
+def test_pickle_keeps_options():
+    """Test that a pickled tokenizer keeps its options but not its state."""
+    # given
+    tokenizer = SudachiTokenizer(split_mode="A", stopwords=["会"])
+    tokenizer.warm_up()
+
+    # when
+    restored = pickle.loads(pickle.dumps(tokenizer))
+
+    # then
+    assert list(restored.tokenize("委員会")) == ["委員"]
+
+
+def test_copy_has_own_state(tokenizer: SudachiTokenizer):
+    """Test that a copied tokenizer loads its own SudachiPy tokenizer."""
+    # given
+    tokenizer.warm_up()
+
+    # when
+    copied = copy.copy(tokenizer)
+
+    # then
+    assert copied.tokenize_batch(["東京都"]) == ["東京都"]
+    assert copied._local.tokenizer is not tokenizer._local.tokenizer
+
+
+def test_concurrent_tokenize(tokenizer: SudachiTokenizer):
+    """Test tokenizing with one instance from many threads at once."""
+    # given
+    texts = [f"東京都で美味しいラーメンを{i}杯食べた" for i in range(20)]
+    expected = tokenizer.tokenize_batch(texts)
+    errors: list[BaseException] = []
+    barrier = threading.Barrier(8)
+
+    def tokenize():
+        try:
+            barrier.wait()
+            for _ in range(20):
+                assert tokenizer.tokenize_batch(texts) == expected
+                assert " ".join(tokenizer.tokenize(texts[0])) == expected[0]
+        except BaseException as e:
+            errors.append(e)
+
+    # when
+    threads = [threading.Thread(target=tokenize) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # then
+    assert errors == []
+
+
+def test_invalid_options():
+    """Test that unsupported options are rejected."""
+    with pytest.raises(ValueError, match="split mode"):
+        SudachiTokenizer(split_mode="D")  # type: ignore[arg-type]
+    with pytest.raises(ValueError, match="token form"):
+        SudachiTokenizer(form="base")  # type: ignore[arg-type]